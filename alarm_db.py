@@ -0,0 +1,409 @@
+"""SQLite alarm store for very large alarm sets.
+
+AlarmDatabase has the methods and change events of AlarmStore but keeps the
+alarms in an SQLite database (WAL mode) instead of memory. Each alarm is one
+row holding its JSON record, with indexed columns for the display order, id,
+name, state and next fire, so:
+
+* opening the database reads nothing but the row counts, which triggers keep
+  in a small ``counts`` table;
+* adds, edits and next-fire updates write single rows (WAL commits do not
+  wait for an fsync), and changes inside ``with store.batch():`` are one
+  transaction;
+* due_before() walks the next-fire index, so the engine only loads the
+  alarms about to ring (see LOAD_WINDOW in alarm_engine.py);
+* at(row) reads the display order a page at a time, for paged list views,
+  starting each page after the last seq of the one before it. Page ends are
+  remembered, so only the first jump to a far row skips over the rows
+  between it and the nearest known page.
+
+A record is only in memory while something holds it. Loaded records are
+tracked in a weak dictionary, so the scheduler, a list page and a lookup by
+id all get the same record object. Records must be AlarmRecords (make_alarm
+builds them) for this; plain dicts are stored but not tracked.
+
+"update" and "remove" events report the row as None: finding an alarm's
+position would mean counting the rows before it.
+
+    python main.py --alarm-db alarms.db
+"""
+import json
+import os
+import threading
+import weakref
+from contextlib import contextmanager
+
+from alarm_store import AlarmRecord, name_key
+from persistence import to_json_safe
+
+
+# Rows per query of at() and of the chunked scans, and pages kept for at()
+PAGE_ROWS = 200
+CHUNK_ROWS = 500
+CACHED_PAGES = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarms (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    name_key TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    next_fire REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alarms_next_fire ON alarms (next_fire, seq) WHERE next_fire IS NOT NULL;
+CREATE INDEX IF NOT EXISTS alarms_name ON alarms (name_key);
+CREATE INDEX IF NOT EXISTS alarms_active ON alarms (active);
+CREATE TABLE IF NOT EXISTS counts (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS alarms_count_insert AFTER INSERT ON alarms BEGIN
+    UPDATE counts SET value = value + 1 WHERE name = 'alarms';
+    UPDATE counts SET value = value + NEW.active WHERE name = 'active';
+END;
+CREATE TRIGGER IF NOT EXISTS alarms_count_delete AFTER DELETE ON alarms BEGIN
+    UPDATE counts SET value = value - 1 WHERE name = 'alarms';
+    UPDATE counts SET value = value - OLD.active WHERE name = 'active';
+END;
+CREATE TRIGGER IF NOT EXISTS alarms_count_active AFTER UPDATE OF active ON alarms BEGIN
+    UPDATE counts SET value = value + NEW.active - OLD.active WHERE name = 'active';
+END;
+"""
+
+
+class AlarmDatabase:
+    """Alarms in an SQLite database, behind the interface of AlarmStore"""
+
+    def __init__(self, path):
+        # Only paid for by users of the database
+        import sqlite3
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._count, self._active = self._read_counts()
+        self._live = weakref.WeakValueDictionary()
+        # Page number -> records, oldest first
+        self._pages = {}
+        # Page number -> seq of its last row, for full pages
+        self._page_ends = {}
+        self._listeners = []
+        self.version = 0
+        self._batch_depth = 0
+        self._batch_changed = False
+
+    def _read_counts(self):
+        """(alarms, active alarms), counted once for databases made before the counts table"""
+        counts = dict(self._db.execute("SELECT name, value FROM counts"))
+        if len(counts) < 2:
+            self._db.execute("BEGIN")
+            counts = {"alarms": self._db.execute("SELECT COUNT(*) FROM alarms").fetchone()[0],
+                      "active": self._db.execute("SELECT COUNT(*) FROM alarms WHERE active = 1").fetchone()[0]}
+            self._db.executemany("INSERT OR REPLACE INTO counts VALUES (?, ?)", counts.items())
+            self._db.execute("COMMIT")
+        return counts["alarms"], counts["active"]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        """Alarms in display order, read a chunk at a time"""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT seq, id, next_fire, data FROM alarms WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (last, CHUNK_ROWS)).fetchall()
+                records = [self._record(*row[1:]) for row in rows]
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield from records
+
+    def snapshot(self):
+        """(version, alarms in display order), read a chunk at a time
+
+        Unlike AlarmStore.snapshot() this is not atomic: the lock is only held
+        per chunk, so a long scan does not hold up the scheduler. Alarms
+        changed during the scan may or may not be included.
+        """
+        with self._lock:
+            version = self.version
+        return version, list(self)
+
+    def __contains__(self, alarm_id):
+        return self.get(alarm_id) is not None
+
+    def add_listener(self, callback):
+        """Register callback(change, alarm_data, row, version)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregister a listener added with add_listener()"""
+        self._listeners.remove(callback)
+
+    def _notify(self, change, alarm_data, row):
+        self._pages.clear()
+        if self._batch_depth:
+            self._batch_changed = True
+            return
+        self.version += 1
+        for callback in list(self._listeners):
+            try:
+                callback(change, alarm_data, row, self.version)
+            except Exception as e:
+                print(f"Error in alarm store listener: {e}")
+
+    @contextmanager
+    def batch(self):
+        """Group changes into one transaction and one "batch" change event"""
+        with self._lock:
+            if not self._batch_depth:
+                self._db.execute("BEGIN")
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    # Records in memory already hold the changes, so keep them on disk too
+                    self._db.execute("COMMIT")
+                    if self._batch_changed:
+                        self._batch_changed = False
+                        self._notify("batch", None, None)
+
+    def _record(self, alarm_id, next_fire, data):
+        """The record of a row, reusing the one in memory (caller holds the lock)"""
+        record = self._live.get(alarm_id)
+        if record is None:
+            record = AlarmRecord(json.loads(data))
+            record["_next_fire"] = next_fire
+            self._live[alarm_id] = record
+        return record
+
+    def _track(self, alarm_data):
+        try:
+            self._live[alarm_data["id"]] = alarm_data
+        except TypeError:
+            # A plain dict cannot be weakly referenced
+            pass
+
+    def new_id(self):
+        """A fresh id not used by any stored alarm"""
+        while True:
+            alarm_id = os.urandom(6).hex()
+            if alarm_id not in self:
+                return alarm_id
+
+    def _insert(self, alarm_data):
+        """Write a new row, giving the record an id if it has none (caller holds the lock)"""
+        alarm_id = alarm_data.get("id")
+        if not alarm_id or alarm_id in self:
+            alarm_id = alarm_data["id"] = self.new_id()
+        active = bool(alarm_data.get("active", True))
+        self._db.execute("INSERT INTO alarms (id, name_key, active, data) VALUES (?, ?, ?, ?)",
+                         (alarm_id, name_key(alarm_data), active, _dump(alarm_data)))
+        self._count += 1
+        self._active += active
+        self._track(alarm_data)
+        return alarm_id
+
+    def reset(self, alarms):
+        """Replace the contents"""
+        with self.batch():
+            self._db.execute("DELETE FROM alarms")
+            self._count = self._active = 0
+            self._live.clear()
+            self._page_ends.clear()
+            for alarm_data in alarms:
+                self._insert(alarm_data)
+        self._notify("reset", None, None)
+
+    def add(self, alarm_data):
+        """Store a new alarm and return its id"""
+        with self._lock:
+            alarm_id = self._insert(alarm_data)
+            self._notify("add", alarm_data, self._count - 1)
+            return alarm_id
+
+    def get(self, alarm_id):
+        """Alarm with the given id, or None"""
+        with self._lock:
+            record = self._live.get(alarm_id)
+            if record is not None:
+                return record
+            row = self._db.execute("SELECT id, next_fire, data FROM alarms WHERE id = ?",
+                                   (alarm_id,)).fetchone()
+            return self._record(*row) if row else None
+
+    def row_of(self, alarm_id):
+        """Display position of an alarm (counts the rows before it)"""
+        with self._lock:
+            if alarm_id not in self:
+                raise KeyError(alarm_id)
+            return self._db.execute(
+                "SELECT COUNT(*) FROM alarms WHERE seq < (SELECT seq FROM alarms WHERE id = ?)",
+                (alarm_id,)).fetchone()[0]
+
+    def _page_end(self, page):
+        """Seq of the last row of a full page (caller holds the lock)"""
+        ends = self._page_ends
+        end = ends.get(page)
+        if end is None:
+            # Skip forward from the nearest known page end before it
+            known = max((known for known in ends if known < page), default=-1)
+            end = ends[page] = self._db.execute(
+                "SELECT seq FROM alarms WHERE seq > ? ORDER BY seq LIMIT 1 OFFSET ?",
+                (ends.get(known, -1), (page - known) * PAGE_ROWS - 1)).fetchone()[0]
+        return end
+
+    def at(self, row):
+        """Alarm shown at a display position"""
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        page, offset = divmod(row, PAGE_ROWS)
+        with self._lock:
+            records = self._pages.get(page)
+            if records is None:
+                rows = self._db.execute(
+                    "SELECT seq, id, next_fire, data FROM alarms WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (self._page_end(page - 1) if page else -1, PAGE_ROWS)).fetchall()
+                if len(rows) == PAGE_ROWS:
+                    self._page_ends[page] = rows[-1][0]
+                records = self._pages[page] = [self._record(*row[1:]) for row in rows]
+                if len(self._pages) > CACHED_PAGES:
+                    del self._pages[next(iter(self._pages))]
+            return records[offset]
+
+    def update(self, alarm_id, **changes):
+        """Change fields of an alarm and write its row"""
+        with self._lock:
+            alarm_data = self.get(alarm_id)
+            if alarm_data is None:
+                raise KeyError(alarm_id)
+            old_state = bool(alarm_data.get("active", True))
+            alarm_data.update(changes)
+            # Any cached compiled rule may be stale now
+            alarm_data.pop("_rule", None)
+            new_state = bool(alarm_data.get("active", True))
+            self._db.execute("UPDATE alarms SET name_key = ?, active = ?, data = ? WHERE id = ?",
+                             (name_key(alarm_data), new_state, _dump(alarm_data), alarm_id))
+            self._active += new_state - old_state
+            self._notify("update", alarm_data, None)
+            return alarm_data
+
+    def _delete(self, alarm_id):
+        """Delete a row and return its record, or None (caller holds the lock)"""
+        alarm_data = self.get(alarm_id)
+        if alarm_data is None:
+            return None
+        seq = self._db.execute("SELECT seq FROM alarms WHERE id = ?", (alarm_id,)).fetchone()[0]
+        # Pages that end before the row keep their ends
+        self._page_ends = {page: end for page, end in self._page_ends.items() if end < seq}
+        self._db.execute("DELETE FROM alarms WHERE id = ?", (alarm_id,))
+        self._count -= 1
+        self._active -= bool(alarm_data.get("active", True))
+        self._live.pop(alarm_id, None)
+        return alarm_data
+
+    def remove(self, alarm_id):
+        """Delete an alarm and return it"""
+        with self._lock:
+            alarm_data = self._delete(alarm_id)
+            if alarm_data is None:
+                raise KeyError(alarm_id)
+            self._notify("remove", alarm_data, None)
+            return alarm_data
+
+    def remove_many(self, alarm_ids):
+        """Delete several alarms in one transaction and return them"""
+        with self.batch():
+            removed = [alarm_data for alarm_data in map(self._delete, alarm_ids)
+                       if alarm_data is not None]
+            if removed:
+                self._pages.clear()
+                self._batch_changed = True
+            return removed
+
+    def find_by_name(self, name):
+        """Alarms with this name (case-insensitive), in display order"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, next_fire, data FROM alarms WHERE name_key = ? ORDER BY seq",
+                (name.casefold(),)).fetchall()
+            return [self._record(*row) for row in rows]
+
+    def with_state(self, active=True):
+        """Ids of active (or inactive) alarms"""
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT id FROM alarms WHERE active = ?",
+                                                       (bool(active),))}
+
+    def count(self, active=True):
+        """Number of active (or inactive) alarms"""
+        return self._active if active else self._count - self._active
+
+    def set_next_fire(self, alarm_id, deadline):
+        """Record when an alarm fires next (None when it is not scheduled)"""
+        with self._lock:
+            record = self._live.get(alarm_id)
+            if record is not None:
+                if "_next_fire" in record and record["_next_fire"] == deadline:
+                    return
+                record["_next_fire"] = deadline
+            self._db.execute("UPDATE alarms SET next_fire = ? WHERE id = ?", (deadline, alarm_id))
+
+    def next_fire(self, alarm_id):
+        """Next fire instant of an alarm, or None"""
+        with self._lock:
+            record = self._live.get(alarm_id)
+            if record is not None and "_next_fire" in record:
+                return record["_next_fire"]
+            row = self._db.execute("SELECT next_fire FROM alarms WHERE id = ?",
+                                   (alarm_id,)).fetchone()
+            return row[0] if row else None
+
+    def upcoming(self, limit=10):
+        """The next alarms to fire, soonest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, next_fire, data FROM alarms WHERE next_fire IS NOT NULL "
+                "ORDER BY next_fire, seq LIMIT ?", (limit,)).fetchall()
+            return [self._record(*row) for row in rows]
+
+    def due_before(self, until, start=None):
+        """Alarms whose next fire is before `until` (and at or after `start`), soonest first
+
+        Read a chunk at a time through the next-fire index, so the store can
+        be changed while the result is iterated.
+        """
+        position = (-float("inf") if start is None else start, -1)
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT seq, id, next_fire, data FROM alarms "
+                    "WHERE (next_fire, seq) > (?, ?) AND next_fire < ? "
+                    "ORDER BY next_fire, seq LIMIT ?", position + (until, CHUNK_ROWS)).fetchall()
+                records = [self._record(*row[1:]) for row in rows]
+            if not rows:
+                return
+            position = (rows[-1][2], rows[-1][0])
+            yield from records
+
+
+def _dump(alarm_data):
+    return json.dumps(to_json_safe(alarm_data), separators=(",", ":"))
+
+
+def add_arguments(parser):
+    """Add --alarm-db to an argparse parser"""
+    parser.add_argument("--alarm-db", metavar="PATH",
+                        help="keep the alarms in an SQLite database instead of the settings file "
+                             "(alarms already in the settings file are moved into a new database)")
@@ -0,0 +1,910 @@
+"""Headless alarm engine: alarm model, scheduling, snooze, persistence and fire callbacks.
+
+The engine has no UI dependencies so it can run as a background daemon or be
+shared by several front ends. When an alarm fires again is described by its
+recurrence rule (see recurrence.py); the scheduler only holds each alarm's
+next fire instant.
+
+Deadlines are absolute wall-clock instants. The scheduler never sleeps longer
+than MAX_WAIT and compares wall-clock against monotonic time on every wake, so
+suspend/resume and clock steps are noticed within seconds. Alarms that come
+due more than the grace period late were missed and are handled by the
+missed-alarm policy: "fire_late" rings every missed occurrence, "coalesce"
+rings once for all of them, "drop" only logs them.
+
+Batch operations (add_alarms, set_alarms_active, remove_alarms, the CSV /
+JSON-lines import_alarms and the .ics import_calendar) validate every row first, apply the valid ones in
+one store transaction and report per-row errors, so thousands of alarms cost
+one settings write and one UI refresh::
+
+    python alarm_engine.py [settings.json] [--metrics-port PORT] [--metrics-json PATH]
+
+The headless engine, like the app, serves the control socket (see control.py)
+so scripts can add, list, remove, snooze and watch alarms.
+
+With an alarm database (see alarm_db.py) the alarms are not all loaded: the
+scheduler only holds the soonest ones (LOAD_WINDOW, LOAD_LIMIT), and the next
+ones are read from the database's next-fire index as time moves on.
+"""
+import datetime
+import time
+import threading
+import heapq
+import itertools
+import math
+import os
+from collections import namedtuple
+
+import alarm_db
+import alarm_io
+import ical_import
+import metrics
+import profiling
+from profiling import profiled
+from alarm_store import AlarmRecord, AlarmStore
+from clock import SYSTEM_CLOCK
+from persistence import SettingsStore, to_json_safe
+from recurrence import rule_for
+
+
+DEFAULT_SNOOZE_MINUTES = 5
+
+# Longest single sleep of the scheduler thread, in seconds
+MAX_WAIT = 30.0
+
+# Wall-clock vs monotonic disagreement treated as a clock jump or resume
+JUMP_THRESHOLD = 2.0
+
+# Fires later than this many seconds count as missed
+DEFAULT_MISSED_GRACE = 60.0
+
+MISSED_POLICIES = ("fire_late", "coalesce", "drop")
+DEFAULT_MISSED_POLICY = "coalesce"
+
+# Occurrences counted one by one when coalescing or dropping a backlog
+MAX_COUNTED_MISSES = 1000
+
+# With an alarm database, the scheduler holds the alarms due within this
+# many seconds, but no more than LOAD_LIMIT of them; the window moves on when
+# half of it has passed
+LOAD_WINDOW = 3600.0
+LOAD_LIMIT = 2000
+
+# One firing: the deadline, when it actually ran, how late that was and how
+# many occurrences it stands for if they were missed (0 when on time)
+Fire = namedtuple("Fire", "deadline fired_at lateness missed")
+
+FIRE_LATENESS = metrics.histogram("alarm_fire_lateness_seconds",
+                                  "How long after its deadline each alarm rang")
+FIRES = metrics.counter("alarm_fires_total", "Alarms rung")
+MISSED = metrics.counter("alarm_missed_occurrences_total",
+                         "Occurrences that came due more than the grace period late")
+CLOCK_JUMPS = metrics.counter("alarm_clock_jumps_total", "Detected suspends and clock steps")
+WAKEUPS = metrics.counter("alarm_scheduler_wakeups_total", "Times the scheduler thread woke up")
+
+# A row a batch operation rejected: its line / position and why
+RowError = namedtuple("RowError", "row message")
+
+# Outcome of a batch operation: the alarms it added or changed, the rejected
+# rows and the alarms it deleted (or that an import replaced)
+BatchResult = namedtuple("BatchResult", "alarms errors removed", defaults=((),))
+
+# Record fields make_alarm() builds; other fields of imported rows are kept as they are
+ALARM_FIELDS = ("id", "time", "name", "active", "repeat", "timezone")
+
+
+def make_alarm(alarm_time, name="Unnamed Alarm", active=True, repeat=None, timezone=None,
+               now=None):
+    """Build an alarm record, validating the HH:MM:SS time and recurrence rule
+
+    `now` (default: the current time) dates one-off alarms given without a date.
+    """
+    alarm_data = AlarmRecord({
+        "time": alarm_time,
+        "name": name or "Unnamed Alarm",
+        "active": active
+    })
+    # Daily in local time is the default and is not written out
+    if repeat and repeat.get("type", "daily") != "daily":
+        alarm_data["repeat"] = dict(repeat)
+    if timezone:
+        alarm_data["timezone"] = timezone
+    date_rule(alarm_data, now)
+    return alarm_data
+
+
+def date_rule(alarm_data, now=None):
+    """Date a rule that would otherwise count from whatever day it is asked about
+    
+    A one-off alarm without a date rings at the next occurrence of its time; an
+    interval without a start counts from its first fire (day intervals) or from
+    today's time of day (minute and hour intervals).
+    """
+    rule = rule_for(alarm_data)
+    if rule.kind == "once" and rule.date is None:
+        key = "date"
+    elif rule.kind in ("interval", "elapsed") and rule.start is None:
+        key = "start"
+    else:
+        return
+    if now is None:
+        now = time.time()
+    deadline = now if rule.kind == "elapsed" else rule.next_after(now)
+    if deadline is None:
+        # e.g. an "until" that has already passed
+        raise ValueError("alarm will not ring")
+    alarm_data["repeat"][key] = datetime.date.fromordinal(rule.zone.locate(deadline)).isoformat()
+    del alarm_data["_rule"]
+
+
+def next_alarm_deadline(alarm_data, after=None):
+    """Return the epoch timestamp of an alarm's next occurrence, or None if it has none"""
+    if after is None:
+        after = time.time()
+    return rule_for(alarm_data).next_after(after)
+
+
+class AlarmScheduler:
+    """Single background thread that fires alarms from a deadline-ordered heap
+    
+    With threaded=False there is no thread: the owner calls run_due() after
+    moving its clock, e.g. a VirtualClock jumped to next_due() in a simulation.
+    
+    Deadlines at or after `horizon` are only reported to on_schedule, not
+    queued; once the clock reaches `refill_at`, on_refill(now) is called to
+    move both on and queue the alarms that came into range.
+    """
+    
+    def __init__(self, on_fire, next_deadline=next_alarm_deadline, on_expire=None,
+                 on_missed=None, on_clock_jump=None, on_schedule=None, clock=SYSTEM_CLOCK,
+                 threaded=True, on_refill=None):
+        # on_fire(alarm_data, fire) and on_missed(alarm_data, fire) get a Fire
+        self.on_fire = on_fire
+        self.next_deadline = next_deadline
+        # Called for alarms whose rule has no further occurrence
+        self.on_expire = on_expire
+        # Called for occurrences dropped by the "drop" policy
+        self.on_missed = on_missed
+        # Called with the size in seconds of each detected clock jump
+        self.on_clock_jump = on_clock_jump
+        # Called with (alarm_data, deadline or None) whenever a deadline changes
+        self.on_schedule = on_schedule
+        self.on_refill = on_refill
+        self.horizon = math.inf
+        self.refill_at = math.inf
+        self.clock = clock
+        self.missed_policy = DEFAULT_MISSED_POLICY
+        self.missed_grace = DEFAULT_MISSED_GRACE
+        self.clock_jumps = 0
+        # Wall and monotonic readings from the last wake, for jump detection
+        self._last_clock = None
+        # Heap entries are [deadline, sequence, alarm_data, live]
+        self._heap = []
+        self._entries = {}
+        self._cancelled = 0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = True
+        # Number of times the scheduler thread woke up (for benchmarks)
+        self.wakeups = 0
+        self._thread = None
+        if threaded:
+            self._thread = threading.Thread(target=self._run, name="AlarmScheduler")
+            self._thread.daemon = True
+            self._thread.start()
+    
+    @profiled("alarm_engine")
+    def schedule(self, alarm_data, deadline=None):
+        """Queue an alarm at its next deadline, replacing any pending entry for it
+        
+        Returns False (and queues nothing) if the alarm will not fire again.
+        """
+        if deadline is None:
+            deadline = self.next_deadline(alarm_data, self.clock.time())
+        if deadline is None:
+            self.cancel(alarm_data)
+            return False
+        if deadline >= self.horizon:
+            # Beyond the load window: recorded, and queued by a later refill
+            with self._condition:
+                self._discard(id(alarm_data))
+            if self.on_schedule is not None:
+                self.on_schedule(alarm_data, deadline)
+            return True
+        entry = [deadline, next(self._sequence), alarm_data, True]
+        with self._condition:
+            self._discard(id(alarm_data))
+            self._entries[id(alarm_data)] = entry
+            heapq.heappush(self._heap, entry)
+            # Only wake the thread if the earliest deadline changed
+            if self._heap[0] is entry:
+                self._condition.notify()
+        if self.on_schedule is not None:
+            self.on_schedule(alarm_data, deadline)
+        return True
+    
+    def cancel(self, alarm_data):
+        """Remove a pending alarm; the heap entry is dropped lazily"""
+        with self._condition:
+            if self._discard(id(alarm_data)):
+                self._condition.notify()
+        if self.on_schedule is not None:
+            self.on_schedule(alarm_data, None)
+    
+    def stop(self):
+        """Stop the scheduler thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _discard(self, key):
+        """Mark the pending entry for an alarm dead (caller holds the lock)"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        entry[3] = False
+        self._cancelled += 1
+        # Rebuild once dead entries dominate so memory stays proportional
+        if self._cancelled > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[3]]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+    
+    def _clock_jump(self, now):
+        """Seconds the wall clock moved beyond monotonic time since the last
+        wake (suspend or a clock step), or 0 (caller holds the lock)"""
+        monotonic = self.clock.monotonic()
+        last = self._last_clock
+        self._last_clock = (now, monotonic)
+        if last is None:
+            return 0
+        drift = (now - last[0]) - (monotonic - last[1])
+        return drift if abs(drift) > JUMP_THRESHOLD else 0
+    
+    def next_due(self):
+        """Earliest pending deadline or refill, or None when nothing is scheduled"""
+        with self._condition:
+            self._drop_cancelled()
+            due = min(self._heap[0][0] if self._heap else math.inf, self.refill_at)
+            return None if due == math.inf else due
+    
+    def _drop_cancelled(self):
+        """Drop cancelled entries sitting at the top of the heap (caller holds the lock)"""
+        while self._heap and not self._heap[0][3]:
+            heapq.heappop(self._heap)
+            self._cancelled -= 1
+    
+    def _take_due(self):
+        """Pop what is due now (caller holds the lock)
+        
+        Returns ("fire", entry), ("jump", seconds), ("refill", now), ("wait",
+        seconds until the next deadline) or ("idle", None) when nothing is
+        scheduled.
+        """
+        self._drop_cancelled()
+        if not self._heap and self.refill_at == math.inf:
+            return "idle", None
+        now = self.clock.time()
+        jump = self._clock_jump(now)
+        if jump:
+            return "jump", jump
+        if now >= self.refill_at:
+            return "refill", now
+        delay = min(self._heap[0][0] if self._heap else math.inf, self.refill_at) - now
+        if delay > 0:
+            return "wait", delay
+        entry = heapq.heappop(self._heap)
+        entry[3] = False
+        del self._entries[id(entry[2])]
+        return "fire", entry
+    
+    def _pop_due(self):
+        """Block until the earliest live entry is due or the clock jumps
+        
+        Returns ("fire", entry), ("jump", seconds), ("refill", now) or None on stop.
+        """
+        with self._condition:
+            while self._running:
+                kind, value = self._take_due()
+                if kind == "idle":
+                    self._condition.wait()
+                    self.wakeups += 1
+                    WAKEUPS.inc()
+                    # Nothing was pending, so there is nothing to catch up on
+                    self._last_clock = None
+                elif kind == "wait":
+                    # Short sleeps keep a suspended or stepped clock from
+                    # delaying the next deadline
+                    self._condition.wait(min(value, MAX_WAIT))
+                    self.wakeups += 1
+                    WAKEUPS.inc()
+                else:
+                    return kind, value
+            return None
+    
+    def run_due(self):
+        """Fire everything due by the clock's time on the calling thread; returns how many
+        
+        For schedulers created with threaded=False.
+        """
+        fired = 0
+        while True:
+            with self._condition:
+                kind, value = self._take_due()
+                if kind == "idle":
+                    self._last_clock = None
+            if kind in ("idle", "wait"):
+                return fired
+            self._handle(kind, value)
+            fired += kind == "fire"
+    
+    def _run(self):
+        """Scheduler loop: sleep until the next deadline, fire, reschedule"""
+        while True:
+            item = self._pop_due()
+            if item is None:
+                return
+            self._handle(*item)
+    
+    def _handle(self, kind, value):
+        """Fire and reschedule a due entry, or report a clock jump or a refill"""
+        if kind == "jump":
+            self.clock_jumps += 1
+            CLOCK_JUMPS.inc()
+            if self.on_clock_jump is not None:
+                self.on_clock_jump(value)
+            return
+        if kind == "refill":
+            # on_refill sets the next one
+            self.refill_at = math.inf
+            if self.on_refill is not None:
+                self.on_refill(value)
+            return
+        
+        deadline, _, alarm_data, _ = value
+        if not alarm_data.get("active", True):
+            if self.on_schedule is not None:
+                self.on_schedule(alarm_data, None)
+            return
+        
+        fire, next_deadline = self._resolve_fire(alarm_data, deadline)
+        FIRE_LATENESS.observe(max(fire.lateness, 0.0))
+        if fire.missed:
+            MISSED.inc(fire.missed)
+        try:
+            if fire.missed and self.missed_policy == "drop":
+                if self.on_missed is not None:
+                    self.on_missed(alarm_data, fire)
+            else:
+                FIRES.inc()
+                self.on_fire(alarm_data, fire)
+        except Exception as e:
+            print(f"Error firing alarm: {e}")
+        
+        # Recurring alarms stay queued until they are deactivated
+        if alarm_data.get("active", True):
+            if not self.schedule(alarm_data, next_deadline):
+                if self.on_expire is not None:
+                    self.on_expire(alarm_data)
+        elif self.on_schedule is not None:
+            self.on_schedule(alarm_data, None)
+    
+    @profiled("alarm_engine")
+    def _resolve_fire(self, alarm_data, deadline):
+        """Describe a due occurrence and find the alarm's next deadline
+        
+        With "coalesce" and "drop", occurrences that also passed while the
+        alarm was late are folded into this one and the alarm resumes from now.
+        """
+        now = self.clock.time()
+        lateness = now - deadline
+        next_deadline = self.next_deadline(alarm_data, deadline)
+        if lateness <= self.missed_grace:
+            return Fire(deadline, now, lateness, 0), next_deadline
+        
+        missed = 1
+        if self.missed_policy != "fire_late":
+            while next_deadline is not None and next_deadline <= now:
+                if missed >= MAX_COUNTED_MISSES:
+                    next_deadline = self.next_deadline(alarm_data, now)
+                    break
+                missed += 1
+                next_deadline = self.next_deadline(alarm_data, next_deadline)
+        return Fire(deadline, now, lateness, missed), next_deadline
+
+class AlarmEngine:
+    """Owns the alarm list, the scheduler and the settings file"""
+    
+    def __init__(self, config_file="alarm_settings.json", clock=SYSTEM_CLOCK, threaded=True,
+                 database=None):
+        # Where "now" comes from; a VirtualClock with threaded=False for simulations
+        self.clock = clock
+        self.config_file = config_file
+        self.settings = {}
+        # Indexed by id, name, state and next fire; see alarm_store.py. With a
+        # database path the alarms live in SQLite instead (see alarm_db.py)
+        self.database = database
+        if database:
+            self.alarms = alarm_db.AlarmDatabase(database)
+        else:
+            self.alarms = AlarmStore()
+        self.alarm_sound = "sound.wav"
+        self.snooze_time = DEFAULT_SNOOZE_MINUTES
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.store = SettingsStore(config_file, self.snapshot)
+        self.scheduler = AlarmScheduler(self._fire, on_expire=self._expire,
+                                        on_missed=self._missed, on_clock_jump=self._clock_jumped,
+                                        on_schedule=self._scheduled, clock=clock,
+                                        threaded=threaded, on_refill=self._refill)
+        if database:
+            # Nothing is queued until load() reads the first window
+            self.scheduler.horizon = -math.inf
+        metrics.gauge("alarm_scheduler_queue_depth", "Alarms waiting in the scheduler",
+                      function=lambda: len(self.scheduler))
+        metrics.gauge("alarm_scheduler_heap_entries", "Scheduler heap entries, including cancelled ones",
+                      function=lambda: len(self.scheduler._heap))
+        metrics.gauge("alarms_stored", "Alarms in the store", function=lambda: len(self.alarms))
+        metrics.gauge("alarms_active", "Active alarms", function=lambda: self.alarms.count(True))
+    
+    @profiled("alarm_engine")
+    def load(self):
+        """Load settings from disk and queue every active alarm"""
+        settings = self.store.load()
+        
+        with self._lock:
+            self.settings = settings
+            self.alarm_sound = self.settings.get("alarm_sound", self.alarm_sound)
+            self.snooze_time = self.settings.get("snooze_time", self.snooze_time)
+            self.set_missed_policy(self.settings.get("missed_policy", self.scheduler.missed_policy),
+                                   self.settings.get("missed_grace", self.scheduler.missed_grace))
+            if self.database:
+                if self._load_database():
+                    self.save()
+                return
+            # Alarms saved before ids existed get one here, written back below
+            saved_alarms = self.settings.pop("saved_alarms", [])
+            needs_ids = any(not alarm.get("id") for alarm in saved_alarms)
+            self.alarms.reset(saved_alarms)
+            for alarm in self.alarms:
+                if alarm.get("active", True):
+                    try:
+                        scheduled = self.scheduler.schedule(alarm)
+                    except (ValueError, KeyError) as e:
+                        print(f"Skipping alarm {alarm.get('name')!r}: {e}")
+                        scheduled = False
+                    # One-off alarms that already passed stay in the list, inactive
+                    if not scheduled:
+                        self.alarms.update(alarm["id"], active=False)
+        if needs_ids:
+            self.save()
+    
+    def _load_database(self):
+        """Move settings-file alarms into a new database, then queue the first window
+        
+        Returns True if the settings file should be rewritten without the alarms.
+        """
+        saved_alarms = self.settings.get("saved_alarms")
+        moved = False
+        if saved_alarms and not len(self.alarms):
+            with self.alarms.batch():
+                for alarm in saved_alarms:
+                    alarm = AlarmRecord(alarm)
+                    self.alarms.add(alarm)
+                    # Records the next fire; nothing is queued yet
+                    if alarm.get("active", True) and not self._schedule_saved(alarm, None):
+                        self.alarms.update(alarm["id"], active=False)
+            del self.settings["saved_alarms"]
+            moved = True
+        elif saved_alarms:
+            print(f"Ignoring the {len(saved_alarms)} alarms in {self.config_file}: "
+                  f"{self.database} already holds alarms")
+        self._load_window(self.clock.time(), catch_up=True)
+        return moved
+    
+    def _schedule_saved(self, alarm_data, deadline):
+        """Queue a loaded alarm; False if it will not ring again or is invalid"""
+        try:
+            return self.scheduler.schedule(alarm_data, deadline)
+        except (ValueError, KeyError) as e:
+            print(f"Skipping alarm {alarm_data.get('name')!r}: {e}")
+            return False
+    
+    @profiled("alarm_engine")
+    def _load_window(self, now, catch_up=False):
+        """Queue the soonest database alarms that are not queued yet
+        
+        Alarms due within LOAD_WINDOW are queued, up to LOAD_LIMIT of them
+        plus any sharing the last one's deadline; the horizon then stops at
+        the first alarm left out. With catch_up (at load) alarms whose next
+        fire passed while the engine was not running are rescheduled from
+        now, as load() does without a database; otherwise they go through
+        the missed-alarm policy.
+        """
+        with self._lock, self.alarms.batch():
+            start = self.scheduler.horizon
+            self.scheduler.horizon = now + LOAD_WINDOW
+            queued = 0
+            last = None
+            for alarm_data in self.alarms.due_before(self.scheduler.horizon, start):
+                deadline = self.alarms.next_fire(alarm_data["id"])
+                if deadline is None or not alarm_data.get("active", True):
+                    continue
+                if catch_up and deadline < now:
+                    deadline = None
+                elif queued >= LOAD_LIMIT and deadline != last:
+                    self.scheduler.horizon = deadline
+                    break
+                else:
+                    queued += 1
+                    last = deadline
+                if not self._schedule_saved(alarm_data, deadline):
+                    self.alarms.update(alarm_data["id"], active=False)
+            self.scheduler.refill_at = now + (self.scheduler.horizon - now) / 2
+    
+    def _refill(self, now):
+        """Scheduler callback: move the load window on"""
+        self._load_window(now)
+    
+    def set_missed_policy(self, policy, grace=None):
+        """Choose how alarms missed during a stall, suspend or clock step are handled"""
+        if policy not in MISSED_POLICIES:
+            print(f"Unknown missed-alarm policy {policy!r}, using {DEFAULT_MISSED_POLICY!r}")
+            policy = DEFAULT_MISSED_POLICY
+        self.scheduler.missed_policy = policy
+        self.settings["missed_policy"] = policy
+        if grace is not None:
+            self.scheduler.missed_grace = float(grace)
+            self.settings["missed_grace"] = self.scheduler.missed_grace
+    
+    def snapshot(self):
+        """Return a JSON-safe copy of the settings, including the alarm list"""
+        with self._lock:
+            settings = dict(self.settings)
+            settings["alarm_sound"] = self.alarm_sound
+            settings["snooze_time"] = self.snooze_time
+            if not self.database:
+                settings["saved_alarms"] = list(self.alarms)
+            return to_json_safe(settings)
+    
+    def save(self):
+        """Schedule a write of the settings; bursts of changes share one write"""
+        self.store.mark_dirty()
+    
+    def flush(self):
+        """Write any pending settings changes immediately"""
+        self.store.flush()
+    
+    def add_listener(self, callback):
+        """Register callback(event, alarm_data) for "fire", "add", "update", "remove",
+        "snooze", "dismiss", "expire", "missed", "clock_jump" and "batch" events
+        
+        Listeners run on the thread that caused the event (often the scheduler
+        thread) and must not block; UIs should hand events to their own loop.
+        
+        For "fire" and "missed" the alarm's "_last_fire" key holds the Fire
+        (deadline, lateness, missed occurrences); "clock_jump" passes None and
+        "batch" passes the BatchResult of a batch operation.
+        """
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        """Unregister a listener added with add_listener()"""
+        self._listeners.remove(callback)
+    
+    def _notify(self, event, alarm_data):
+        for callback in list(self._listeners):
+            try:
+                callback(event, alarm_data)
+            except Exception as e:
+                print(f"Error in alarm listener: {e}")
+    
+    @profiled("alarm_engine")
+    def _fire(self, alarm_data, fire):
+        """Scheduler callback: forward the fire to listeners"""
+        alarm_data["_last_fire"] = fire
+        if fire.missed:
+            print(f"Alarm {alarm_data['name']!r} rang {fire.lateness:.0f} s late "
+                  f"({fire.missed} missed occurrence(s), policy {self.scheduler.missed_policy})")
+        self._notify("fire", alarm_data)
+    
+    def _missed(self, alarm_data, fire):
+        """Scheduler callback: missed occurrences dropped by policy"""
+        alarm_data["_last_fire"] = fire
+        print(f"Dropped {fire.missed} missed occurrence(s) of alarm {alarm_data['name']!r}, "
+              f"due {datetime.datetime.fromtimestamp(fire.deadline):%Y-%m-%d %H:%M:%S}")
+        self._notify("missed", alarm_data)
+    
+    def _clock_jumped(self, seconds):
+        """Scheduler callback: the wall clock moved against monotonic time"""
+        print(f"Clock jumped {seconds:+.1f} s (suspend/resume or clock change)")
+        self._notify("clock_jump", None)
+    
+    @profiled("alarm_engine")
+    def _expire(self, alarm_data):
+        """Scheduler callback: an alarm has fired for the last time"""
+        with self._lock:
+            if alarm_data.get("id") in self.alarms:
+                self.alarms.update(alarm_data["id"], active=False)
+        self.save()
+        self._notify("expire", alarm_data)
+    
+    def _scheduled(self, alarm_data, deadline):
+        """Scheduler callback: keep the store's next-fire index current"""
+        alarm_id = alarm_data.get("id")
+        if alarm_id is not None:
+            self.alarms.set_next_fire(alarm_id, deadline)
+    
+    def add_alarm(self, alarm_time, name="Unnamed Alarm", repeat=None, timezone=None):
+        """Create, store and schedule a new alarm"""
+        alarm_data = make_alarm(alarm_time, name, repeat=repeat, timezone=timezone,
+                                now=self.clock.time())
+        with self._lock:
+            self.alarms.add(alarm_data)
+            if not self.scheduler.schedule(alarm_data):
+                self.alarms.update(alarm_data["id"], active=False)
+        self.save()
+        self._notify("add", alarm_data)
+        return alarm_data
+    
+    def update_alarm(self, alarm_id, **changes):
+        """Change an alarm's fields (time, name, repeat, timezone, active) and reschedule it"""
+        with self._lock:
+            alarm_data = self.alarms.get(alarm_id)
+            if alarm_data is None:
+                raise KeyError(alarm_id)
+            # Validate the new rule before touching the stored alarm
+            candidate = {key: value for key, value in alarm_data.items() if key != "_rule"}
+            if changes.get("repeat"):
+                # A new rule is dated like a new alarm's (a copy, so the caller's stays as given)
+                changes["repeat"] = dict(changes["repeat"])
+                candidate.update(changes)
+                date_rule(candidate, self.clock.time())
+            else:
+                candidate.update(changes)
+                rule_for(candidate)
+            self.alarms.update(alarm_id, **changes)
+            if not alarm_data.get("active", True):
+                self.scheduler.cancel(alarm_data)
+            elif not self.scheduler.schedule(alarm_data):
+                self.alarms.update(alarm_id, active=False)
+        self.save()
+        self._notify("update", alarm_data)
+        return alarm_data
+    
+    def _prepare(self, record):
+        """Validated alarm record built from an imported or API row"""
+        if not isinstance(record, dict):
+            raise ValueError("alarm must be an object")
+        alarm_time = record.get("time")
+        if not isinstance(alarm_time, str) or not alarm_time:
+            raise ValueError("missing time")
+        name = record.get("name") or "Unnamed Alarm"
+        if not isinstance(name, str):
+            raise ValueError("name must be text")
+        repeat = record.get("repeat")
+        if repeat is not None and not isinstance(repeat, dict):
+            raise ValueError("repeat must be an object")
+        alarm_data = make_alarm(alarm_time, name, alarm_io.parse_active(record.get("active", True)),
+                                repeat, record.get("timezone"), now=self.clock.time())
+        if record.get("id"):
+            alarm_data["id"] = str(record["id"])
+        # e.g. where a calendar import came from
+        for key, value in record.items():
+            if key not in ALARM_FIELDS and not key.startswith("_"):
+                alarm_data[key] = value
+        return alarm_data
+    
+    @profiled("alarm_engine")
+    def _add_rows(self, rows, atomic=False, remove_ids=()):
+        """Validate (row, record) pairs, then add or replace all valid alarms at once
+        
+        Alarms listed in remove_ids are deleted in the same transaction.
+        """
+        prepared = []
+        errors = []
+        for row, record in rows:
+            if isinstance(record, Exception):
+                errors.append(RowError(row, str(record)))
+                continue
+            try:
+                prepared.append(self._prepare(record))
+            except (ValueError, KeyError, TypeError) as e:
+                errors.append(RowError(row, str(e) or type(e).__name__))
+        if not (prepared or remove_ids) or (atomic and errors):
+            return BatchResult([], errors)
+        
+        applied = []
+        with self._lock, self.alarms.batch():
+            # A known id replaces that alarm, so exports can be re-imported
+            replaced, _ = self._find_all(alarm_data.get("id") for alarm_data in prepared)
+            stale, _ = self._find_all(remove_ids)
+            removed = self._remove_found(replaced + stale)
+            for alarm_data in prepared:
+                self.alarms.add(alarm_data)
+                if alarm_data["active"] and not self.scheduler.schedule(alarm_data):
+                    self.alarms.update(alarm_data["id"], active=False)
+                applied.append(alarm_data)
+        self.save()
+        result = BatchResult(applied, errors, removed)
+        self._notify("batch", result)
+        return result
+    
+    def add_alarms(self, records, atomic=False):
+        """Add many alarms (dicts with time, name, active, repeat, timezone, id) at once
+        
+        Invalid records are reported by position (from 1) in the result's
+        errors; with atomic=True any invalid record means nothing is added.
+        """
+        return self._add_rows(enumerate(records, 1), atomic)
+    
+    def import_alarms(self, path, fmt=None, atomic=False):
+        """Add the alarms in a CSV or JSON-lines file; errors are reported by line"""
+        return self._add_rows(alarm_io.read_alarms(path, fmt), atomic)
+    
+    @profiled("alarm_engine")
+    def import_calendar(self, path, calendar=None, atomic=False):
+        """Add or refresh the alarms for the events of an iCalendar (.ics) file
+        
+        Importing the same calendar again only touches events that changed:
+        new and edited events are (re)added and alarms of events no longer in
+        the file are removed. `calendar` names the source and defaults to the
+        file's absolute path.
+        """
+        calendar = calendar or os.path.abspath(path)
+        with self._lock:
+            imported = {}
+            for alarm_data in self.alarms:
+                if alarm_data.get("calendar") == calendar:
+                    imported.setdefault(alarm_data.get("ical_uid"), []).append(alarm_data)
+        known = {key: alarms[0].get("ical_hash") for key, alarms in imported.items()}
+        unchanged = set()
+        rows = list(ical_import.read_calendar(path, calendar, known, unchanged,
+                                              self.clock.time()))
+        # Changed events are replaced, and events gone from the file removed
+        remove_ids = [alarm_data["id"] for key, alarms in imported.items()
+                      if key not in unchanged for alarm_data in alarms]
+        return self._add_rows(rows, atomic, remove_ids)
+    
+    @profiled("alarm_engine")
+    def export_alarms(self, path, fmt=None):
+        """Write every alarm to a CSV or JSON-lines file and return how many"""
+        # Iterated as written, so a database is read a chunk at a time
+        return alarm_io.write_alarms(self.alarms, path, fmt)
+    
+    def _find_all(self, alarm_ids):
+        """(row, alarm) for the stored ids, and RowErrors for unknown ones"""
+        found = []
+        errors = []
+        for row, alarm_id in enumerate(alarm_ids, 1):
+            alarm_data = self.alarms.get(alarm_id)
+            if alarm_data is None:
+                errors.append(RowError(row, f"no alarm with id {alarm_id!r}"))
+            else:
+                found.append((row, alarm_data))
+        return found, errors
+    
+    def _remove_found(self, found):
+        """Unschedule and delete (row, alarm) pairs in one store batch"""
+        with self.alarms.batch():
+            for _, alarm_data in found:
+                self.scheduler.cancel(alarm_data)
+                # A fire in progress must not reschedule it
+                alarm_data["active"] = False
+            return self.alarms.remove_many([alarm_data["id"] for _, alarm_data in found])
+    
+    @profiled("alarm_engine")
+    def set_alarms_active(self, alarm_ids, active=True, atomic=False):
+        """Turn many alarms on or off at once"""
+        with self._lock:
+            found, errors = self._find_all(alarm_ids)
+            if not found or (atomic and errors):
+                return BatchResult([], errors)
+            applied = []
+            with self.alarms.batch():
+                for row, alarm_data in found:
+                    self.alarms.update(alarm_data["id"], active=active)
+                    if not active:
+                        self.scheduler.cancel(alarm_data)
+                    elif not self.scheduler.schedule(alarm_data):
+                        # Nothing left to ring, e.g. a one-off alarm in the past
+                        self.alarms.update(alarm_data["id"], active=False)
+                        errors.append(RowError(row, f"alarm {alarm_data['id']!r} will not ring again"))
+                        continue
+                    applied.append(alarm_data)
+        self.save()
+        self._notify("batch", BatchResult(applied, errors))
+        return BatchResult(applied, errors)
+    
+    @profiled("alarm_engine")
+    def remove_alarms(self, alarm_ids, atomic=False):
+        """Delete many alarms at once"""
+        with self._lock:
+            found, errors = self._find_all(alarm_ids)
+            if not found or (atomic and errors):
+                return BatchResult([], errors)
+            removed = self._remove_found(found)
+        self.save()
+        result = BatchResult([], errors, removed)
+        self._notify("batch", result)
+        return result
+    
+    def remove_alarm(self, alarm_data):
+        """Deactivate and delete an alarm"""
+        with self._lock:
+            self.scheduler.cancel(alarm_data)
+            self.alarms.remove(alarm_data["id"])
+            # A fire in progress must not reschedule it
+            alarm_data["active"] = False
+        self.save()
+        self._notify("remove", alarm_data)
+    
+    @profiled("alarm_engine")
+    def snooze_alarm(self, alarm_data, minutes=None):
+        """Schedule a one-off snoozed copy of an alarm and return it"""
+        if minutes is None:
+            minutes = self.snooze_time
+        new_time = self.clock.now() + datetime.timedelta(minutes=minutes)
+        new_alarm_data = make_alarm(new_time.strftime("%H:%M:%S"), f"{alarm_data['name']} (Snoozed)",
+                                    repeat={"type": "once", "date": new_time.date().isoformat()},
+                                    now=self.clock.time())
+        with self._lock:
+            self.alarms.add(new_alarm_data)
+            self.scheduler.schedule(new_alarm_data)
+        self.save()
+        self._notify("snooze", new_alarm_data)
+        return new_alarm_data
+    
+    def dismiss_alarm(self, alarm_data):
+        """Tell listeners a ringing alarm was dismissed (without snoozing)"""
+        self._notify("dismiss", alarm_data)
+    
+    def stop(self):
+        """Stop the scheduler thread and write pending settings"""
+        self.scheduler.stop()
+        self.flush()
+        if self.database:
+            self.alarms.close()
+
+
+def main(argv=None):
+    """Run the engine without a UI, printing each alarm as it fires"""
+    import argparse
+    # control imports this module, so it is only needed here
+    import control
+    parser = argparse.ArgumentParser(description="Run the alarm engine without a UI")
+    parser.add_argument("settings", nargs="?", default="alarm_settings.json",
+                        help="settings file holding the alarms")
+    metrics.add_arguments(parser)
+    profiling.add_arguments(parser)
+    control.add_arguments(parser)
+    alarm_db.add_arguments(parser)
+    args = parser.parse_args(argv)
+    metrics.export(args.metrics_port, args.metrics_json)
+    if args.profile:
+        profiling.PROFILER.start(args.profile_dir, interval=args.profile)
+    engine = AlarmEngine(args.settings, database=args.alarm_db)
+    engine.add_listener(lambda event, alarm: event == "fire" and print(
+        f"{engine.clock.now():%Y-%m-%d %H:%M:%S} Alarm: {alarm['name']} ({alarm['time']}), "
+        f"{alarm['_last_fire'].lateness * 1000:.1f} ms late", flush=True))
+    engine.load()
+    server = None if args.no_control else control.serve(engine, args.control_socket)
+    print(f"Alarm engine running with {len(engine.scheduler)} scheduled alarms", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        if server is not None:
+            server.stop()
+        engine.stop()
+        profiling.PROFILER.stop()
+
+
+if __name__ == "__main__":
+    main()
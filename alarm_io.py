@@ -0,0 +1,144 @@
+"""Streaming CSV and JSON-lines import/export of alarms.
+
+Both formats carry the persisted alarm fields: id, time, name, active,
+repeat and timezone. In CSV, ``repeat`` is either a rule type ("daily",
+"weekdays", ...) or a JSON object such as ``{"type": "weekly", "days": [0, 2]}``,
+and empty cells mean the default. Files are read and written one row at a
+time, so exports of any size never build the whole text in memory.
+
+read_alarms() yields ``(row, record)`` pairs, where ``row`` is the line (CSV:
+record) number and ``record`` is either a dict or the ValueError explaining
+why that row could not be parsed; validating the alarm itself is left to
+AlarmEngine.
+"""
+import csv
+import json
+import os
+
+
+FIELDS = ("id", "time", "name", "active", "repeat", "timezone")
+
+# Rule types that are shorthand for a weekly rule, as on the Set Alarm tab
+WEEKLY_SHORTHANDS = {
+    "weekdays": [0, 1, 2, 3, 4],
+    "weekends": [5, 6],
+}
+
+FORMATS = ("csv", "jsonl")
+
+TRUE_WORDS = {"1", "true", "yes", "on", "y"}
+FALSE_WORDS = {"0", "false", "no", "off", "n"}
+
+
+def detect_format(path):
+    """Format implied by a file name: "csv" or "jsonl" """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError(f"Unknown alarm file type {extension!r} (use .csv or .jsonl)")
+
+
+def parse_active(value):
+    """Boolean from a CSV cell; empty means active"""
+    if isinstance(value, bool):
+        return value
+    word = str(value).strip().lower()
+    if not word or word in TRUE_WORDS:
+        return True
+    if word in FALSE_WORDS:
+        return False
+    raise ValueError(f"active must be true or false, not {value!r}")
+
+
+def parse_repeat(value):
+    """Recurrence rule from a CSV cell, or None for the default"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    if value.startswith("{"):
+        repeat = json.loads(value)
+        if not isinstance(repeat, dict):
+            raise ValueError("repeat must be a JSON object")
+        return repeat
+    days = WEEKLY_SHORTHANDS.get(value.lower())
+    if days is not None:
+        return {"type": "weekly", "days": list(days)}
+    return {"type": value}
+
+
+def _csv_record(cells):
+    """Alarm record from one CSV row (a dict keyed by header)"""
+    if None in cells:
+        raise ValueError("more cells than header columns")
+    record = {"time": (cells.get("time") or "").strip(),
+              "name": (cells.get("name") or "").strip(),
+              "active": parse_active(cells.get("active") or "")}
+    alarm_id = (cells.get("id") or "").strip()
+    if alarm_id:
+        record["id"] = alarm_id
+    repeat = parse_repeat(cells.get("repeat"))
+    if repeat is not None:
+        record["repeat"] = repeat
+    timezone = (cells.get("timezone") or "").strip()
+    if timezone:
+        record["timezone"] = timezone
+    return record
+
+
+def read_alarms(path, fmt=None):
+    """Yield (row, record or ValueError) for each alarm in a CSV or JSON-lines file"""
+    fmt = fmt or detect_format(path)
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            if reader.fieldnames is None or "time" not in reader.fieldnames:
+                raise ValueError("CSV header must include a 'time' column")
+            for cells in reader:
+                try:
+                    yield reader.line_num, _csv_record(cells)
+                except ValueError as e:
+                    yield reader.line_num, e
+        elif fmt == "jsonl":
+            for row, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        raise ValueError("each line must hold a JSON object")
+                    yield row, record
+                except ValueError as e:
+                    yield row, e
+        else:
+            raise ValueError(f"Unknown alarm file format {fmt!r}")
+
+
+def write_alarms(alarms, path, fmt=None):
+    """Write alarm records to a CSV or JSON-lines file and return how many were written"""
+    fmt = fmt or detect_format(path)
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for alarm_data in alarms:
+                repeat = alarm_data.get("repeat")
+                writer.writerow([
+                    alarm_data.get("id", ""),
+                    alarm_data.get("time", ""),
+                    alarm_data.get("name", ""),
+                    "true" if alarm_data.get("active", True) else "false",
+                    json.dumps(repeat, separators=(",", ":")) if repeat else "",
+                    alarm_data.get("timezone", ""),
+                ])
+                count += 1
+        elif fmt == "jsonl":
+            for alarm_data in alarms:
+                record = {key: alarm_data[key] for key in FIELDS if key in alarm_data}
+                f.write(json.dumps(record, separators=(",", ":")) + "\n")
+                count += 1
+        else:
+            raise ValueError(f"Unknown alarm file format {fmt!r}")
+    return count
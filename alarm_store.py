@@ -0,0 +1,365 @@
+"""Indexed alarm collection with stable IDs and change events.
+
+Every alarm record gets a unique, persisted ``id``. The store keeps the
+records in display order and maintains secondary indexes so adds, removals
+and next-fire updates are O(log n):
+
+* by id: dict lookup (dicts keep insertion order, which is display order);
+* by position: a Fenwick tree over insertion sequence numbers, so the row
+  of an alarm, the alarm at a row and a removal are O(log n);
+* by next fire: a heap of (deadline, sequence) fed by the scheduler, with
+  entries replaced by a later update left in place and skipped when read;
+* by name (case-insensitive) and by state (active / inactive): dicts of sets.
+
+Both the tree and the heap are rebuilt once dead entries outnumber live
+ones, so memory stays proportional to the alarms stored.
+
+Listeners receive ``callback(change, alarm_data, row, version)`` for the
+changes "add", "update", "remove" and "reset". ``row`` is the alarm's
+position just before a removal and just after an add or update, and
+``version`` increases by one per change, so a view that applies changes in
+order can update single rows and detect missed changes. Changes made inside
+``with store.batch():`` are reported once, as a single "batch" change with
+no alarm or row, when the block ends.
+"""
+import heapq
+import itertools
+from contextlib import contextmanager
+import os
+import threading
+
+
+class AlarmRecord(dict):
+    """An alarm's fields; a dict that can be weakly referenced (see alarm_db.py)"""
+
+    __slots__ = ("__weakref__",)
+
+
+class _RowIndex:
+    """Which sequence numbers are still present, with O(log n) rank and select
+
+    A Fenwick tree over presence bits; sequence numbers are appended in order.
+    """
+
+    def __init__(self):
+        # 1-based; node i sums the bits of positions (i - lowbit(i), i]
+        self._tree = [0]
+
+    def __len__(self):
+        """Sequence numbers ever appended, present or not"""
+        return len(self._tree) - 1
+
+    def append(self):
+        """Mark the next sequence number present"""
+        tree = self._tree
+        i = len(tree)
+        total = 1
+        j = i - 1
+        stop = i - (i & -i)
+        while j > stop:
+            total += tree[j]
+            j -= j & -j
+        tree.append(total)
+
+    def discard(self, seq):
+        tree = self._tree
+        i = seq + 1
+        while i < len(tree):
+            tree[i] -= 1
+            i += i & -i
+
+    def rank(self, seq):
+        """Present sequence numbers below `seq`"""
+        tree = self._tree
+        total = 0
+        i = seq
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def select(self, row):
+        """The present sequence number with `row` present ones below it"""
+        tree = self._tree
+        position = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            following = position + step
+            if following < len(tree) and tree[following] <= row:
+                position = following
+                row -= tree[following]
+            step >>= 1
+        return position
+
+
+class AlarmStore:
+    """Alarms by id in display order, with name, state and next-fire indexes"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._by_id = {}
+        self._sequence = itertools.count()
+        self._seq_of = {}
+        self._id_at_seq = {}
+        # Present sequence numbers: the k-th present one is the alarm shown in row k
+        self._rows = _RowIndex()
+        self._by_name = {}
+        self._by_state = {True: set(), False: set()}
+        # Heap of (deadline, sequence), live while it matches id -> deadline
+        self._fire_heap = []
+        self._next_fire = {}
+        self._listeners = []
+        self.version = 0
+        self._batch_depth = 0
+        self._batch_changed = False
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __iter__(self):
+        """Alarms in display order (iterates over a copy)"""
+        with self._lock:
+            return iter(list(self._by_id.values()))
+
+    def snapshot(self):
+        """(version, alarms in display order) read atomically"""
+        with self._lock:
+            return self.version, list(self._by_id.values())
+
+    def __contains__(self, alarm_id):
+        return alarm_id in self._by_id
+
+    def add_listener(self, callback):
+        """Register callback(change, alarm_data, row, version)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        """Unregister a listener added with add_listener()"""
+        self._listeners.remove(callback)
+
+    def _notify(self, change, alarm_data, row):
+        if self._batch_depth:
+            self._batch_changed = True
+            return
+        self.version += 1
+        for callback in list(self._listeners):
+            try:
+                callback(change, alarm_data, row, self.version)
+            except Exception as e:
+                print(f"Error in alarm store listener: {e}")
+
+    @contextmanager
+    def batch(self):
+        """Group changes into one transaction and one "batch" change event"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    if self._batch_changed:
+                        self._batch_changed = False
+                        self._notify("batch", None, None)
+
+    def new_id(self):
+        """A fresh id not used by any stored alarm"""
+        while True:
+            # 48 random bits: collisions are retried, and rare even at 100k alarms
+            alarm_id = os.urandom(6).hex()
+            if alarm_id not in self._by_id:
+                return alarm_id
+
+    def _insert(self, alarm_data):
+        """Index a record, giving it an id if it has none (caller holds the lock)"""
+        alarm_id = alarm_data.get("id")
+        if not alarm_id or alarm_id in self._by_id:
+            alarm_id = alarm_data["id"] = self.new_id()
+        seq = next(self._sequence)
+        self._by_id[alarm_id] = alarm_data
+        self._seq_of[alarm_id] = seq
+        self._id_at_seq[seq] = alarm_id
+        # Sequence numbers only grow, so new alarms go at the end
+        self._rows.append()
+        self._by_name.setdefault(name_key(alarm_data), set()).add(alarm_id)
+        self._by_state[bool(alarm_data.get("active", True))].add(alarm_id)
+        return alarm_id
+
+    def reset(self, alarms):
+        """Replace the contents (e.g. after loading settings)"""
+        with self._lock:
+            self._by_id.clear()
+            self._sequence = itertools.count()
+            self._seq_of.clear()
+            self._id_at_seq.clear()
+            self._rows = _RowIndex()
+            self._by_name.clear()
+            self._by_state = {True: set(), False: set()}
+            self._fire_heap = []
+            self._next_fire.clear()
+            for alarm_data in alarms:
+                self._insert(alarm_data)
+            self._notify("reset", None, None)
+
+    def add(self, alarm_data):
+        """Store a new alarm and return its id"""
+        with self._lock:
+            alarm_id = self._insert(alarm_data)
+            self._notify("add", alarm_data, len(self._by_id) - 1)
+            return alarm_id
+
+    def get(self, alarm_id):
+        """Alarm with the given id, or None"""
+        return self._by_id.get(alarm_id)
+
+    def row_of(self, alarm_id):
+        """Display position of an alarm"""
+        with self._lock:
+            return self._rows.rank(self._seq_of[alarm_id])
+
+    def at(self, row):
+        """Alarm shown at a display position"""
+        with self._lock:
+            if row < 0:
+                row += len(self._by_id)
+            if not 0 <= row < len(self._by_id):
+                raise IndexError(row)
+            return self._by_id[self._id_at_seq[self._rows.select(row)]]
+
+    def update(self, alarm_id, **changes):
+        """Change fields of an alarm, keeping the indexes in step"""
+        with self._lock:
+            alarm_data = self._by_id[alarm_id]
+            old_name = name_key(alarm_data)
+            old_state = bool(alarm_data.get("active", True))
+            alarm_data.update(changes)
+            # Any cached compiled rule may be stale now
+            alarm_data.pop("_rule", None)
+            if name_key(alarm_data) != old_name:
+                self._discard_name(old_name, alarm_id)
+                self._by_name.setdefault(name_key(alarm_data), set()).add(alarm_id)
+            new_state = bool(alarm_data.get("active", True))
+            if new_state != old_state:
+                self._by_state[old_state].discard(alarm_id)
+                self._by_state[new_state].add(alarm_id)
+            self._notify("update", alarm_data, self.row_of(alarm_id))
+            return alarm_data
+
+    def remove(self, alarm_id):
+        """Delete an alarm and return it"""
+        with self._lock:
+            alarm_data = self._by_id[alarm_id]
+            row = self._rows.rank(self._seq_of[alarm_id])
+            self._delete(alarm_id)
+            self._compact()
+            self._notify("remove", alarm_data, row)
+            return alarm_data
+
+    def _delete(self, alarm_id):
+        """Drop an alarm from every index (caller holds the lock)"""
+        alarm_data = self._by_id.pop(alarm_id)
+        seq = self._seq_of.pop(alarm_id)
+        del self._id_at_seq[seq]
+        self._rows.discard(seq)
+        # Its heap entry is dead once the deadline is gone
+        self._next_fire.pop(alarm_id, None)
+        self._discard_name(name_key(alarm_data), alarm_id)
+        self._by_state[bool(alarm_data.get("active", True))].discard(alarm_id)
+        return alarm_data
+
+    def _compact(self):
+        """Renumber the alarms once removed ones dominate the row index (caller holds the lock)"""
+        if len(self._rows) <= 2 * len(self._by_id) + 1024:
+            return
+        self._sequence = itertools.count()
+        self._rows = _RowIndex()
+        self._seq_of.clear()
+        self._id_at_seq.clear()
+        for alarm_id in self._by_id:
+            seq = next(self._sequence)
+            self._seq_of[alarm_id] = seq
+            self._id_at_seq[seq] = alarm_id
+            self._rows.append()
+        self._rebuild_fire_heap()
+
+    def remove_many(self, alarm_ids):
+        """Delete several alarms in one batch and return them"""
+        with self.batch():
+            removed = [self._delete(alarm_id) for alarm_id in alarm_ids
+                       if alarm_id in self._by_id]
+            if removed:
+                self._compact()
+                self._batch_changed = True
+            return removed
+
+    def _discard_name(self, key, alarm_id):
+        ids = self._by_name.get(key)
+        if ids is not None:
+            ids.discard(alarm_id)
+            if not ids:
+                del self._by_name[key]
+
+    def find_by_name(self, name):
+        """Alarms with this name (case-insensitive), in display order"""
+        with self._lock:
+            ids = self._by_name.get(name.casefold(), ())
+            return sorted((self._by_id[alarm_id] for alarm_id in ids),
+                          key=lambda alarm_data: self._seq_of[alarm_data["id"]])
+
+    def with_state(self, active=True):
+        """Ids of active (or inactive) alarms"""
+        with self._lock:
+            return set(self._by_state[bool(active)])
+
+    def count(self, active=True):
+        """Number of active (or inactive) alarms"""
+        return len(self._by_state[bool(active)])
+
+    def set_next_fire(self, alarm_id, deadline):
+        """Record when an alarm fires next (None when it is not scheduled)"""
+        with self._lock:
+            seq = self._seq_of.get(alarm_id)
+            if deadline is None or seq is None:
+                # Any heap entry it had is dead now
+                self._next_fire.pop(alarm_id, None)
+                return
+            if self._next_fire.get(alarm_id) == deadline:
+                return
+            self._next_fire[alarm_id] = deadline
+            heapq.heappush(self._fire_heap, (deadline, seq))
+            if len(self._fire_heap) > 2 * len(self._next_fire) + 1024:
+                self._rebuild_fire_heap()
+
+    def _rebuild_fire_heap(self):
+        self._fire_heap = [(deadline, self._seq_of[alarm_id])
+                           for alarm_id, deadline in self._next_fire.items()]
+        heapq.heapify(self._fire_heap)
+
+    def _fire_entry_live(self, deadline, seq):
+        alarm_id = self._id_at_seq.get(seq)
+        return alarm_id is not None and self._next_fire.get(alarm_id) == deadline
+
+    def next_fire(self, alarm_id):
+        """Next fire instant of an alarm, or None"""
+        return self._next_fire.get(alarm_id)
+
+    def upcoming(self, limit=10):
+        """The next alarms to fire, soonest first"""
+        with self._lock:
+            heap = self._fire_heap
+            taken = []
+            seen = set()
+            while heap and len(taken) < limit:
+                entry = heapq.heappop(heap)
+                # Dead entries (and repeats of a live one) are dropped for good
+                if entry[1] not in seen and self._fire_entry_live(*entry):
+                    seen.add(entry[1])
+                    taken.append(entry)
+            for entry in taken:
+                heapq.heappush(heap, entry)
+            return [self._by_id[self._id_at_seq[seq]] for _, seq in taken]
+
+
+def name_key(alarm_data):
+    """Index key of an alarm's name"""
+    return alarm_data.get("name", "").casefold()
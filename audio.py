@@ -0,0 +1,427 @@
+"""Cross-platform alarm audio: cached PCM buffers mixed into one output stream.
+
+Sounds are decoded once into 16-bit stereo PCM at the mixer rate and cached.
+Playing a sound adds a voice to the mixer, which sums all active voices block
+by block and hands the result to a sink. Sinks are pluggable:
+
+- SounddeviceSink: PortAudio via the optional ``sounddevice`` package
+- PipeSink: raw PCM piped to ``aplay``/``paplay``/``pw-cat`` on Linux
+- WinsoundSink: Windows fallback when ``sounddevice`` is missing
+- NullSink / FileSink: no sound hardware, for tests and benchmarks
+
+The mixer thread only runs while something is playing. A new voice joins at
+the next block, so start latency is bounded by one block plus sink buffering.
+"""
+import array
+import io
+import itertools
+import math
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import wave
+
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+SAMPLE_WIDTH = 2
+# 1024 frames is about 23 ms at 44.1 kHz
+BLOCK_FRAMES = 1024
+
+
+class SoundBuffer:
+    """Decoded sound: interleaved signed 16-bit stereo samples at SAMPLE_RATE"""
+
+    def __init__(self, samples, name=""):
+        self.samples = samples
+        self.name = name
+
+    @property
+    def frames(self):
+        return len(self.samples) // CHANNELS
+
+    @property
+    def duration(self):
+        return self.frames / SAMPLE_RATE
+
+
+def decode_wav(source, name=""):
+    """Decode a WAV file (path or file object) into a SoundBuffer"""
+    with wave.open(source, "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+
+    # Convert every sample to signed 16-bit
+    if width == 1:
+        samples = array.array("h", ((b - 128) << 8 for b in raw))
+    elif width == 2:
+        samples = array.array("h", raw)
+        if sys.byteorder == "big":
+            samples.byteswap()
+    elif width in (3, 4):
+        # Keep the two most significant bytes of each little-endian sample
+        samples = array.array("h", bytes(
+            byte for i in range(0, len(raw), width) for byte in raw[i + width - 2:i + width]))
+        if sys.byteorder == "big":
+            samples.byteswap()
+    else:
+        raise ValueError(f"Unsupported sample width: {width} bytes")
+
+    # Map to stereo: duplicate mono, keep the first two of multi-channel audio
+    if channels == 1:
+        stereo = array.array("h", bytes(len(samples) * 2 * SAMPLE_WIDTH))
+        stereo[0::2] = samples
+        stereo[1::2] = samples
+        samples = stereo
+    elif channels > 2:
+        stereo = array.array("h", bytes((len(samples) // channels) * 2 * SAMPLE_WIDTH))
+        stereo[0::2] = samples[0::channels]
+        stereo[1::2] = samples[1::channels]
+        samples = stereo
+
+    # Nearest-neighbour resample to the mixer rate
+    if rate != SAMPLE_RATE:
+        source_frames = len(samples) // CHANNELS
+        frames = source_frames * SAMPLE_RATE // rate
+        resampled = array.array("h", bytes(frames * CHANNELS * SAMPLE_WIDTH))
+        for i in range(frames):
+            j = min(i * rate // SAMPLE_RATE, source_frames - 1) * CHANNELS
+            resampled[i * CHANNELS] = samples[j]
+            resampled[i * CHANNELS + 1] = samples[j + 1]
+        samples = resampled
+
+    return SoundBuffer(samples, name)
+
+
+def tone(frequency=880.0, seconds=0.6, volume=0.5, beeps=3):
+    """Synthesize a beeping tone, used when the alarm sound cannot be loaded"""
+    frames = int(SAMPLE_RATE * seconds)
+    amplitude = int(32767 * volume)
+    samples = array.array("h", bytes(frames * CHANNELS * SAMPLE_WIDTH))
+    beep_length = frames // (beeps * 2) or 1
+    for i in range(frames):
+        # Alternate beep and silence
+        if (i // beep_length) % 2 == 0:
+            value = int(amplitude * math.sin(2 * math.pi * frequency * i / SAMPLE_RATE))
+            samples[i * 2] = value
+            samples[i * 2 + 1] = value
+    return SoundBuffer(samples, "tone")
+
+
+def to_wav_bytes(samples):
+    """Wrap PCM samples in an in-memory WAV image"""
+    data = samples
+    if sys.byteorder == "big":
+        data = array.array("h", samples)
+        data.byteswap()
+    image = io.BytesIO()
+    with wave.open(image, "wb") as wav:
+        wav.setnchannels(CHANNELS)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(data.tobytes())
+    return image.getvalue()
+
+
+class NullSink:
+    """Discards audio; with realtime=True it paces writes like a sound card"""
+
+    def __init__(self, realtime=False):
+        self.realtime = realtime
+        self.frames_written = 0
+        self.first_write = None
+
+    def open(self):
+        pass
+
+    def write(self, samples):
+        if self.first_write is None:
+            self.first_write = time.perf_counter()
+        frames = len(samples) // CHANNELS
+        self.frames_written += frames
+        if self.realtime:
+            time.sleep(frames / SAMPLE_RATE)
+
+    def close(self):
+        pass
+
+
+class FileSink(NullSink):
+    """Writes the mixed output stream to a WAV file"""
+
+    def __init__(self, path, realtime=False):
+        super().__init__(realtime)
+        self.path = path
+        self._wav = None
+
+    def open(self):
+        if self._wav is None:
+            self._wav = wave.open(self.path, "wb")
+            self._wav.setnchannels(CHANNELS)
+            self._wav.setsampwidth(SAMPLE_WIDTH)
+            self._wav.setframerate(SAMPLE_RATE)
+
+    def write(self, samples):
+        data = samples
+        if sys.byteorder == "big":
+            data = array.array("h", samples)
+            data.byteswap()
+        self._wav.writeframes(data.tobytes())
+        super().write(samples)
+
+    def close(self):
+        # The file stays open across bursts so one test run yields one file
+        pass
+
+    def finish(self):
+        """Finalize the WAV header"""
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+
+class SounddeviceSink:
+    """PortAudio output through the optional sounddevice package"""
+
+    def __init__(self):
+        import sounddevice
+        self._sounddevice = sounddevice
+        self._stream = None
+
+    def open(self):
+        if self._stream is None:
+            self._stream = self._sounddevice.RawOutputStream(
+                samplerate=SAMPLE_RATE, channels=CHANNELS, dtype="int16",
+                blocksize=BLOCK_FRAMES, latency="low")
+            self._stream.start()
+
+    def write(self, samples):
+        self._stream.write(samples.tobytes())
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+
+class PipeSink:
+    """Streams raw PCM to a command-line player such as aplay"""
+
+    COMMANDS = [
+        ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(SAMPLE_RATE),
+         "-c", str(CHANNELS), "--buffer-time=50000", "-"],
+        ["paplay", "--raw", "--format=s16le", f"--rate={SAMPLE_RATE}",
+         f"--channels={CHANNELS}", "--latency-msec=50"],
+        ["pw-cat", "--playback", "--format=s16", f"--rate={SAMPLE_RATE}",
+         f"--channels={CHANNELS}", "-"],
+    ]
+
+    def __init__(self, command=None):
+        if command is None:
+            command = next((c for c in self.COMMANDS if shutil.which(c[0])), None)
+            if command is None:
+                raise RuntimeError("No command-line audio player found")
+        self.command = command
+        self._process = None
+
+    def open(self):
+        if self._process is None:
+            self._process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                             stdout=subprocess.DEVNULL,
+                                             stderr=subprocess.DEVNULL)
+
+    def write(self, samples):
+        data = samples
+        if sys.byteorder == "big":
+            data = array.array("h", samples)
+            data.byteswap()
+        self._process.stdin.write(data.tobytes())
+
+    def close(self):
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+            self._process.wait()
+            self._process = None
+
+
+class WinsoundSink:
+    """Windows fallback: plays the mixed stream as short in-memory WAV chunks
+
+    winsound cannot stream, so blocks are gathered into chunks and played
+    synchronously from memory on the mixer thread, which also paces it.
+    """
+
+    CHUNK_BLOCKS = 8
+
+    def __init__(self):
+        import winsound
+        self._winsound = winsound
+        self._pending = array.array("h")
+
+    def open(self):
+        self._pending = array.array("h")
+
+    def write(self, samples):
+        self._pending.extend(samples)
+        if len(self._pending) >= BLOCK_FRAMES * CHANNELS * self.CHUNK_BLOCKS:
+            self._play_pending()
+
+    def close(self):
+        if self._pending:
+            self._play_pending()
+
+    def stop(self):
+        self._winsound.PlaySound(None, 0)
+
+    def _play_pending(self):
+        image = to_wav_bytes(self._pending)
+        self._pending = array.array("h")
+        self._winsound.PlaySound(image, self._winsound.SND_MEMORY)
+
+
+def default_sink():
+    """Pick the best available output for this platform"""
+    try:
+        return SounddeviceSink()
+    except Exception:
+        pass
+    if sys.platform == "win32":
+        try:
+            return WinsoundSink()
+        except ImportError:
+            pass
+    try:
+        return PipeSink()
+    except RuntimeError:
+        pass
+    print("No audio output available; alarms will be silent")
+    return NullSink()
+
+
+class AudioEngine:
+    """Mixes any number of simultaneous sounds into a single sink"""
+
+    def __init__(self, sink=None):
+        self.sink = sink if sink is not None else default_sink()
+        self._cache = {}
+        self._voices = {}
+        self._voice_ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._beep = None
+
+    def load(self, path):
+        """Return the decoded buffer for a sound file, decoding it at most once"""
+        key = os.path.abspath(path)
+        mtime = os.path.getmtime(key)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        buffer = decode_wav(key, os.path.basename(key))
+        self._cache[key] = (mtime, buffer)
+        return buffer
+
+    def preload(self, path):
+        """Decode a sound ahead of time; returns False if it cannot be loaded"""
+        try:
+            self.load(path)
+            return True
+        except Exception as e:
+            print(f"Error loading sound {path}: {e}")
+            return False
+
+    def play(self, path=None, buffer=None):
+        """Start playing a file or buffer and return its voice id
+
+        Files that cannot be decoded fall back to a built-in beep.
+        """
+        if buffer is None:
+            try:
+                buffer = self.load(path)
+            except Exception as e:
+                print(f"Error playing sound: {e}")
+                buffer = self.beep()
+        with self._condition:
+            voice = next(self._voice_ids)
+            self._voices[voice] = [buffer.samples, 0]
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._mix, name="AudioMixer")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+        return voice
+
+    def beep(self):
+        """The built-in fallback alarm tone"""
+        if self._beep is None:
+            self._beep = tone()
+        return self._beep
+
+    def stop(self, voice=None):
+        """Stop one voice, or everything when voice is None"""
+        with self._condition:
+            if voice is None:
+                self._voices.clear()
+            else:
+                self._voices.pop(voice, None)
+        stop = getattr(self.sink, "stop", None)
+        if stop is not None and voice is None:
+            stop()
+
+    def is_playing(self):
+        with self._condition:
+            return bool(self._voices)
+
+    def _next_block(self):
+        """Sum one block of every active voice, clipping to 16 bits; None once nothing plays"""
+        length = BLOCK_FRAMES * CHANNELS
+        with self._condition:
+            voices = list(self._voices.items())
+            chunks = []
+            for voice, state in voices:
+                samples, position = state
+                chunks.append(samples[position:position + length])
+                state[1] = position + length
+                if state[1] >= len(samples):
+                    del self._voices[voice]
+
+        if not chunks:
+            # The last voice was stopped since the mixer last looked
+            return None
+        if len(chunks) == 1:
+            return chunks[0]
+        mixed = list(map(sum, itertools.zip_longest(*chunks, fillvalue=0)))
+        # Only pay for clipping when the sum actually overflows
+        if max(mixed) > 32767 or min(mixed) < -32768:
+            mixed = [-32768 if v < -32768 else 32767 if v > 32767 else v for v in mixed]
+        return array.array("h", mixed)
+
+    def _mix(self):
+        """Mixer loop: sleeps while idle, streams blocks while anything plays"""
+        while True:
+            with self._condition:
+                while not self._voices:
+                    self._condition.wait()
+            try:
+                try:
+                    self.sink.open()
+                    while True:
+                        block = self._next_block()
+                        if block is None:
+                            break
+                        self.sink.write(block)
+                finally:
+                    self.sink.close()
+            except Exception as e:
+                print(f"Error in audio output: {e}")
+                with self._condition:
+                    self._voices.clear()
@@ -0,0 +1,215 @@
+"""Alarm engine benchmarks: scheduling throughput, next-fire computation, fire
+latency and idle wake-ups.
+
+Runs without a display. Results are written as JSON so releases can be compared::
+
+    python benchmarks/bench_alarm_engine.py --sizes 10 1000 100000 --output bench_results.json
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alarm_engine import MAX_WAIT, AlarmScheduler, make_alarm
+from recurrence import Recurrence
+
+
+# Far enough ahead that background alarms never fire during a run
+FAR_FUTURE = 10 * 24 * 3600
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def make_alarms(count):
+    """Build alarm records spread over the day"""
+    return [make_alarm(f"{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}", f"Alarm {i}")
+            for i in range(count)]
+
+
+def bench_throughput(count):
+    """Insert and cancel rate through the public scheduler API"""
+    scheduler = AlarmScheduler(lambda alarm, fire: None)
+    alarms = make_alarms(count)
+
+    start = time.perf_counter()
+    for alarm in alarms:
+        scheduler.schedule(alarm)
+    insert_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for alarm in alarms:
+        scheduler.cancel(alarm)
+    cancel_seconds = time.perf_counter() - start
+
+    scheduler.stop()
+    return {
+        "insert_per_second": count / insert_seconds if insert_seconds else None,
+        "cancel_per_second": count / cancel_seconds if cancel_seconds else None,
+    }
+
+
+# Mix of rules for the next-fire benchmark
+RULE_MIX = [
+    (None, None),
+    ({"type": "weekly", "days": [0, 1, 2, 3, 4]}, "Europe/London"),
+    ({"type": "interval", "every": 3, "unit": "days", "start": "2024-01-01"}, "America/New_York"),
+    ({"type": "cron", "expr": "15 7 1,15 * *"}, "Asia/Tokyo"),
+]
+
+
+def bench_next_fire(count):
+    """Time to compute the next fire instant of `count` recurring alarms"""
+    start = time.perf_counter()
+    rules = [Recurrence(f"{(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d}",
+                        *RULE_MIX[i % len(RULE_MIX)])
+             for i in range(count)]
+    compile_seconds = time.perf_counter() - start
+
+    now = time.time()
+    start = time.perf_counter()
+    for rule in rules:
+        rule.next_after(now)
+    next_seconds = time.perf_counter() - start
+    return {
+        "compile_ms": compile_seconds * 1000,
+        "next_fire_ms": next_seconds * 1000,
+    }
+
+
+def bench_footprint(count):
+    """Threads and traced memory added per scheduled alarm"""
+    gc.collect()
+    threads_before = threading.active_count()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    scheduler = AlarmScheduler(lambda alarm, fire: None)
+    alarms = make_alarms(count)
+    now = time.time()
+    for alarm in alarms:
+        scheduler.schedule(alarm, now + FAR_FUTURE)
+
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    threads = threading.active_count() - threads_before
+    memory = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+
+    scheduler.stop()
+    return {
+        "threads": threads,
+        "threads_per_alarm": threads / count,
+        "bytes_per_alarm": memory / count,
+    }
+
+
+def bench_fire_error(count, fire_count, spread):
+    """Actual minus scheduled fire time with `count` alarms queued"""
+    errors = []
+    done = threading.Event()
+
+    def on_fire(alarm, fire):
+        errors.append(fire.lateness)
+        alarm["active"] = False
+        if len(errors) >= fire_count:
+            done.set()
+
+    scheduler = AlarmScheduler(on_fire)
+    fire_count = min(fire_count, count)
+    alarms = make_alarms(count)
+
+    # Fill the heap first so setup time does not count as lateness
+    now = time.time()
+    for alarm in alarms[fire_count:]:
+        scheduler.schedule(alarm, now + FAR_FUTURE)
+
+    now = time.time()
+    for i, alarm in enumerate(alarms[:fire_count]):
+        scheduler.schedule(alarm, now + 0.2 + spread * i / fire_count)
+
+    done.wait(spread + 10)
+    scheduler.stop()
+    return {
+        "fired": len(errors),
+        "p50_ms": percentile(errors, 50) * 1000 if errors else None,
+        "p99_ms": percentile(errors, 99) * 1000 if errors else None,
+        "max_ms": max(errors) * 1000 if errors else None,
+    }
+
+
+def bench_idle_wakeups(count, idle_seconds):
+    """Scheduler wake-ups per idle minute with `count` alarms pending"""
+    # An idle scheduler only wakes every MAX_WAIT, so measure whole periods
+    idle_seconds = max(1, math.ceil(idle_seconds / MAX_WAIT)) * MAX_WAIT
+    scheduler = AlarmScheduler(lambda alarm, fire: None)
+    now = time.time()
+    for alarm in make_alarms(count):
+        scheduler.schedule(alarm, now + FAR_FUTURE)
+
+    time.sleep(0.1)
+    start_wakeups = scheduler.wakeups
+    time.sleep(idle_seconds)
+    wakeups = scheduler.wakeups - start_wakeups
+
+    scheduler.stop()
+    return {"wakeups_per_idle_minute": wakeups * 60 / idle_seconds}
+
+
+def run(sizes, fire_count, spread, idle_seconds):
+    """Run every benchmark for each alarm count"""
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "sizes": {},
+    }
+    for count in sizes:
+        print(f"Benchmarking {count} alarms...", flush=True)
+        result = {}
+        result.update(bench_throughput(count))
+        result.update(bench_next_fire(count))
+        result.update(bench_footprint(count))
+        result["fire_error"] = bench_fire_error(count, fire_count, spread)
+        result.update(bench_idle_wakeups(count, idle_seconds))
+        results["sizes"][str(count)] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the alarm engine scheduling path")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 100000],
+                        help="alarm counts to benchmark")
+    parser.add_argument("--fire-count", type=int, default=200,
+                        help="alarms that actually fire in the latency benchmark")
+    parser.add_argument("--spread", type=float, default=2.0,
+                        help="seconds over which the latency benchmark alarms fire")
+    parser.add_argument("--idle-seconds", type=float, default=2 * MAX_WAIT,
+                        help=f"length of the idle wake-up measurement, rounded up to a "
+                             f"multiple of {MAX_WAIT:g} s")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="JSON file to write results to")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.fire_count, args.spread, args.idle_seconds)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results["sizes"], indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Audio engine benchmarks: decode cost, start latency and mixing throughput.
+
+Uses the null sink, so no sound hardware is needed::
+
+    python benchmarks/bench_audio.py --voices 1 4 16 --output bench_audio.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import AudioEngine, NullSink, BLOCK_FRAMES, SAMPLE_RATE, tone, to_wav_bytes
+from bench_alarm_engine import percentile
+
+
+def write_test_sound(path, seconds):
+    """Write a beeping WAV file to benchmark decoding"""
+    with open(path, "wb") as f:
+        f.write(to_wav_bytes(tone(seconds=seconds).samples))
+
+
+def bench_decode(path):
+    """First (decoding) and cached load times"""
+    engine = AudioEngine(NullSink())
+    start = time.perf_counter()
+    engine.load(path)
+    decode = time.perf_counter() - start
+    start = time.perf_counter()
+    engine.load(path)
+    cached = time.perf_counter() - start
+    return {"decode_ms": decode * 1000, "cached_load_ms": cached * 1000}
+
+
+def bench_start_latency(path, runs):
+    """Time from play() to the first block reaching a real-time paced sink"""
+    latencies = []
+    for _ in range(runs):
+        sink = NullSink(realtime=True)
+        engine = AudioEngine(sink)
+        engine.preload(path)
+        start = time.perf_counter()
+        engine.play(path)
+        while sink.first_write is None:
+            time.sleep(0.0005)
+        latencies.append(sink.first_write - start)
+        engine.stop()
+    return {
+        "start_p50_ms": percentile(latencies, 50) * 1000,
+        "start_p99_ms": percentile(latencies, 99) * 1000,
+        "start_max_ms": max(latencies) * 1000,
+    }
+
+
+def bench_mixing(path, voices):
+    """Mixed audio seconds produced per wall-clock second with N voices"""
+    sink = NullSink()
+    engine = AudioEngine(sink)
+    engine.preload(path)
+    start = time.perf_counter()
+    for _ in range(voices):
+        engine.play(path)
+    while engine.is_playing():
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    audio_seconds = sink.frames_written / SAMPLE_RATE
+    return {"realtime_factor": audio_seconds / elapsed if elapsed else None}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the audio engine")
+    parser.add_argument("--voices", type=int, nargs="+", default=[1, 4, 16],
+                        help="simultaneous voices for the mixing benchmark")
+    parser.add_argument("--seconds", type=float, default=3.0,
+                        help="length of the test sound")
+    parser.add_argument("--runs", type=int, default=20,
+                        help="repetitions of the start latency benchmark")
+    parser.add_argument("--output", default="bench_audio.json",
+                        help="JSON file to write results to")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "alarm.wav")
+        write_test_sound(path, args.seconds)
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "block_ms": BLOCK_FRAMES / SAMPLE_RATE * 1000,
+        }
+        results.update(bench_decode(path))
+        results.update(bench_start_latency(path, args.runs))
+        results["mixing"] = {str(n): bench_mixing(path, n) for n in args.voices}
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
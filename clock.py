@@ -0,0 +1,85 @@
+"""Time sources: the system clock, and a virtual clock for simulations and tests.
+
+Every subsystem that asks what time it is (the alarm engine and scheduler,
+snooze, the UI clocks, the stopwatch, the control socket) reads it from a
+clock object instead of calling time.time() or datetime.now() directly:
+
+* time(): wall-clock seconds since the epoch;
+* monotonic() / monotonic_ns(): time that never steps, for intervals;
+* now(): the local wall-clock time as a naive datetime.
+
+SYSTEM_CLOCK is used unless another clock is passed in. A VirtualClock only
+moves when it is told to, so a scheduler created with ``threaded=False`` can
+be driven by jumping the clock straight to each deadline (see simulate.py).
+It can also step the wall clock without monotonic time, as a suspend or a
+manual clock change does.
+
+Internal delays that are about the machine rather than the schedule (the
+settings write coalescing, metrics and profiling timers) stay on real time.
+"""
+import datetime
+import threading
+import time
+
+
+class SystemClock:
+    """The real clocks of the machine"""
+
+    def time(self):
+        """Seconds since the epoch"""
+        return time.time()
+
+    def monotonic(self):
+        """Seconds on a clock that never steps"""
+        return time.monotonic()
+
+    def monotonic_ns(self):
+        return time.monotonic_ns()
+
+    def now(self):
+        """Local wall-clock time"""
+        return datetime.datetime.now()
+
+
+class VirtualClock(SystemClock):
+    """Clock that stands still until advanced; thread-safe"""
+
+    def __init__(self, start=None):
+        self._time = time.time() if start is None else float(start)
+        self._monotonic = 0.0
+        self._lock = threading.Lock()
+
+    def time(self):
+        return self._time
+
+    def monotonic(self):
+        return self._monotonic
+
+    def monotonic_ns(self):
+        return int(self._monotonic * 1_000_000_000)
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self._time)
+
+    def advance(self, seconds):
+        """Let `seconds` pass"""
+        if seconds < 0:
+            raise ValueError("time cannot run backwards; use step() for clock changes")
+        with self._lock:
+            self._time += seconds
+            self._monotonic += seconds
+
+    def advance_to(self, instant):
+        """Let time pass until `instant` (no-op if it is already past)"""
+        with self._lock:
+            if instant > self._time:
+                self._monotonic += instant - self._time
+                self._time = instant
+
+    def step(self, seconds):
+        """Move only the wall clock, like a suspend (positive) or a manual clock change"""
+        with self._lock:
+            self._time += seconds
+
+
+SYSTEM_CLOCK = SystemClock()
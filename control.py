@@ -0,0 +1,487 @@
+"""Local control socket for scripting a running alarm clock, and its command-line client.
+
+The app (and the headless engine) serve a Unix domain socket from an
+asyncio loop on a background thread. The protocol is one JSON object per
+line in each direction; requests may be pipelined and are answered in order::
+
+    {"op": "add", "alarms": [{"time": "07:00:00", "name": "Wake up"}]}
+    {"ok": true, "result": {"added": [{"id": "3f2a...", ...}], "errors": []}}
+
+Operations:
+
+* ``add``: alarms (records as in an alarm import file), atomic;
+* ``list``: optional active (true/false);
+* ``remove``: ids, atomic;
+* ``snooze``: id, optional minutes; stops the alarm ringing and queues a snoozed copy;
+* ``watch``: optional events; the connection then streams one line per engine
+  event (fire, snooze, dismiss, expire, missed, batch, clock_jump) until closed.
+
+Command line::
+
+    python control.py add 7:30 --name "Wake up" --repeat weekdays
+    python control.py add --file alarms.csv
+    python control.py list [--json]
+    python control.py remove ID [ID ...]
+    python control.py snooze ID [--minutes 10]
+    python control.py watch [--events fire snooze]
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import alarm_io
+from persistence import to_json_safe
+
+
+# Largest request line accepted, enough for a bulk add of ~100k alarms
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Events buffered per watcher; further events are dropped (and counted) until it catches up
+WATCH_QUEUE = 1000
+
+# Rows per add request when the CLI imports a file
+ADD_CHUNK = 1000
+
+WATCH_EVENTS = ("fire", "snooze", "dismiss", "expire", "missed", "batch", "clock_jump")
+
+
+def default_socket_path():
+    """Per-user socket path: $XDG_RUNTIME_DIR if set, else the temp directory"""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "alarm-clock.sock")
+    user = os.getuid() if hasattr(os, "getuid") else os.environ.get("USERNAME", "user")
+    return os.path.join(tempfile.gettempdir(), f"alarm-clock-{user}.sock")
+
+
+def _encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _batch_result(result):
+    return {"added": to_json_safe(result.alarms),
+            "removed": [alarm_data["id"] for alarm_data in result.removed],
+            "errors": [{"row": error.row, "message": error.message} for error in result.errors]}
+
+
+class ControlServer:
+    """Serves the control protocol for an AlarmEngine from a background asyncio loop"""
+
+    def __init__(self, engine, path=None):
+        self.engine = engine
+        self.path = path or default_socket_path()
+        self.loop = None
+        self.requests = 0
+        self._server = None
+        self._thread = None
+        # asyncio.Queue of each watching connection -> the events it wants
+        self._watchers = {}
+        self._operations = {"add": self._add, "list": self._list, "remove": self._remove,
+                            "snooze": self._snooze}
+
+    def start(self):
+        """Bind the socket and start serving; raises OSError if that is not possible"""
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix domain sockets are not available on this platform")
+        self._claim_path()
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        failure = []
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            try:
+                self._server = self.loop.run_until_complete(asyncio.start_unix_server(
+                    self._handle, self.path, limit=MAX_REQUEST_BYTES))
+                os.chmod(self.path, 0o600)
+            except OSError as e:
+                failure.append(e)
+                return
+            finally:
+                started.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self._thread = threading.Thread(target=run, name="ControlServer", daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        self.engine.add_listener(self._on_engine_event)
+        return self
+
+    def _claim_path(self):
+        """Remove a socket left behind by an instance that is no longer running"""
+        if not os.path.exists(self.path):
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except OSError:
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(f"Another instance is already listening on {self.path}")
+
+    def stop(self):
+        """Close the socket and stop the loop"""
+        if self.loop is None:
+            return
+        self.engine.remove_listener(self._on_engine_event)
+        import asyncio
+
+        async def shutdown():
+            self._server.close()
+            # Open connections, including watchers waiting for events
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.loop.stop()
+
+        if self._server is not None:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop)
+            self._thread.join(timeout=2)
+        self.loop = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    async def _handle(self, reader, writer):
+        import asyncio
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    writer.write(_encode({"ok": False, "error": "request too large"}))
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("request must be a JSON object")
+                except ValueError as e:
+                    writer.write(_encode({"ok": False, "error": f"bad request: {e}"}))
+                    continue
+                if request.get("op") == "watch":
+                    await self._watch(request, writer)
+                    break
+                writer.write(_encode(self._dispatch(request)))
+                # Pipelined requests are answered without waiting for each write
+                if writer.transport.get_write_buffer_size() > 64 * 1024:
+                    await writer.drain()
+            await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _dispatch(self, request):
+        self.requests += 1
+        operation = self._operations.get(request.get("op"))
+        if operation is None:
+            return {"ok": False, "error": f"unknown op {request.get('op')!r}"}
+        try:
+            return {"ok": True, "result": operation(request)}
+        except (KeyError, TypeError, ValueError) as e:
+            return {"ok": False, "error": str(e)}
+
+    def _add(self, request):
+        records = request.get("alarms")
+        if records is None:
+            records = [{key: value for key, value in request.items() if key not in ("op", "atomic")}]
+        if not isinstance(records, list):
+            raise ValueError("alarms must be a list")
+        return _batch_result(self.engine.add_alarms(records, atomic=bool(request.get("atomic"))))
+
+    def _list(self, request):
+        _, alarms = self.engine.alarms.snapshot()
+        active = request.get("active")
+        if active is not None:
+            alarms = [alarm_data for alarm_data in alarms
+                      if bool(alarm_data.get("active", True)) == bool(active)]
+        listed = []
+        for alarm_data in alarms:
+            record = to_json_safe(alarm_data)
+            record["next_fire"] = self.engine.alarms.next_fire(alarm_data["id"])
+            listed.append(record)
+        return {"alarms": listed}
+
+    def _remove(self, request):
+        ids = request.get("ids")
+        if not isinstance(ids, list):
+            raise ValueError("ids must be a list")
+        return _batch_result(self.engine.remove_alarms(ids, atomic=bool(request.get("atomic"))))
+
+    def _snooze(self, request):
+        alarm_data = self.engine.alarms.get(request.get("id"))
+        if alarm_data is None:
+            raise ValueError(f"no alarm with id {request.get('id')!r}")
+        minutes = request.get("minutes")
+        if minutes is not None and (not isinstance(minutes, (int, float)) or minutes <= 0):
+            raise ValueError("minutes must be a positive number")
+        # Silences it if it is ringing, as the notification's Snooze button does
+        self.engine.dismiss_alarm(alarm_data)
+        return {"alarm": to_json_safe(self.engine.snooze_alarm(alarm_data, minutes))}
+
+    async def _watch(self, request, writer):
+        import asyncio
+        events = request.get("events") or WATCH_EVENTS
+        queue = asyncio.Queue(WATCH_QUEUE)
+        queue.dropped = 0
+        self._watchers[queue] = set(events)
+        try:
+            writer.write(_encode({"ok": True, "result": {"events": sorted(set(events))}}))
+            await writer.drain()
+            while True:
+                message = await queue.get()
+                if queue.dropped:
+                    writer.write(_encode({"event": "dropped", "count": queue.dropped}))
+                    queue.dropped = 0
+                writer.write(message)
+                await writer.drain()
+        finally:
+            del self._watchers[queue]
+
+    def _on_engine_event(self, event, alarm_data):
+        """Engine listener (scheduler or caller thread): forward to watchers"""
+        if not self._watchers or self.loop is None:
+            return
+        message = {"event": event, "time": self.engine.clock.time()}
+        if event == "batch":
+            message["result"] = {"added": len(alarm_data.alarms), "removed": len(alarm_data.removed),
+                                 "errors": len(alarm_data.errors)}
+        elif alarm_data is not None:
+            message["alarm"] = to_json_safe(alarm_data)
+            fire = alarm_data.get("_last_fire")
+            if fire is not None and event in ("fire", "missed"):
+                message["lateness"] = fire.lateness
+                message["missed"] = fire.missed
+        # Serialized here, while the alarm cannot change underneath
+        self.loop.call_soon_threadsafe(self._broadcast, event, _encode(message))
+
+    def _broadcast(self, event, message):
+        import asyncio
+        for queue, events in self._watchers.items():
+            if event in events:
+                try:
+                    queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    queue.dropped += 1
+
+
+def add_arguments(parser):
+    """Add --control-socket and --no-control to an argparse parser"""
+    parser.add_argument("--control-socket", metavar="PATH",
+                        help=f"control socket path (default {default_socket_path()})")
+    parser.add_argument("--no-control", action="store_true", help="do not open the control socket")
+
+
+def serve(engine, path=None):
+    """Start a ControlServer for an engine, or print why not and return None"""
+    try:
+        return ControlServer(engine, path).start()
+    except OSError as e:
+        print(f"Control socket disabled: {e}")
+        return None
+
+
+class ControlClient:
+    """Blocking client for the control socket"""
+
+    def __init__(self, path=None, timeout=30):
+        self.path = path or default_socket_path()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(self.path)
+        self._file = self._socket.makefile("rwb")
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("control socket closed the connection")
+        return json.loads(line)
+
+    def request(self, op, **params):
+        """Send one request and return its result; raises ValueError if it was refused"""
+        self._file.write(_encode(dict(params, op=op)))
+        self._file.flush()
+        response = self._read()
+        if not response.get("ok"):
+            raise ValueError(response.get("error", "request failed"))
+        return response["result"]
+
+    def watch(self, events=None):
+        """Yield engine events as they happen"""
+        self.request("watch", events=list(events) if events else None)
+        self._socket.settimeout(None)
+        while True:
+            yield self._read()
+
+
+def _print_errors(result):
+    for error in result["errors"]:
+        print(f"row {error['row']}: {error['message']}", file=sys.stderr)
+    return 1 if result["errors"] else 0
+
+
+def _format_alarm(alarm_data):
+    repeat = alarm_data.get("repeat")
+    next_fire = alarm_data.get("next_fire")
+    return "  ".join([
+        alarm_data["id"], alarm_data["time"],
+        "on " if alarm_data.get("active", True) else "off",
+        time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(next_fire)) if next_fire else "-" * 19,
+        json.dumps(repeat, separators=(",", ":")) if repeat else "daily",
+        alarm_data.get("name", ""),
+    ])
+
+
+def main(argv=None):
+    """Command-line client"""
+    import argparse
+    parser = argparse.ArgumentParser(description="Control a running alarm clock")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help=f"control socket (default {default_socket_path()})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add an alarm, or every alarm in a CSV/JSON-lines file")
+    add.add_argument("time", nargs="?", help="HH:MM or HH:MM:SS")
+    add.add_argument("--name", default="Unnamed Alarm")
+    add.add_argument("--repeat", help='rule type (daily, once, weekdays, ...) or a JSON rule')
+    add.add_argument("--timezone")
+    add.add_argument("--inactive", action="store_true")
+    add.add_argument("--file", help="import alarms from a .csv or .jsonl file")
+    add.add_argument("--atomic", action="store_true", help="add nothing if any row is invalid")
+
+    listing = commands.add_parser("list", help="list alarms")
+    listing.add_argument("--json", action="store_true", help="one JSON object per line")
+    state = listing.add_mutually_exclusive_group()
+    state.add_argument("--active", dest="active", action="store_const", const=True)
+    state.add_argument("--inactive", dest="active", action="store_const", const=False)
+
+    remove = commands.add_parser("remove", help="remove alarms by id")
+    remove.add_argument("ids", nargs="+")
+
+    snooze = commands.add_parser("snooze", help="snooze an alarm by id")
+    snooze.add_argument("id")
+    snooze.add_argument("--minutes", type=float)
+
+    watch = commands.add_parser("watch", help="print engine events as JSON lines")
+    watch.add_argument("--events", nargs="+", choices=WATCH_EVENTS)
+
+    args = parser.parse_args(argv)
+    try:
+        client = ControlClient(args.socket)
+    except OSError as e:
+        print(f"Cannot connect to {args.socket or default_socket_path()}: {e}", file=sys.stderr)
+        return 2
+    try:
+        with client:
+            return _run_command(client, args, parser)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 0
+
+
+def _run_command(client, args, parser):
+    if args.command == "add":
+        if args.file:
+            return _add_file(client, args.file, args.atomic)
+        if not args.time:
+            parser.error("add needs a time or --file")
+        parts = args.time.split(":")
+        if len(parts) == 2:
+            parts.append("00")
+        # Accept 7:30 as well as 07:30
+        alarm_time = ":".join(part.zfill(2) for part in parts)
+        record = {"time": alarm_time, "name": args.name, "active": not args.inactive}
+        repeat = alarm_io.parse_repeat(args.repeat)
+        if repeat is not None:
+            record["repeat"] = repeat
+        if args.timezone:
+            record["timezone"] = args.timezone
+        result = client.request("add", alarms=[record])
+        for alarm_data in result["added"]:
+            print(alarm_data["id"])
+        return _print_errors(result)
+    if args.command == "list":
+        for alarm_data in client.request("list", active=args.active)["alarms"]:
+            print(json.dumps(alarm_data) if args.json else _format_alarm(alarm_data))
+        return 0
+    if args.command == "remove":
+        result = client.request("remove", ids=args.ids)
+        print(f"Removed {len(result['removed'])} alarm(s)")
+        return _print_errors(result)
+    if args.command == "snooze":
+        print(client.request("snooze", id=args.id, minutes=args.minutes)["alarm"]["id"])
+        return 0
+    if args.command == "watch":
+        for event in client.watch(args.events):
+            print(json.dumps(event), flush=True)
+    return 0
+
+
+def _add_file(client, path, atomic):
+    """Send a CSV or JSON-lines file in chunks; rows that do not parse are reported locally"""
+    # An atomic import has to be a single request
+    limit = None if atomic else ADD_CHUNK
+    added = failed = 0
+    chunk, rows = [], []
+
+    def send():
+        nonlocal added, failed
+        result = client.request("add", alarms=chunk, atomic=atomic)
+        added += len(result["added"])
+        for error in result["errors"]:
+            # The server numbers rows within the chunk
+            print(f"line {rows[error['row'] - 1]}: {error['message']}", file=sys.stderr)
+            failed += 1
+        chunk.clear()
+        rows.clear()
+
+    try:
+        for row, record in alarm_io.read_alarms(path):
+            if isinstance(record, ValueError):
+                print(f"line {row}: {record}", file=sys.stderr)
+                failed += 1
+                continue
+            chunk.append(record)
+            rows.append(row)
+            if limit and len(chunk) >= limit:
+                send()
+        if atomic and failed:
+            # The server never saw these rows, so send nothing at all
+            chunk.clear()
+        if chunk:
+            send()
+    except OSError as e:
+        print(f"Cannot read {path}: {e}", file=sys.stderr)
+        return 2
+    print(f"Added {added} alarm(s), {failed} row(s) rejected")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
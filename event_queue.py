@@ -0,0 +1,76 @@
+"""Bounded hand-off of engine events to the Tk main loop.
+
+The alarm engine calls its listeners on the scheduler thread, which must
+never wait for the UI. EventQueue.post() is a listener that appends to a
+deque (appends and pops are atomic in CPython, so no lock is taken) and
+returns immediately; the Tk loop drains the queue in batches from a timer.
+When the UI falls so far behind that the queue is full, the oldest events are
+discarded and counted. Fire and dismiss events are never discarded: they wait
+in a deque of their own, and drain() merges the two in posting order.
+"""
+from collections import deque
+from itertools import count
+
+
+DEFAULT_CAPACITY = 1024
+
+# Losing one of these would leave an alarm that never shows, or never closes
+KEPT_EVENTS = frozenset({"fire", "dismiss"})
+
+
+class EventQueue:
+    """Bounded multi-producer, single-consumer queue of (event, payload) pairs"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        # Items are (sequence, event, payload); only _items is bounded
+        self._items = deque(maxlen=capacity)
+        self._kept = deque()
+        self._sequence = count()
+        self.posted = 0
+        self.drained = 0
+        self.dropped = 0
+        # Most events ever waiting at once
+        self.high_water = 0
+
+    def __len__(self):
+        return len(self._items) + len(self._kept)
+
+    def post(self, event, payload=None):
+        """Queue an event without blocking; may be called from any thread"""
+        item = (next(self._sequence), event, payload)
+        if event in KEPT_EVENTS:
+            self._kept.append(item)
+        else:
+            items = self._items
+            if len(items) >= self.capacity:
+                # The append below pushes the oldest event out
+                self.dropped += 1
+            items.append(item)
+        self.posted += 1
+        if len(self) > self.high_water:
+            self.high_water = len(self)
+
+    def drain(self, limit=None):
+        """Remove and return up to `limit` queued events, oldest first"""
+        items, kept = self._items, self._kept
+        batch = []
+        while limit is None or len(batch) < limit:
+            try:
+                # Take from whichever queue holds the older event
+                source = kept if kept and (not items or kept[0][0] < items[0][0]) else items
+                batch.append(source.popleft()[1:])
+            except IndexError:
+                break
+        self.drained += len(batch)
+        return batch
+
+    def stats(self):
+        """Counters for status displays and metrics"""
+        return {
+            "pending": len(self),
+            "posted": self.posted,
+            "drained": self.drained,
+            "dropped": self.dropped,
+            "high_water": self.high_water,
+        }
@@ -0,0 +1,176 @@
+"""One Tk timer for every periodic UI update.
+
+Each periodic update (header clock, world clocks, stopwatch...) registers a
+task with the FrameScheduler instead of running its own ``after`` chain.
+Whole-second tasks run just after real second boundaries, so every clock on
+screen ticks together; faster tasks run at their own interval. Tasks whose
+widgets are not on screen are paused until wake() is called (for example on a
+notebook tab change), and while the window is minimized only tasks added
+with always=True (such as draining engine events) keep running.
+"""
+import math
+import time
+
+import metrics
+
+
+# Run second-aligned tasks this long after the boundary so the new second shows
+ALIGN_OFFSET = 0.002
+
+# Tasks due within this window of each other run in the same tick
+COALESCE_WINDOW = 0.008
+
+TIMER_LAG = metrics.histogram("ui_timer_lag_seconds",
+                              "How long after it was due the UI timer callback ran (event-loop lag)")
+TICK_SECONDS = metrics.histogram("ui_tick_seconds", "Time spent running UI tasks per timer tick")
+
+
+class FrameTask:
+    """A periodic UI update registered with FrameScheduler"""
+
+    def __init__(self, name, callback, interval, visible, enabled, adaptive, max_interval,
+                 always=False):
+        self.name = name
+        self.callback = callback
+        self.interval = interval
+        self.min_interval = interval
+        self.max_interval = max_interval or interval
+        self.visible = visible
+        self.enabled = enabled
+        self.adaptive = adaptive
+        self.always = always
+        # Next run; math.inf while paused or disabled
+        self.due = 0.0 if enabled else math.inf
+        self.runs = 0
+        self.run_time = metrics.histogram("ui_task_seconds", "Time spent in one run of a UI task",
+                                          labels={"task": name})
+
+    def next_due(self, now):
+        """When to run next: the next boundary for whole-second intervals"""
+        if self.interval >= 1 and float(self.interval).is_integer():
+            return (math.floor(now / self.interval) + 1) * self.interval + ALIGN_OFFSET
+        return now + self.interval
+
+    def adapt(self, lateness):
+        """Slow down while the UI cannot keep up, speed back up when it can"""
+        if lateness > self.interval / 2:
+            self.interval = min(self.interval * 1.5, self.max_interval)
+        elif lateness < self.interval / 8:
+            self.interval = max(self.interval * 0.9, self.min_interval)
+
+
+class FrameScheduler:
+    """Runs all registered UI tasks from a single after() timer"""
+
+    def __init__(self, root, clock=time.time):
+        self.root = root
+        self.clock = clock
+        self.tasks = {}
+        self._after_id = None
+        self._scheduled_for = math.inf
+        # When the pending after() should call back, for the lag metric
+        self._expected_at = 0.0
+        self._minimized = False
+        # Timer callbacks and task runs, for profiling
+        self.ticks = 0
+        root.bind("<Unmap>", self._on_unmap, add="+")
+        root.bind("<Map>", self._on_map, add="+")
+
+    def add(self, name, callback, interval=1.0, visible=None, enabled=True,
+            adaptive=False, max_interval=None, always=False):
+        """Register callback() to run every `interval` seconds
+
+        visible() is asked before each run; a task that is not visible is
+        paused until wake(). Adaptive tasks stretch their interval up to
+        max_interval while ticks run late. Tasks marked always also run while
+        the window is minimized.
+        """
+        self.tasks[name] = FrameTask(name, callback, interval, visible, enabled,
+                                     adaptive, max_interval, always)
+        self._schedule()
+
+    def enable(self, name, enabled=True):
+        """Start or stop a task; an enabled task runs on the next tick"""
+        task = self.tasks[name]
+        task.enabled = enabled
+        if enabled:
+            task.interval = task.min_interval
+            task.due = self.clock()
+        else:
+            task.due = math.inf
+        self._schedule()
+
+    def wake(self):
+        """Resume paused tasks (their widgets may be on screen again)"""
+        now = self.clock()
+        for task in self.tasks.values():
+            if task.enabled and task.due == math.inf:
+                task.due = now
+        self._schedule()
+
+    def stop(self):
+        """Cancel the timer"""
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._scheduled_for = math.inf
+
+    def _schedule(self):
+        """Make sure the timer fires for the earliest due task"""
+        due = min((task.due for task in self.tasks.values()
+                   if task.always or not self._minimized), default=math.inf)
+        if due >= self._scheduled_for:
+            return
+        self.stop()
+        if due == math.inf:
+            return
+        now = self.clock()
+        delay = max(0, math.ceil((due - now) * 1000))
+        self._scheduled_for = due
+        self._expected_at = now + delay / 1000
+        self._after_id = self.root.after(delay, self._tick)
+
+    def _tick(self):
+        """Run every task that is due, then sleep until the next one"""
+        self._after_id = None
+        self._scheduled_for = math.inf
+        self.ticks += 1
+        now = self.clock()
+        TIMER_LAG.observe(max(now - self._expected_at, 0.0))
+        started = time.perf_counter()
+        for task in list(self.tasks.values()):
+            if task.due > now + COALESCE_WINDOW or (self._minimized and not task.always):
+                continue
+            if task.visible is not None and not task.visible():
+                task.due = math.inf
+                continue
+            task_started = time.perf_counter()
+            try:
+                task.callback()
+            except Exception as e:
+                print(f"Error in UI task {task.name}: {e}")
+            task.run_time.observe(time.perf_counter() - task_started)
+            task.runs += 1
+            if task.adaptive:
+                task.adapt(now - task.due)
+            # A callback may have disabled its own task
+            if task.enabled:
+                task.due = task.next_due(now)
+        TICK_SECONDS.observe(time.perf_counter() - started)
+        self._schedule()
+
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self._minimized = True
+            self.stop()
+            self._schedule()
+
+    def _on_map(self, event):
+        if event.widget is self.root and self._minimized:
+            self._minimized = False
+            now = self.clock()
+            # Everything is stale after being minimized
+            for task in self.tasks.values():
+                if task.enabled:
+                    task.due = now
+            self._schedule()
@@ -0,0 +1,504 @@
+"""Streaming iCalendar (.ics) import.
+
+Calendar files are read line by line (twice: a quick first pass collects the
+dates of rescheduled occurrences), so a file of any size never sits in memory
+whole. Each VEVENT becomes one alarm per VALARM reminder, or one alarm at its
+start if it has none. RRULEs are translated into the recurrence rules of
+recurrence.py rather than expanded, so a series costs one alarm whose next
+occurrence is computed when needed; COUNT is turned into an ``until`` date by
+stepping through that many occurrences once. That date is only exact for
+rules that ring at most once a day, so COUNT is rejected for MINUTELY and
+HOURLY rules.
+
+Alarms from a calendar carry ``calendar`` (which file they came from),
+``ical_uid`` (the event's UID, plus its RECURRENCE-ID for a rescheduled
+occurrence) and ``ical_hash`` (a digest of the event's content). Given the
+hashes already stored, read_calendar() only yields alarms for new or changed
+events, which makes re-importing an updated file an incremental diff.
+
+Supported RRULE parts are FREQ (MINUTELY to YEARLY), INTERVAL, COUNT (from DAILY), UNTIL,
+BYDAY (without ordinals), BYMONTHDAY and BYMONTH; events using anything else
+are reported as errors.
+"""
+import datetime
+import hashlib
+import heapq
+
+from recurrence import Recurrence, WEEKDAY_NAMES
+
+
+# Properties that change on every export without changing the event
+HASH_IGNORED = {"DTSTAMP", "LAST-MODIFIED"}
+
+ICAL_DAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+
+SUPPORTED_RRULE_PARTS = {"FREQ", "INTERVAL", "COUNT", "UNTIL", "BYDAY", "BYMONTHDAY",
+                         "BYMONTH", "WKST"}
+
+# Properties read from events and reminders; the rest are only hashed
+USED_PROPERTIES = {"UID", "RECURRENCE-ID", "DTSTART", "DTEND", "DURATION", "SUMMARY",
+                   "STATUS", "RRULE", "EXDATE", "TRIGGER"}
+
+DEFAULT_NAME = "Calendar Event"
+
+
+def unfold(f):
+    """Yield (line number, logical line) with folded continuation lines joined"""
+    pending = None
+    start = 0
+    for number, line in enumerate(f, 1):
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending:
+            yield start, pending
+        pending, start = line, number
+    if pending:
+        yield start, pending
+
+
+def parse_line(text):
+    """(NAME, {PARAM: value}, value) of a content line"""
+    if '"' not in text:
+        # No quoted parameter can hide a colon
+        head, colon, value = text.partition(":")
+        if not colon:
+            raise ValueError(f"not an iCalendar line: {text[:40]!r}")
+        if ";" not in head:
+            return head.upper(), {}, value
+        return _split_params(head, value)
+    quoted = False
+    for index, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == ":" and not quoted:
+            head, value = text[:index], text[index + 1:]
+            break
+    else:
+        raise ValueError(f"not an iCalendar line: {text[:40]!r}")
+    return _split_params(head, value)
+
+
+def _split_params(head, value):
+    parts = head.split(";")
+    params = {}
+    for part in parts[1:]:
+        key, _, param = part.partition("=")
+        params[key.upper()] = param.strip('"')
+    return parts[0].upper(), params, value
+
+
+def unescape(text):
+    """Plain text of an iCalendar TEXT value"""
+    return (text.replace("\\n", " ").replace("\\N", " ").replace("\\,", ",")
+            .replace("\\;", ";").replace("\\\\", "\\"))
+
+
+def parse_date_time(params, value):
+    """(date ordinal, seconds since midnight, timezone, is_date) of a DATE or DATE-TIME
+
+    The timezone is the TZID parameter, "UTC" for a trailing Z, or None for
+    floating (local) times.
+    """
+    value = value.strip()
+    try:
+        day = datetime.date(int(value[0:4]), int(value[4:6]), int(value[6:8])).toordinal()
+    except ValueError:
+        raise ValueError(f"bad date {value!r}")
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return day, 0, params.get("TZID"), True
+    if len(value) < 15 or value[8] != "T" or not value[9:15].isdigit():
+        raise ValueError(f"bad date-time {value!r}")
+    seconds = int(value[9:11]) * 3600 + int(value[11:13]) * 60 + int(value[13:15])
+    timezone = "UTC" if value.endswith("Z") else params.get("TZID")
+    return day, seconds, timezone, False
+
+
+def parse_duration(value):
+    """Signed seconds of an iCalendar DURATION such as -PT15M or P1DT2H"""
+    text = value.strip().upper()
+    sign = -1 if text.startswith("-") else 1
+    text = text.lstrip("+-")
+    if not text.startswith("P"):
+        raise ValueError(f"bad duration {value!r}")
+    seconds = 0
+    number = ""
+    for char in text[1:]:
+        if char.isdigit():
+            number += char
+        elif char == "T":
+            continue
+        elif char in "WDHMS" and number:
+            # M after T is minutes; months are not allowed in durations
+            seconds += int(number) * {"W": 604800, "D": 86400, "H": 3600, "M": 60, "S": 1}[char]
+            number = ""
+        else:
+            raise ValueError(f"bad duration {value!r}")
+    if number:
+        raise ValueError(f"bad duration {value!r}")
+    return sign * seconds
+
+
+def _date_list(entries):
+    """Date ordinals of EXDATE / RDATE style properties (comma-separated values)"""
+    days = set()
+    for params, value in entries:
+        for item in value.split(","):
+            if item.strip():
+                days.add(parse_date_time(params, item)[0])
+    return days
+
+
+def _iso(day):
+    return datetime.date.fromordinal(day).isoformat()
+
+
+def _hms(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _events(path):
+    """Yield (line, properties, reminders, digest) for each VEVENT in a file
+
+    properties maps each property name to a list of (params, value); each
+    reminder is the property dict of one VALARM. digest covers the event's
+    text apart from HASH_IGNORED properties.
+    """
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        event = None
+        reminder = None
+        for number, text in unfold(f):
+            # Most lines are only hashed, so find the name without a full parse
+            name = text.partition(":")[0].partition(";")[0].upper()
+            if name in ("BEGIN", "END") or name in USED_PROPERTIES:
+                try:
+                    name, params, value = parse_line(text)
+                except ValueError:
+                    if event is not None:
+                        event["_error"] = f"unreadable line {number}"
+                    continue
+            elif event is not None:
+                digest.update(text.encode("utf-8"))
+                digest.update(b"\n")
+                continue
+            if name == "BEGIN" and value.upper() == "VEVENT":
+                event = {}
+                reminders = []
+                digest = hashlib.sha1()
+                start = number
+                continue
+            if event is None:
+                continue
+            if name not in HASH_IGNORED:
+                digest.update(text.encode("utf-8"))
+                digest.update(b"\n")
+            if name == "BEGIN" and value.upper() == "VALARM":
+                reminder = {}
+            elif name == "END" and value.upper() == "VALARM":
+                if reminder is not None:
+                    reminders.append(reminder)
+                reminder = None
+            elif name == "END" and value.upper() == "VEVENT":
+                yield start, event, reminders, digest
+                event = None
+                reminder = None
+            else:
+                target = reminder if reminder is not None else event
+                target.setdefault(name, []).append((params, value))
+
+
+def _first(properties, name, default=None):
+    entries = properties.get(name)
+    return entries[0] if entries else (None, default)
+
+
+def rescheduled_days(path):
+    """UID -> date ordinals of occurrences moved by RECURRENCE-ID overrides"""
+    moved = {}
+    uid = recurrence_id = None
+    with open(path, "r", encoding="utf-8", errors="replace", newline="") as f:
+        # A plain scan: only UID and RECURRENCE-ID lines matter here
+        for _, text in unfold(f):
+            if text.startswith("UID"):
+                uid = parse_line(text)[2].strip()
+            elif text.startswith("RECURRENCE-ID"):
+                recurrence_id = parse_line(text)
+            elif text.startswith("END:VEVENT"):
+                if uid and recurrence_id:
+                    try:
+                        day = parse_date_time(*recurrence_id[1:])[0]
+                        moved.setdefault(uid, set()).add(day)
+                    except ValueError:
+                        pass
+                uid = recurrence_id = None
+    return moved
+
+
+def event_key(event, digest):
+    """Identity of an event across imports: UID, plus RECURRENCE-ID for an override"""
+    uid = _first(event, "UID", "")[1].strip()
+    if not uid:
+        # Without a UID any edit makes it a new event
+        return "hash:" + digest
+    recurrence_id = _first(event, "RECURRENCE-ID", "")[1].strip()
+    return f"{uid}@{recurrence_id}" if recurrence_id else uid
+
+
+def read_calendar(path, calendar, known=None, unchanged=None, now=None):
+    """Yield (line, alarm record or ValueError) for the new and changed events of a file
+
+    `known` maps ical_uid to the ical_hash already imported; events whose hash
+    matches are skipped and their keys added to the `unchanged` set. Events
+    that will never ring again (in the past, cancelled) yield nothing.
+    """
+    known = known or {}
+    now = now if now is not None else datetime.datetime.now().timestamp()
+    moved = rescheduled_days(path)
+    for line, event, reminders, digest in _events(path):
+        uid = _first(event, "UID", "")[1].strip()
+        overrides = moved.get(uid, ()) if "RECURRENCE-ID" not in event else ()
+        # Moving an occurrence changes the series it was taken from too
+        for day in sorted(overrides):
+            digest.update(f"moved:{day}".encode("ascii"))
+        content_hash = digest.hexdigest()[:20]
+        key = event_key(event, content_hash)
+        if known.get(key) == content_hash:
+            if unchanged is not None:
+                unchanged.add(key)
+            continue
+        try:
+            if "_error" in event:
+                raise ValueError(event["_error"])
+            for record in event_alarms(event, reminders, overrides, now):
+                record.update(calendar=calendar, ical_uid=key, ical_hash=content_hash)
+                yield line, record
+        except (ValueError, KeyError) as e:
+            yield line, ValueError(f"{unescape(_first(event, 'SUMMARY', uid)[1])}: {e}")
+
+
+def event_alarms(event, reminders, overrides=(), now=None):
+    """Alarm records (time, name, repeat, timezone) for one VEVENT"""
+    if _first(event, "STATUS", "")[1].strip().upper() == "CANCELLED":
+        return []
+    if "DTSTART" not in event:
+        raise ValueError("event has no DTSTART")
+    day, seconds, timezone, is_date = parse_date_time(*event["DTSTART"][0])
+    name = unescape(_first(event, "SUMMARY", "")[1]).strip() or DEFAULT_NAME
+
+    # Reminders relative to the end need the event's length
+    length = 86400 if is_date else 0
+    if "DTEND" in event:
+        end_day, end_seconds, _, _ = parse_date_time(*event["DTEND"][0])
+        length = (end_day - day) * 86400 + end_seconds - seconds
+    elif "DURATION" in event:
+        length = parse_duration(event["DURATION"][0][1])
+
+    triggers = []
+    for reminder in reminders:
+        params, value = _first(reminder, "TRIGGER")
+        if value is None:
+            continue
+        if params.get("VALUE") == "DATE-TIME":
+            triggers.append(("absolute", parse_date_time(params, value)))
+        else:
+            offset = parse_duration(value)
+            if params.get("RELATED", "START").upper() == "END":
+                offset += length
+            triggers.append(("relative", offset))
+    if not triggers:
+        triggers.append(("relative", 0))
+
+    rrule = None
+    if "RRULE" in event and "RECURRENCE-ID" not in event:
+        rrule = parse_rrule(event["RRULE"][0][1])
+    skip = _date_list(event.get("EXDATE", ())) | set(overrides)
+
+    records = []
+    for kind, trigger in dict.fromkeys(triggers):
+        if kind == "absolute":
+            records.append(_once(name, *trigger[:3]))
+            continue
+        shift, alarm_seconds = divmod(seconds + trigger, 86400)
+        if rrule is None:
+            records.append(_once(name, day + shift, alarm_seconds, timezone))
+            continue
+        series = [{"time": _hms(alarm_seconds), "name": name, "repeat": repeat,
+                   "timezone": timezone}
+                  for repeat in rrule_repeats(rrule, day, shift, alarm_seconds, skip)]
+        if rrule.get("COUNT"):
+            until = _count_until(series, int(rrule["COUNT"]), day + shift)
+            for record in series:
+                record["repeat"]["until"] = until
+        records.extend(series)
+
+    # Nothing to add for events that are over
+    alive = []
+    for record in records:
+        rule = Recurrence(record["time"], record["repeat"], record["timezone"])
+        if rule.next_after(now if now is not None else datetime.datetime.now().timestamp()) is not None:
+            if not record["timezone"]:
+                del record["timezone"]
+            alive.append(record)
+    return alive
+
+
+def _once(name, day, seconds, timezone):
+    """A one-off alarm record; UTC times are shown in local time"""
+    if timezone == "UTC":
+        instant = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc) + \
+            datetime.timedelta(days=day - datetime.date(1970, 1, 1).toordinal(), seconds=seconds)
+        local = instant.astimezone()
+        day = local.date().toordinal()
+        seconds = local.hour * 3600 + local.minute * 60 + local.second
+        timezone = None
+    return {"time": _hms(seconds), "name": name,
+            "repeat": {"type": "once", "date": _iso(day)}, "timezone": timezone}
+
+
+def parse_rrule(value):
+    """RRULE parts as a dict, rejecting parts recurrence.py cannot express"""
+    rule = {}
+    for part in value.strip().split(";"):
+        key, _, item = part.partition("=")
+        rule[key.upper()] = item.upper()
+    unsupported = set(rule) - SUPPORTED_RRULE_PARTS
+    if unsupported:
+        raise ValueError(f"unsupported RRULE part {sorted(unsupported)[0]}")
+    if rule.get("FREQ") not in ("MINUTELY", "HOURLY", "DAILY", "WEEKLY", "MONTHLY", "YEARLY"):
+        raise ValueError(f"unsupported RRULE frequency {rule.get('FREQ')!r}")
+    if "COUNT" in rule and "UNTIL" in rule:
+        raise ValueError("RRULE has both COUNT and UNTIL")
+    return rule
+
+
+def _by_day(rule):
+    """Weekdays (Monday = 0) of BYDAY, or None"""
+    if "BYDAY" not in rule:
+        return None
+    days = []
+    for item in rule["BYDAY"].split(","):
+        if item not in ICAL_DAYS:
+            raise ValueError(f"unsupported BYDAY {item!r} (nth weekday of the month)")
+        days.append(ICAL_DAYS.index(item))
+    return sorted(set(days))
+
+
+def _numbers(rule, key, low, high):
+    if key not in rule:
+        return None
+    numbers = sorted({int(item) for item in rule[key].split(",")})
+    if not all(low <= number <= high for number in numbers):
+        raise ValueError(f"unsupported {key} {rule[key]!r}")
+    return numbers
+
+
+def rrule_repeats(rule, day, shift, seconds, skip=()):
+    """repeat dicts for recurrence.py equivalent to an RRULE starting on `day`
+
+    `shift` moves the whole series by whole days (reminders before midnight)
+    and `seconds` is the alarm's time of day.
+    A weekly rule with an INTERVAL over several weekdays needs one rule per
+    weekday, so a list is returned.
+    """
+    freq = rule["FREQ"]
+    every = int(rule.get("INTERVAL", "1") or 1)
+    weekdays = _by_day(rule)
+    month_days = _numbers(rule, "BYMONTHDAY", 1, 31)
+    months = _numbers(rule, "BYMONTH", 1, 12)
+    start = datetime.date.fromordinal(day)
+    common = {"start": _iso(day + shift)}
+    if skip:
+        common["skip"] = [_iso(skipped + shift) for skipped in sorted(skip)]
+    if "UNTIL" in rule:
+        common["until"] = _iso(parse_date_time({}, rule["UNTIL"])[0] + shift)
+
+    def shifted(days):
+        return sorted((weekday + shift) % 7 for weekday in days)
+
+    if freq in ("MINUTELY", "HOURLY"):
+        if weekdays or month_days or months:
+            raise ValueError(f"BY parts are not supported with FREQ={freq}")
+        if "COUNT" in rule:
+            # An until date would let the last day ring far more than COUNT times
+            raise ValueError(f"COUNT is not supported with FREQ={freq}")
+        unit = "minutes" if freq == "MINUTELY" else "hours"
+        return [dict(common, type="interval", every=every, unit=unit)]
+
+    if freq in ("DAILY", "WEEKLY") and not month_days and not months:
+        if freq == "WEEKLY" and weekdays is None:
+            weekdays = [start.weekday()]
+        if weekdays is None:
+            return [dict(common, type="interval", every=every, unit="days")]
+        if every == 1 or freq == "DAILY" and weekdays == list(range(7)):
+            return [dict(common, type="weekly", days=shifted(weekdays))]
+        if freq == "DAILY":
+            raise ValueError("BYDAY with a daily INTERVAL is not supported")
+        # Every n weeks: one rule per weekday, counted from the week of DTSTART
+        monday = day - start.weekday()
+        repeats = []
+        for weekday in weekdays:
+            first = monday + weekday
+            if first < day:
+                first += 7 * every
+            repeats.append(dict(common, type="interval", every=every, unit="weeks",
+                                start=_iso(first + shift)))
+        return repeats
+
+    # Calendar-based rules go through cron, which cannot move a day of month
+    if shift:
+        raise ValueError("reminders on an earlier day are not supported for this RRULE")
+    if weekdays is not None and month_days is not None:
+        # Cron would match either the weekday or the day of month, RRULE both
+        raise ValueError("BYDAY together with BYMONTHDAY is not supported")
+    if freq == "DAILY" or freq == "WEEKLY":
+        if every != 1:
+            raise ValueError(f"INTERVAL with BYMONTH is not supported for FREQ={freq}")
+        if freq == "WEEKLY" and weekdays is None:
+            weekdays = [start.weekday()]
+    elif freq == "MONTHLY":
+        if every != 1:
+            if 12 % every:
+                raise ValueError(f"monthly INTERVAL={every} is not supported")
+            cycle = [(start.month - 1 + step * every) % 12 + 1 for step in range(12 // every)]
+            months = sorted(set(cycle) & set(months)) if months else sorted(cycle)
+        if weekdays is None and month_days is None:
+            month_days = [start.day]
+    else:
+        if every != 1:
+            raise ValueError("yearly INTERVAL is not supported")
+        months = months or [start.month]
+        if weekdays is None and month_days is None:
+            month_days = [start.day]
+    # Cron takes its seconds from the alarm's own time
+    expr = "{} {} {} {} {}".format(
+        seconds // 60 % 60, seconds // 3600,
+        ",".join(map(str, month_days)) if month_days else "*",
+        ",".join(map(str, months)) if months else "*",
+        ",".join(WEEKDAY_NAMES[weekday] for weekday in weekdays) if weekdays else "*")
+    return [dict(common, type="cron", expr=expr)]
+
+
+def _count_until(records, count, first_day):
+    """Date of the COUNT-th occurrence of a series split over several rules"""
+    # Excluded dates still count towards COUNT
+    rules = []
+    for record in records:
+        repeat = {key: value for key, value in record["repeat"].items() if key != "skip"}
+        rules.append(Recurrence(record["time"], repeat, record["timezone"]))
+    zone = rules[0].zone
+    after = zone.exact(first_day, 0) - 1
+    pending = [(rule.next_after(after), index) for index, rule in enumerate(rules)]
+    pending = [item for item in pending if item[0] is not None]
+    heapq.heapify(pending)
+    instant = None
+    for _ in range(count):
+        if not pending:
+            break
+        instant, index = heapq.heappop(pending)
+        following = rules[index].next_after(instant)
+        if following is not None:
+            heapq.heappush(pending, (following, index))
+    if instant is None:
+        return _iso(first_day)
+    return _iso(zone.locate(instant))
@@ -1,116 +1,243 @@
+import time
+
+# Taken before anything else is imported so the startup report covers imports
+PROCESS_START = time.perf_counter()
+
 from tkinter import *
 from tkinter import ttk, messagebox, filedialog
-import datetime
-import time
-import winsound
 import threading
 import os
-import json
-from PIL import Image, ImageTk
-import pytz
-import math
-import io
-import base64
+from alarm_engine import AlarmEngine
+from startup import StartupTimer
+from world_clock import ZoneOffsetCache, BoardTimes, format_clock_seconds
+from widgets import ClockGrid, VirtualList
+from stopwatch import Stopwatch, format_stopwatch_ns
+from recurrence import describe
+from frame_scheduler import FrameScheduler
+from event_queue import EventQueue
+from themes import ThemeManager
+from clock import SYSTEM_CLOCK
+import metrics
+import profiling
+import control
+import alarm_db
+from profiling import profiled
+
+# PIL, pytz, the audio backends, the search index and the map raster are
+# imported when the tab or feature needing them is first used
+
+# World map image size and hover throttle
+MAP_SIZE = (800, 400)
+MAP_HOVER_INTERVAL_MS = 30
+
+# Pause between building hidden tabs while the UI is idle
+IDLE_TAB_DELAY_MS = 50
+
+# Engine events are handed to the Tk loop through a queue drained this often
+EVENT_POLL_INTERVAL = 0.2
+EVENT_BATCH = 64
+
+# Stopwatch refresh: about what the eye can follow, backing off while Tk lags
+STOPWATCH_FRAME = 1 / 30
+STOPWATCH_SLOWEST_FRAME = 0.1
+
+# Repeat choices on the Set Alarm tab; cron and interval rules come from the settings file
+REPEAT_CHOICES = {
+    "Daily": None,
+    "Once": {"type": "once"},
+    "Weekdays": {"type": "weekly", "days": [0, 1, 2, 3, 4]},
+    "Weekends": {"type": "weekly", "days": [5, 6]},
+}
+
 
 class EnhancedAlarmClockApp:
-    def __init__(self, root):
+    def __init__(self, root, startup=None, print_startup_report=False, control_socket=None,
+                 control_enabled=True, clock=SYSTEM_CLOCK, alarm_database=None):
+        # Cold-start phases, reported from the Help menu
+        self.startup = startup or StartupTimer(PROCESS_START)
+        self.print_startup_report = print_startup_report
+        
+        # Local control socket for scripts (see control.py), opened once idle
+        self.control_socket = control_socket
+        self.control_enabled = control_enabled
+        self.control = None
+        
         # Initialize main window
         self.root = root
         self.root.title("Enhanced Alarm Clock")
         self.root.geometry("1000x700")
         self.root.minsize(800, 600)
         
+        # Every "what time is it" in the app reads this clock (see clock.py)
+        self.clock = clock
+        
         # Variables
         self.alarms = []
-        self.active_alarms = {}
-        self.is_dark_mode = BooleanVar(value=False)
+        self.theme_name = StringVar(value="light")
         self.alarm_sound = "sound.wav"
         self.snooze_time = IntVar(value=5)
-        self.stopwatch_running = False
-        self.stopwatch_start = 0
-        self.stopwatch_elapsed = 0
-        self.lap_times = []
+        self.stopwatch = Stopwatch(clock.monotonic_ns)
         self.world_clocks = [
             {"city": "New York", "timezone": "America/New_York"},
             {"city": "London", "timezone": "Europe/London"},
             {"city": "Tokyo", "timezone": "Asia/Tokyo"},
             {"city": "Sydney", "timezone": "Australia/Sydney"}
         ]
+        # Resolved zones with their current offset and next DST transition
+        self.zone_offsets = ZoneOffsetCache()
+        self.board_times = BoardTimes(self.zone_offsets)
         
         # Create settings file if it doesn't exist
         self.config_file = "alarm_settings.json"
-        self.load_settings()
         
-        # Load world map image (using base64 encoded placeholder)
-        self.world_map_img = self.create_world_map_placeholder()
+        # Alarm engine owns the alarms, their scheduler and the settings file.
+        # Its events arrive on the scheduler thread and are queued for the Tk loop
+        self.events = EventQueue()
+        self.reported_drops = 0
+        metrics.gauge("ui_event_queue_depth", "Engine events waiting for the Tk loop",
+                      function=lambda: len(self.events))
+        metrics.gauge("ui_event_queue_high_water", "Most engine events ever waiting at once",
+                      function=lambda: self.events.high_water)
+        metrics.gauge("ui_events_dropped", "Engine events dropped because the Tk loop fell behind",
+                      function=lambda: self.events.dropped)
+        self.notifications = {}
+        with self.startup.phase("alarm engine"):
+            # With a database path the alarms live in SQLite (see alarm_db.py)
+            self.engine = AlarmEngine(self.config_file, clock=clock, database=alarm_database)
+            self.engine.add_listener(self.events.post)
+            # Alarm list changes, redrawn in the alarms list when on screen
+            self.engine.alarms.add_listener(
+                lambda *change: self.events.post("alarm_change", change))
+            self.load_settings()
+        
+        # Audio engine, created once the window is up (see on_idle)
+        self.audio = None
+        self.audio_lock = threading.Lock()
+        
+        # Timezone map raster and image, loaded in the background
+        self.world_map_img = None
+        self.tz_raster = None
+        self.map_pointer = None
+        self.map_hover_pending = False
+        
+        # Widgets of tabs that have not been built yet
+        self.alarms_listbox = None
+        # Store version the alarms list shows
+        self.alarms_version = 0
+        self.lap_list = None
+        self.world_clock_frame = None
+        self.map_time_label = None
+        
+        # Every periodic UI update runs from this one timer
+        self.frames = FrameScheduler(self.root, clock=clock.time)
+        
+        # Theme files are read here, once; switching later is styles only.
+        # Applied before any widget exists so every widget starts themed
+        with self.startup.phase("theme"):
+            self.themes = ThemeManager(self.root)
+            self.apply_theme()
         
         # Create UI
-        self.create_menu()
-        self.create_widgets()
-        self.apply_theme()
+        with self.startup.phase("menu"):
+            self.create_menu()
+        with self.startup.phase("window"):
+            self.create_widgets()
+        
+        # Periodic updates; tasks for tabs that are not shown stay paused
+        self.frames.add("engine_events", self.process_engine_events,
+                        interval=EVENT_POLL_INTERVAL, always=True)
+        self.frames.add("clock", self.update_time)
+        self.frames.add("world_clocks", self.update_world_clocks,
+                        visible=lambda: self.is_tab_shown(self.world_clock_tab))
+        self.frames.add("map_time", self.update_map_time,
+                        visible=lambda: self.is_tab_shown(self.world_map_tab))
+        self.frames.add("stopwatch", self.update_stopwatch, interval=STOPWATCH_FRAME,
+                        visible=lambda: self.is_tab_shown(self.stopwatch_tab),
+                        enabled=False, adaptive=True, max_interval=STOPWATCH_SLOWEST_FRAME)
+        
+        # Write pending settings before the window closes
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_app)
+        
+        # The rest of the startup work waits for the first idle moment
+        self.root.after_idle(self.on_idle)
+        
+    def on_idle(self):
+        """Finish startup once the window has been drawn"""
+        self.startup.mark("window ready")
+        with self.startup.phase("audio engine"):
+            self.get_audio()
+        if self.control_enabled:
+            with self.startup.phase("control socket"):
+                self.control = control.serve(self.engine, self.control_socket)
+        self.root.after(IDLE_TAB_DELAY_MS, self.build_next_tab)
+        
+    def get_audio(self):
+        """Audio engine, created (with the alarm sound decoded) on first use"""
+        # Alarms ring on worker threads, which may get here first
+        with self.audio_lock:
+            if self.audio is None:
+                from audio import AudioEngine
+                self.audio = AudioEngine()
+                self.audio.preload(self.alarm_sound)
+        return self.audio
+        
+    def load_world_map(self):
+        """Load (or build and cache) the timezone raster and render the map"""
+        result = {}
+        
+        def work():
+            try:
+                from tz_map import TimezoneRaster
+                raster = TimezoneRaster.cached()
+                result["raster"] = raster
+                result["image"] = raster.render(MAP_SIZE)
+            except Exception as e:
+                result["error"] = e
         
-        # Start world clock updates
-        self.update_world_clocks()
+        def finish():
+            if not result:
+                self.root.after(100, finish)
+                return
+            if "error" in result:
+                self.timezone_info.config(text=f"Could not load timezone map: {result['error']}")
+                return
+            # PhotoImage must be created on the Tk thread
+            from PIL import ImageTk
+            self.tz_raster = result["raster"]
+            self.world_map_img = ImageTk.PhotoImage(result["image"])
+            self.world_map_label.config(image=self.world_map_img)
+            self.timezone_info.config(text="Hover over the map to see the local time")
         
-    def create_world_map_placeholder(self):
-        """Create a simple world map placeholder with time zones"""
-        try:
-            # In a real app, you would use an actual world map image
-            # This is a placeholder that creates a simple gradient with time zones
-            from PIL import Image, ImageDraw
-            
-            # Create a blank image
-            img = Image.new('RGB', (800, 400), (255, 255, 255))
-            draw = ImageDraw.Draw(img)
-            
-            # Draw simple continents
-            draw.rectangle([100, 100, 300, 300], outline=(0, 0, 255), width=2)  # Americas
-            draw.rectangle([350, 100, 550, 300], outline=(0, 0, 255), width=2)  # Europe/Africa
-            draw.rectangle([600, 100, 700, 300], outline=(0, 0, 255), width=2)  # Asia
-            
-            # Draw time zone lines
-            for i in range(0, 800, 100):
-                draw.line([i, 0, i, 400], fill=(200, 200, 200), width=1)
-                draw.text((i+10, 10), f"UTC{i//100 - 8}", fill=(0, 0, 0))
-            
-            return ImageTk.PhotoImage(img)
-        except:
-            # Fallback if PIL is not available
-            return None
+        threading.Thread(target=profiled("map")(work), name="WorldMapLoader", daemon=True).start()
+        finish()
         
     def load_settings(self):
         """Load user settings from file"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, "r") as f:
-                    settings = json.load(f)
-                    self.is_dark_mode.set(settings.get("dark_mode", False))
-                    self.alarm_sound = settings.get("alarm_sound", "sound.wav")
-                    self.snooze_time.set(settings.get("snooze_time", 5))
-                    self.alarms = settings.get("saved_alarms", [])
-                    self.world_clocks = settings.get("world_clocks", [
-                        {"city": "New York", "timezone": "America/New_York"},
-                        {"city": "London", "timezone": "Europe/London"},
-                        {"city": "Tokyo", "timezone": "Asia/Tokyo"},
-                        {"city": "Sydney", "timezone": "Australia/Sydney"}
-                    ])
-        except Exception as e:
-            print(f"Error loading settings: {e}")
+        # The engine reads the file and schedules the saved alarms
+        self.engine.load()
+        settings = self.engine.settings
+        # Older settings files only know light and dark
+        self.theme_name.set(settings.get("theme") or
+                            ("dark" if settings.get("dark_mode") else "light"))
+        self.alarm_sound = self.engine.alarm_sound
+        self.snooze_time.set(self.engine.snooze_time)
+        self.alarms = self.engine.alarms
+        self.world_clocks = settings.get("world_clocks", [
+            {"city": "New York", "timezone": "America/New_York"},
+            {"city": "London", "timezone": "Europe/London"},
+            {"city": "Tokyo", "timezone": "Asia/Tokyo"},
+            {"city": "Sydney", "timezone": "Australia/Sydney"}
+        ])
     
+    @profiled("persistence")
     def save_settings(self):
         """Save user settings to file"""
-        settings = {
-            "dark_mode": self.is_dark_mode.get(),
-            "alarm_sound": self.alarm_sound,
-            "snooze_time": self.snooze_time.get(),
-            "saved_alarms": self.alarms,
-            "world_clocks": self.world_clocks
-        }
-        try:
-            with open(self.config_file, "w") as f:
-                json.dump(settings, f)
-        except Exception as e:
-            print(f"Error saving settings: {e}")
+        self.engine.settings["theme"] = self.theme_name.get()
+        self.engine.settings.pop("dark_mode", None)
+        self.engine.settings["world_clocks"] = self.world_clocks
+        self.engine.alarm_sound = self.alarm_sound
+        self.engine.snooze_time = self.snooze_time.get()
+        self.engine.save()
     
     def create_menu(self):
         """Create menu bar"""
@@ -120,67 +247,90 @@ class EnhancedAlarmClockApp:
         file_menu = Menu(menu_bar, tearoff=0)
         file_menu.add_command(label="Save Settings", command=self.save_settings)
         file_menu.add_command(label="Select Alarm Sound", command=self.select_sound)
+        file_menu.add_command(label="Import Alarms...", command=self.import_alarms)
+        file_menu.add_command(label="Export Alarms...", command=self.export_alarms)
+        file_menu.add_command(label="Import Calendar...", command=self.import_calendar)
+        
+        # What to do with alarms missed while the computer slept or stalled
+        missed_menu = Menu(file_menu, tearoff=0)
+        self.missed_policy = StringVar(value=self.engine.scheduler.missed_policy)
+        for label, policy in (("Ring Each Late", "fire_late"), ("Ring Once", "coalesce"),
+                              ("Skip and Log", "drop")):
+            missed_menu.add_radiobutton(label=label, value=policy, variable=self.missed_policy,
+                                        command=self.set_missed_policy)
+        file_menu.add_cascade(label="Missed Alarms", menu=missed_menu)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.exit_app)
         menu_bar.add_cascade(label="File", menu=file_menu)
         
         # Themes menu
         theme_menu = Menu(menu_bar, tearoff=0)
-        theme_menu.add_checkbutton(label="Dark Mode", variable=self.is_dark_mode, 
-                                  command=self.apply_theme)
+        for key, name in self.themes.names():
+            theme_menu.add_radiobutton(label=name, value=key, variable=self.theme_name,
+                                       command=self.apply_theme)
         menu_bar.add_cascade(label="Themes", menu=theme_menu)
         
         # Help menu
         help_menu = Menu(menu_bar, tearoff=0)
         help_menu.add_command(label="Instructions", command=self.show_instructions)
+        help_menu.add_command(label="Startup Report", command=self.show_startup_report)
+        self.profiling = BooleanVar(value=profiling.PROFILER.enabled)
+        help_menu.add_checkbutton(label="Profiling", variable=self.profiling,
+                                  command=self.toggle_profiling)
         help_menu.add_command(label="About", command=self.show_about)
         menu_bar.add_cascade(label="Help", menu=help_menu)
         
         self.root.config(menu=menu_bar)
     
+    def set_missed_policy(self):
+        """Apply the missed-alarm policy chosen in the menu"""
+        self.engine.set_missed_policy(self.missed_policy.get())
+        self.save_settings()
+    
     def create_widgets(self):
         """Create all UI elements"""
         # Main frame with padding
-        self.main_frame = Frame(self.root, padx=20, pady=20)
+        self.main_frame = ttk.Frame(self.root, padding=20)
         self.main_frame.pack(fill=BOTH, expand=True)
         
         # Title with custom font and color
-        self.title_label = Label(self.main_frame, text="Enhanced Alarm Clock", 
-                                font=("Helvetica", 24, "bold"))
+        self.title_label = ttk.Label(self.main_frame, text="Enhanced Alarm Clock", 
+                                    style="Title.TLabel")
         self.title_label.pack(pady=10)
         
         # Current time display
-        self.time_label = Label(self.main_frame, font=("Helvetica", 14))
+        self.time_label = ttk.Label(self.main_frame, style="Clock.TLabel")
         self.time_label.pack(pady=5)
-        self.update_time()
         
-        # Notebook for multiple tabs
+        # Notebook for multiple tabs; each tab's content is built on first
+        # view or while the UI is idle, in the order added
         self.tab_control = ttk.Notebook(self.main_frame)
+        self.tab_builders = {}
         
         # Set Alarm Tab
-        self.alarm_tab = Frame(self.tab_control)
+        self.alarm_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(self.alarm_tab, text="Set Alarm")
-        self.create_alarm_tab()
+        self.tab_builders[str(self.alarm_tab)] = self.create_alarm_tab
         
         # Alarms Tab
-        self.alarms_tab = Frame(self.tab_control)
+        self.alarms_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(self.alarms_tab, text="Active Alarms")
-        self.create_alarms_tab()
+        self.tab_builders[str(self.alarms_tab)] = self.create_alarms_tab
         
         # Stopwatch Tab
-        self.stopwatch_tab = Frame(self.tab_control)
+        self.stopwatch_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(self.stopwatch_tab, text="Stopwatch")
-        self.create_stopwatch_tab()
+        self.tab_builders[str(self.stopwatch_tab)] = self.create_stopwatch_tab
         
         # World Clock Tab
-        self.world_clock_tab = Frame(self.tab_control)
+        self.world_clock_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(self.world_clock_tab, text="World Clock")
-        self.create_world_clock_tab()
+        self.tab_builders[str(self.world_clock_tab)] = self.create_world_clock_tab
         
         # World Map Tab
-        self.world_map_tab = Frame(self.tab_control)
+        self.world_map_tab = ttk.Frame(self.tab_control)
         self.tab_control.add(self.world_map_tab, text="World Map")
-        self.create_world_map_tab()
+        self.tab_builders[str(self.world_map_tab)] = self.create_world_map_tab
         
         # Pack the notebook
         self.tab_control.pack(expand=True, fill=BOTH)
@@ -188,156 +338,215 @@ class EnhancedAlarmClockApp:
         # Status bar
         self.status_var = StringVar()
         self.status_var.set("Ready")
-        self.status_bar = Label(self.main_frame, textvariable=self.status_var, bd=1, relief=SUNKEN, anchor=W)
+        self.status_bar = ttk.Label(self.main_frame, textvariable=self.status_var, relief=SUNKEN,
+                                    anchor=W, style="Status.TLabel")
         self.status_bar.pack(side=BOTTOM, fill=X)
         
-        # Load saved alarms
-        self.load_saved_alarms()
+        # Only the tab on screen is needed before the window shows
+        self.build_tab(self.tab_control.select())
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+    
+    def on_tab_changed(self, event):
+        """Build the newly shown tab and resume its periodic updates"""
+        self.build_tab(self.tab_control.select())
+        self.frames.wake()
+    
+    def is_tab_shown(self, tab):
+        """True if the tab is the selected one (and has been built)"""
+        return self.tab_control.select() == str(tab) and str(tab) not in self.tab_builders
+    
+    def build_tab(self, tab_name):
+        """Build a tab's content if it has not been built yet"""
+        builder = self.tab_builders.pop(str(tab_name), None)
+        if builder is None:
+            return
+        tab = self.tab_control.nametowidget(tab_name)
+        with self.startup.phase(f"tab: {self.tab_control.tab(tab, 'text')}"):
+            builder()
+    
+    def build_next_tab(self):
+        """Build one hidden tab, then yield to the event loop before the next"""
+        if self.tab_builders:
+            self.build_tab(next(iter(self.tab_builders)))
+        if self.tab_builders:
+            self.root.after(IDLE_TAB_DELAY_MS, self.build_next_tab)
+            return
+        self.startup.mark("all tabs built")
+        if self.print_startup_report:
+            print(self.startup.report())
     
     def create_alarm_tab(self):
         """Create content for the alarm tab"""
         # Time selection frame
-        time_frame = Frame(self.alarm_tab)
+        time_frame = ttk.Frame(self.alarm_tab)
         time_frame.pack(pady=10)
         
         # Hour selection
-        Label(time_frame, text="Hour:").grid(row=0, column=0, padx=5)
+        ttk.Label(time_frame, text="Hour:").grid(row=0, column=0, padx=5)
         self.hour = StringVar(self.root)
         self.hours = tuple(f"{i:02d}" for i in range(24))
-        self.hour.set(self.hours[datetime.datetime.now().hour])
+        self.hour.set(self.hours[self.clock.now().hour])
         ttk.Combobox(time_frame, textvariable=self.hour, values=self.hours, width=5).grid(row=1, column=0, padx=5)
         
         # Minute selection
-        Label(time_frame, text="Minute:").grid(row=0, column=1, padx=5)
+        ttk.Label(time_frame, text="Minute:").grid(row=0, column=1, padx=5)
         self.minute = StringVar(self.root)
         self.minutes = tuple(f"{i:02d}" for i in range(60))
-        self.minute.set(self.minutes[datetime.datetime.now().minute])
+        self.minute.set(self.minutes[self.clock.now().minute])
         ttk.Combobox(time_frame, textvariable=self.minute, values=self.minutes, width=5).grid(row=1, column=1, padx=5)
         
         # Second selection
-        Label(time_frame, text="Second:").grid(row=0, column=2, padx=5)
+        ttk.Label(time_frame, text="Second:").grid(row=0, column=2, padx=5)
         self.second = StringVar(self.root)
         self.seconds = tuple(f"{i:02d}" for i in range(60))
         self.second.set(self.seconds[0])
         ttk.Combobox(time_frame, textvariable=self.second, values=self.seconds, width=5).grid(row=1, column=2, padx=5)
         
         # Alarm name entry
-        name_frame = Frame(self.alarm_tab)
+        name_frame = ttk.Frame(self.alarm_tab)
         name_frame.pack(pady=10)
-        Label(name_frame, text="Alarm Name:").pack(side=LEFT, padx=5)
+        ttk.Label(name_frame, text="Alarm Name:").pack(side=LEFT, padx=5)
         self.alarm_name = StringVar(value="My Alarm")
-        Entry(name_frame, textvariable=self.alarm_name, width=20).pack(side=LEFT)
+        ttk.Entry(name_frame, textvariable=self.alarm_name, width=20).pack(side=LEFT)
+        
+        # Recurrence and timezone (blank for local time)
+        repeat_frame = ttk.Frame(self.alarm_tab)
+        repeat_frame.pack(pady=5)
+        ttk.Label(repeat_frame, text="Repeat:").pack(side=LEFT, padx=5)
+        self.repeat_choice = StringVar(value="Daily")
+        ttk.Combobox(repeat_frame, textvariable=self.repeat_choice, values=tuple(REPEAT_CHOICES),
+                     state="readonly", width=10).pack(side=LEFT)
+        ttk.Label(repeat_frame, text="Timezone:").pack(side=LEFT, padx=5)
+        self.alarm_timezone = StringVar()
+        ttk.Entry(repeat_frame, textvariable=self.alarm_timezone, width=20).pack(side=LEFT)
         
         # Snooze frame
-        snooze_frame = Frame(self.alarm_tab)
+        snooze_frame = ttk.Frame(self.alarm_tab)
         snooze_frame.pack(pady=5)
-        Label(snooze_frame, text="Snooze Time (minutes):").pack(side=LEFT, padx=5)
+        ttk.Label(snooze_frame, text="Snooze Time (minutes):").pack(side=LEFT, padx=5)
         ttk.Spinbox(snooze_frame, from_=1, to=30, textvariable=self.snooze_time, width=5).pack(side=LEFT)
         
         # Buttons frame
-        buttons_frame = Frame(self.alarm_tab)
+        buttons_frame = ttk.Frame(self.alarm_tab)
         buttons_frame.pack(pady=10)
         
         # Set alarm button with improved styling
-        self.set_button = Button(buttons_frame, text="Set Alarm", font=("Helvetica", 12), 
-                               command=self.set_alarm, width=10)
+        self.set_button = ttk.Button(buttons_frame, text="Set Alarm", style="Large.TButton", 
+                                    command=self.set_alarm, width=10)
         self.set_button.pack(side=LEFT, padx=5)
         
         # Test sound button
-        self.test_button = Button(buttons_frame, text="Test Sound", font=("Helvetica", 12), 
-                                command=self.test_alarm_sound, width=10)
+        self.test_button = ttk.Button(buttons_frame, text="Test Sound", style="Large.TButton", 
+                                     command=self.test_alarm_sound, width=10)
         self.test_button.pack(side=LEFT, padx=5)
     
     def create_alarms_tab(self):
         """Create content for the alarms tab"""
         # Alarms list
-        Label(self.alarms_tab, text="Your Alarms", font=("Helvetica", 14, "bold")).pack(pady=5)
+        ttk.Label(self.alarms_tab, text="Your Alarms", style="Heading.TLabel").pack(pady=5)
         
         # Create frame for alarms list with scrollbar
-        alarms_frame = Frame(self.alarms_tab)
+        alarms_frame = ttk.Frame(self.alarms_tab)
         alarms_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
         
-        self.alarms_listbox = Listbox(alarms_frame, height=10, width=50)
-        self.alarms_listbox.pack(side=LEFT, fill=BOTH, expand=True)
-        
-        scrollbar = Scrollbar(alarms_frame, orient="vertical")
-        scrollbar.config(command=self.alarms_listbox.yview)
-        scrollbar.pack(side=RIGHT, fill=Y)
-        
-        self.alarms_listbox.config(yscrollcommand=scrollbar.set)
+        # Rows are read from the store only while on screen, a page at a time
+        # from an alarm database; the selection is kept by alarm id
+        self.alarms_listbox = VirtualList(alarms_frame, lambda: len(self.alarms),
+                                          lambda row: self.format_alarm_row(self.alarms.at(row)),
+                                          height=10, width=50, selectmode=EXTENDED,
+                                          row_key=lambda row: self.alarms.at(row)["id"],
+                                          key_row=self.alarms.row_of)
+        self.alarms_listbox.pack(fill=BOTH, expand=True)
+        self.themes.track(self.alarms_listbox.listbox)
         
         # Buttons for alarms management
-        alarms_buttons_frame = Frame(self.alarms_tab)
+        alarms_buttons_frame = ttk.Frame(self.alarms_tab)
         alarms_buttons_frame.pack(pady=10)
         
-        Button(alarms_buttons_frame, text="Remove Alarm", command=self.remove_alarm, 
-              font=("Helvetica", 12)).pack(side=LEFT, padx=5)
+        ttk.Button(alarms_buttons_frame, text="Remove Alarm", command=self.remove_alarm, 
+                   style="Large.TButton").pack(side=LEFT, padx=5)
+        ttk.Button(alarms_buttons_frame, text="Turn On/Off", command=self.toggle_alarm, 
+                   style="Large.TButton").pack(side=LEFT, padx=5)
+        
+        # Load saved alarms
+        self.load_saved_alarms()
     
     def create_stopwatch_tab(self):
         """Create content for the stopwatch tab"""
         # Stopwatch display
-        self.stopwatch_label = Label(self.stopwatch_tab, text="00:00:00.000", font=("Helvetica", 36))
+        self.stopwatch_label = ttk.Label(self.stopwatch_tab, text="00:00:00.000", style="Display.TLabel")
         self.stopwatch_label.pack(pady=20)
         
         # Buttons frame
-        buttons_frame = Frame(self.stopwatch_tab)
+        buttons_frame = ttk.Frame(self.stopwatch_tab)
         buttons_frame.pack(pady=10)
         
         # Start/Stop button
-        self.start_stop_button = Button(buttons_frame, text="Start", font=("Helvetica", 12), 
-                                      command=self.toggle_stopwatch, width=10)
+        self.start_stop_button = ttk.Button(buttons_frame, text="Start", style="Large.TButton", 
+                                           command=self.toggle_stopwatch, width=10)
         self.start_stop_button.pack(side=LEFT, padx=5)
         
         # Lap button
-        self.lap_button = Button(buttons_frame, text="Lap", font=("Helvetica", 12), 
-                                command=self.record_lap, width=10, state=DISABLED)
+        self.lap_button = ttk.Button(buttons_frame, text="Lap", style="Large.TButton", 
+                                     command=self.record_lap, width=10, state=DISABLED)
         self.lap_button.pack(side=LEFT, padx=5)
         
         # Reset button
-        self.reset_button = Button(buttons_frame, text="Reset", font=("Helvetica", 12), 
-                                 command=self.reset_stopwatch, width=10)
+        self.reset_button = ttk.Button(buttons_frame, text="Reset", style="Large.TButton", 
+                                       command=self.reset_stopwatch, width=10)
         self.reset_button.pack(side=LEFT, padx=5)
         
         # Lap times frame
-        lap_frame = Frame(self.stopwatch_tab)
+        lap_frame = ttk.Frame(self.stopwatch_tab)
         lap_frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
         
-        # Lap times list
-        self.lap_listbox = Listbox(lap_frame, height=10, width=50)
-        self.lap_listbox.pack(side=LEFT, fill=BOTH, expand=True)
-        
-        scrollbar = Scrollbar(lap_frame, orient="vertical")
-        scrollbar.config(command=self.lap_listbox.yview)
-        scrollbar.pack(side=RIGHT, fill=Y)
-        
-        self.lap_listbox.config(yscrollcommand=scrollbar.set)
+        # Lap times list; rows are formatted only while on screen
+        self.lap_list = VirtualList(lap_frame, lambda: len(self.stopwatch.laps),
+                                    self.format_lap, height=10, width=50)
+        self.lap_list.pack(fill=BOTH, expand=True)
+        self.themes.track(self.lap_list.listbox)
     
     def create_world_clock_tab(self):
         """Create content for the world clock tab"""
-        # Frame for clock displays
-        self.world_clock_frame = Frame(self.world_clock_tab)
+        # Scrollable grid for clock displays; only visible tiles are built
+        self.world_clock_frame = ClockGrid(self.world_clock_tab, self.world_clocks,
+                                           self.remove_world_clock)
         self.world_clock_frame.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        self.themes.track(self.world_clock_frame.canvas)
         
         # Add/remove city frame
-        city_frame = Frame(self.world_clock_tab)
+        city_frame = ttk.Frame(self.world_clock_tab)
         city_frame.pack(fill=X, padx=10, pady=5)
         
-        # City selection
-        Label(city_frame, text="City:").pack(side=LEFT, padx=5)
+        # Search index over zones, aliases and the bundled city list
+        from tz_search import TimezoneSearchIndex
+        self.tz_index = TimezoneSearchIndex()
+        
+        # City selection with suggestions as you type
+        ttk.Label(city_frame, text="City:").pack(side=LEFT, padx=5)
         self.city_name = StringVar()
-        Entry(city_frame, textvariable=self.city_name, width=20).pack(side=LEFT, padx=5)
+        city_entry = ttk.Entry(city_frame, textvariable=self.city_name, width=20)
+        city_entry.pack(side=LEFT, padx=5)
+        city_entry.bind("<KeyRelease>", self.on_city_typed)
+        city_entry.bind("<Down>", lambda event: self.focus_suggestions())
         
-        # Timezone selection
-        Label(city_frame, text="Timezone:").pack(side=LEFT, padx=5)
+        # Timezone selection, filtered per keystroke
+        ttk.Label(city_frame, text="Timezone:").pack(side=LEFT, padx=5)
         self.timezone_var = StringVar()
-        timezones = sorted(pytz.all_timezones)
         self.timezone_combo = ttk.Combobox(city_frame, textvariable=self.timezone_var, 
-                                          values=timezones, width=30)
+                                          values=self.common_zones(), width=30)
         self.timezone_combo.pack(side=LEFT, padx=5)
+        self.timezone_combo.bind("<KeyRelease>", self.on_timezone_typed)
         
         # Add button
-        Button(city_frame, text="Add Clock", font=("Helvetica", 10), 
-              command=self.add_world_clock).pack(side=LEFT, padx=5)
+        ttk.Button(city_frame, text="Add Clock", 
+                   command=self.add_world_clock).pack(side=LEFT, padx=5)
+        
+        # Suggestions list, shown while there are matches
+        self.suggestions = []
+        self.suggestion_list = self.themes.track(Listbox(self.world_clock_tab, height=6))
+        self.suggestion_list.bind("<<ListboxSelect>>", self.on_suggestion_selected)
+        self.suggestion_list.bind("<Return>", self.on_suggestion_selected)
         
         # Create initial clock displays
         self.update_world_clock_displays()
@@ -345,49 +554,131 @@ class EnhancedAlarmClockApp:
     def create_world_map_tab(self):
         """Create content for the world map tab"""
         # World map display
-        self.world_map_label = Label(self.world_map_tab)
+        self.world_map_label = ttk.Label(self.world_map_tab)
         self.world_map_label.pack(pady=10)
         
-        if self.world_map_img:
-            self.world_map_label.config(image=self.world_map_img)
-        
         # Timezone information
-        self.timezone_info = Label(self.world_map_tab, text="", font=("Helvetica", 12))
+        self.timezone_info = ttk.Label(self.world_map_tab, text="Loading timezone map...",
+                                       font=("Helvetica", 12))
         self.timezone_info.pack(pady=10)
         
         # Current time display
-        self.map_time_label = Label(self.world_map_tab, font=("Helvetica", 14))
+        self.map_time_label = ttk.Label(self.world_map_tab, style="Clock.TLabel")
         self.map_time_label.pack(pady=5)
         
         # Bind mouse motion to show timezone info
-        self.world_map_label.bind("<Motion>", self.show_timezone_info)
-    
-    def show_timezone_info(self, event):
-        """Show timezone information based on mouse position"""
-        # Calculate approximate timezone based on x position
-        width = self.world_map_label.winfo_width()
-        if width == 1:  # Sometimes returns 1 before being rendered
-            width = 800  # Default to our placeholder image width
-            
-        x_pos = event.x
-        timezone_offset = round((x_pos / width) * 24 - 12)  # -12 to +12
+        self.world_map_label.bind("<Motion>", self.on_map_motion)
         
-        # Get current time in that timezone
-        now = datetime.datetime.now(pytz.utc)
-        tz_time = now + datetime.timedelta(hours=timezone_offset)
+        # Rendering the map happens off the UI thread
+        self.load_world_map()
+    
+    def on_map_motion(self, event):
+        """Remember the pointer; lookups run at most once per throttle interval"""
+        self.map_pointer = (event.x, event.y)
+        if not self.map_hover_pending:
+            self.map_hover_pending = True
+            self.root.after(MAP_HOVER_INTERVAL_MS, self.show_timezone_info)
+    
+    @profiled("map")
+    def show_timezone_info(self):
+        """Show the zone and local time under the pointer"""
+        self.map_hover_pending = False
+        if self.tz_raster is None or self.map_pointer is None:
+            return
+        
+        # The image is centered in the label
+        width, height = MAP_SIZE
+        x = self.map_pointer[0] - (self.world_map_label.winfo_width() - width) // 2
+        y = self.map_pointer[1] - (self.world_map_label.winfo_height() - height) // 2
+        if not (0 <= x < width and 0 <= y < height):
+            return
         
-        # Display info
-        self.timezone_info.config(text=f"UTC{timezone_offset:+d}: {tz_time.strftime('%H:%M:%S')}")
+        # O(1) raster read, then the cached offset for that zone
+        zone = self.tz_raster.zone_at_fraction(x / width, y / height)
+        now = self.clock.time()
+        try:
+            offset = self.zone_offsets.offset(zone, now)
+        except KeyError:
+            # Boundary data newer than the installed pytz
+            self.timezone_info.config(text=zone)
+            return
+        hours, minutes = divmod(abs(offset) // 60, 60)
+        sign = "+" if offset >= 0 else "-"
+        name = "Open sea" if zone.startswith("Etc/") else zone
+        self.timezone_info.config(
+            text=f"{name} (UTC{sign}{hours:02d}:{minutes:02d}): "
+                 f"{format_clock_seconds(int(now) + offset)}")
+    
+    def on_city_typed(self, event):
+        """Suggest cities and zones matching the city field"""
+        if event.keysym in ("Down", "Up", "Return", "Tab", "Escape"):
+            if event.keysym == "Escape":
+                self.show_suggestions([])
+            return
+        self.show_suggestions(self.tz_index.search(self.city_name.get(), limit=8))
+    
+    def on_timezone_typed(self, event):
+        """Narrow the timezone dropdown to zones matching what was typed"""
+        if event.keysym in ("Down", "Up", "Return", "Tab", "Escape"):
+            return
+        text = self.timezone_var.get()
+        if text:
+            zones = [result.zone for result in self.tz_index.search(text, limit=30, kind="zone")]
+        else:
+            zones = self.common_zones()
+        self.timezone_combo.configure(values=zones)
+    
+    def common_zones(self):
+        """Zones offered by the timezone dropdown"""
+        import pytz
+        return pytz.common_timezones
+    
+    def show_suggestions(self, results):
+        """Fill the suggestions list, hiding it when there is nothing to show"""
+        self.suggestions = results
+        self.suggestion_list.delete(0, END)
+        if results:
+            self.suggestion_list.insert(END, *[result.label for result in results])
+            self.suggestion_list.pack(fill=X, padx=10, pady=(0, 5))
+        else:
+            self.suggestion_list.pack_forget()
+    
+    def focus_suggestions(self):
+        """Move keyboard focus from the city field into the suggestions"""
+        if self.suggestions:
+            self.suggestion_list.focus_set()
+            self.suggestion_list.selection_clear(0, END)
+            self.suggestion_list.selection_set(0)
+            self.suggestion_list.activate(0)
+    
+    def on_suggestion_selected(self, event):
+        """Fill the form from the chosen suggestion"""
+        selected = self.suggestion_list.curselection()
+        if not selected:
+            return
+        result = self.suggestions[selected[0]]
+        if result.kind == "city":
+            self.city_name.set(result.city)
+        self.timezone_var.set(result.zone)
+        self.show_suggestions([])
     
     def add_world_clock(self):
         """Add a new world clock to display"""
         city = self.city_name.get()
         timezone = self.timezone_var.get()
         
+        # A known city name is enough; its zone comes from the gazetteer
+        if city and not timezone:
+            timezone = self.tz_index.resolve_city(city) or ""
+        
         if not city or not timezone:
             messagebox.showwarning("Input Error", "Please enter both city name and timezone")
             return
         
+        if not self.zone_offsets.is_valid(timezone):
+            messagebox.showwarning("Input Error", f"Unknown timezone: {timezone}")
+            return
+        
         # Add to world clocks
         self.world_clocks.append({"city": city, "timezone": timezone})
         
@@ -400,10 +691,11 @@ class EnhancedAlarmClockApp:
         # Clear inputs
         self.city_name.set("")
         self.timezone_var.set("")
+        self.show_suggestions([])
     
-    def remove_world_clock(self, city):
+    def remove_world_clock(self, clock):
         """Remove a world clock from display"""
-        self.world_clocks = [clock for clock in self.world_clocks if clock["city"] != city]
+        self.world_clocks.remove(clock)
         
         # Save settings
         self.save_settings()
@@ -411,113 +703,72 @@ class EnhancedAlarmClockApp:
         # Update displays
         self.update_world_clock_displays()
     
+    @profiled("world_clocks")
     def update_world_clock_displays(self):
         """Update the world clock displays"""
-        # Clear existing clocks
-        for widget in self.world_clock_frame.winfo_children():
-            widget.destroy()
-        
-        # Create new clock displays
-        for i, clock in enumerate(self.world_clocks):
-            clock_frame = Frame(self.world_clock_frame, bd=2, relief=GROOVE, padx=10, pady=10)
-            clock_frame.grid(row=i//2, column=i%2, padx=5, pady=5, sticky="nsew")
-            
-            # City name
-            city_label = Label(clock_frame, text=clock["city"], font=("Helvetica", 14, "bold"))
-            city_label.pack()
-            
-            # Timezone
-            tz_label = Label(clock_frame, text=clock["timezone"], font=("Helvetica", 10))
-            tz_label.pack()
-            
-            # Time display
-            time_label = Label(clock_frame, font=("Helvetica", 18))
-            time_label.pack(pady=5)
-            
-            # Store reference to update later
-            clock["time_label"] = time_label
-            
-            # Remove button
-            Button(clock_frame, text="Remove", 
-                  command=lambda c=clock["city"]: self.remove_world_clock(c)).pack()
-        
-        # Configure grid weights
-        for i in range((len(self.world_clocks) + 1) // 2):
-            self.world_clock_frame.rowconfigure(i, weight=1)
-        for i in range(2):
-            self.world_clock_frame.columnconfigure(i, weight=1)
+        # The grid diffs the clock list and only touches affected tiles
+        self.world_clock_frame.schedule_refresh()
     
+    @profiled("world_clocks")
     def update_world_clocks(self):
         """Update all world clock displays"""
-        for clock in self.world_clocks:
-            try:
-                tz = pytz.timezone(clock["timezone"])
-                current_time = datetime.datetime.now(tz)
-                clock["time_label"].config(text=current_time.strftime("%H:%M:%S"))
-            except Exception as e:
-                print(f"Error updating world clock: {e}")
-        
-        # Update map time display
-        current_time = datetime.datetime.now().strftime("%H:%M:%S - %B %d, %Y")
+        # One UTC read and one batch conversion per tick; tiles skip unchanged text
+        tiles = list(self.world_clock_frame.visible_tiles())
+        texts = self.board_times.texts([tile.clock["timezone"] for tile in tiles],
+                                       self.clock.time())
+        for tile, text in zip(tiles, texts):
+            tile.show_time(text)
+    
+    @profiled("map")
+    def update_map_time(self):
+        """Update the time shown under the world map"""
+        current_time = self.clock.now().strftime("%H:%M:%S - %B %d, %Y")
         self.map_time_label.config(text=f"Current Time: {current_time}")
-        
-        # Schedule next update
-        self.root.after(1000, self.update_world_clocks)
     
     def toggle_stopwatch(self):
         """Start or stop the stopwatch"""
-        if not self.stopwatch_running:
-            # Start the stopwatch
-            self.stopwatch_running = True
-            self.stopwatch_start = time.time() - self.stopwatch_elapsed
+        if self.stopwatch.toggle():
+            # Started
             self.start_stop_button.config(text="Stop")
             self.lap_button.config(state=NORMAL)
-            self.update_stopwatch()
+            self.frames.enable("stopwatch")
         else:
-            # Stop the stopwatch
-            self.stopwatch_running = False
-            self.stopwatch_elapsed = time.time() - self.stopwatch_start
+            # Stopped
+            self.frames.enable("stopwatch", False)
             self.start_stop_button.config(text="Start")
             self.lap_button.config(state=DISABLED)
+            self.stopwatch_label.config(text=format_stopwatch_ns(self.stopwatch.elapsed_ns()))
     
     def reset_stopwatch(self):
         """Reset the stopwatch"""
-        self.stopwatch_running = False
-        self.stopwatch_elapsed = 0
+        self.stopwatch.reset()
+        self.frames.enable("stopwatch", False)
         self.stopwatch_label.config(text="00:00:00.000")
         self.start_stop_button.config(text="Start")
         self.lap_button.config(state=DISABLED)
-        self.lap_times = []
-        self.lap_listbox.delete(0, END)
+        self.lap_list.refresh()
     
+    @profiled("stopwatch")
     def record_lap(self):
         """Record a lap time"""
-        if self.stopwatch_running:
-            elapsed = time.time() - self.stopwatch_start
-            lap_time = self.format_stopwatch_time(elapsed)
-            self.lap_times.append(lap_time)
-            self.lap_listbox.insert(END, f"Lap {len(self.lap_times)}: {lap_time}")
-            self.lap_listbox.see(END)
+        if self.stopwatch.running:
+            self.stopwatch.lap()
+            self.lap_list.see_end()
     
+    def format_lap(self, index):
+        """Text for one row of the lap list"""
+        return f"Lap {index + 1}: {format_stopwatch_ns(self.stopwatch.laps[index])}"
+    
+    @profiled("stopwatch")
     def update_stopwatch(self):
         """Update the stopwatch display"""
-        if self.stopwatch_running:
-            elapsed = time.time() - self.stopwatch_start
-            self.stopwatch_label.config(text=self.format_stopwatch_time(elapsed))
-            self.root.after(50, self.update_stopwatch)
-    
-    def format_stopwatch_time(self, seconds):
-        """Format seconds into HH:MM:SS.mmm"""
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = seconds % 60
-        return f"{hours:02d}:{minutes:02d}:{seconds:06.3f}"
+        self.stopwatch_label.config(text=format_stopwatch_ns(self.stopwatch.elapsed_ns()))
     
+    @profiled("ui")
     def update_time(self):
         """Update current time display"""
-        current_time = datetime.datetime.now().strftime("%H:%M:%S - %B %d, %Y")
+        current_time = self.clock.now().strftime("%H:%M:%S - %B %d, %Y")
         self.time_label.config(text=f"Current Time: {current_time}")
-        self.root.after(1000, self.update_time)
     
     def set_alarm(self):
         """Set a new alarm"""
@@ -528,24 +779,10 @@ class EnhancedAlarmClockApp:
             if not alarm_name:
                 alarm_name = "Unnamed Alarm"
             
-            # Add to alarms list
-            alarm_data = {
-                "time": alarm_time,
-                "name": alarm_name,
-                "active": True
-            }
-            
-            self.alarms.append(alarm_data)
-            
-            # Start the alarm thread
-            alarm_thread = threading.Thread(target=self.start_alarm, args=(alarm_data,))
-            alarm_thread.daemon = True
-            alarm_thread.start()
-            
-            self.active_alarms[alarm_time] = alarm_thread
-            
-            # Update alarms list
-            self.update_alarms_list()
+            # Store and schedule the alarm
+            repeat = REPEAT_CHOICES[self.repeat_choice.get()]
+            timezone = self.alarm_timezone.get().strip() or None
+            self.engine.add_alarm(alarm_time, alarm_name, repeat, timezone)
             
             # Show confirmation
             self.status_var.set(f"Alarm set for {alarm_time} - {alarm_name}")
@@ -557,129 +794,242 @@ class EnhancedAlarmClockApp:
         except Exception as e:
             messagebox.showerror("Error", f"Could not set alarm: {str(e)}")
     
-    def start_alarm(self, alarm_data):
-        """Monitor for alarm time and trigger alarm"""
-        alarm_time = alarm_data["time"]
-        alarm_name = alarm_data["name"]
-        
-        while alarm_data["active"]:
-            current_time = datetime.datetime.now().strftime("%H:%M:%S")
-            
-            if current_time == alarm_time:
-                # Play sound
-                try:
-                    # Show alarm notification with snooze option
-                    self.show_alarm_notification(alarm_data)
-                    winsound.PlaySound(self.alarm_sound, winsound.SND_ASYNC)
-                except Exception as e:
-                    print(f"Error playing sound: {e}")
-                    # Fallback to default system sound
-                    winsound.PlaySound("SystemExclamation", winsound.SND_ASYNC)
-                
-                # Wait a bit to avoid triggering multiple times
-                time.sleep(2)
-            
-            time.sleep(0.5)
+    @profiled("ui")
+    def process_engine_events(self):
+        """Handle a batch of queued engine events on the Tk thread"""
+        batch = self.events.drain(EVENT_BATCH)
+        for event, alarm_data in batch:
+            if event == "alarm_change":
+                self.apply_alarm_change(*alarm_data)
+            elif event == "fire":
+                self.show_alarm_notification(alarm_data)
+            elif event == "dismiss":
+                self.close_notification(alarm_data)
+            elif event == "batch":
+                self.status_var.set(f"{len(alarm_data.alarms)} alarm(s) added or changed, "
+                                    f"{len(alarm_data.removed)} removed, "
+                                    f"{len(alarm_data.errors)} row(s) rejected")
+            elif event == "missed":
+                fire = alarm_data["_last_fire"]
+                self.status_var.set(f"Skipped {fire.missed} missed alarm(s): {alarm_data['name']}")
+            elif event == "profile_saved":
+                self.status_var.set(f"Wrote {len(alarm_data)} profile files to "
+                                    f"{os.path.abspath(profiling.PROFILER.directory)}")
+        
+        # Events were lost if the UI could not keep up
+        if self.events.dropped != self.reported_drops:
+            self.reported_drops = self.events.dropped
+            self.status_var.set(f"UI fell behind: {self.reported_drops} alarm events dropped")
+            # Dropped alarm list changes are caught up by a full redraw
+            if self.alarms_listbox is not None:
+                self.alarms_listbox.invalidate()
     
     def show_alarm_notification(self, alarm_data):
-        """Show alarm notification with snooze option"""
-        alarm_name = alarm_data["name"]
-        result = messagebox.askquestion("Alarm", 
-                                      f"Alarm: {alarm_name}\nTime: {alarm_data['time']}\n\nSnooze?")
-        
-        # Stop sound
-        winsound.PlaySound(None, winsound.SND_PURGE)
-        
-        if result == 'yes':
-            # Snooze the alarm
-            threading.Thread(target=self.snooze_alarm, args=(alarm_data,)).start()
-        else:
-            # Just stop the alarm
-            pass
+        """Ring an alarm and show a notification with snooze option"""
+        # A repeating alarm that rings again replaces its old notification
+        self.close_notification(alarm_data)
+        try:
+            # Falls back to a built-in tone if the sound file cannot be played
+            voice = self.get_audio().play(self.alarm_sound)
+        except Exception as e:
+            print(f"Could not play alarm sound: {e}")
+            voice = None
+        
+        # Say so when the alarm could not ring on time (sleep, clock change)
+        late = ""
+        fire = alarm_data.get("_last_fire")
+        if fire is not None and fire.lateness >= 1:
+            late = f"\nRang {fire.lateness:.0f} s late"
+            if fire.missed > 1:
+                late += f" ({fire.missed} occurrences missed)"
+        
+        # Not modal: other alarms and the rest of the UI keep running
+        window = Toplevel(self.root)
+        window.title("Alarm")
+        window.attributes("-topmost", True)
+        window.protocol("WM_DELETE_WINDOW", lambda: self.dismiss_alarm(alarm_data))
+        ttk.Label(window, text=f"Alarm: {alarm_data['name']}\nTime: {alarm_data['time']}{late}",
+                  font=("Helvetica", 12), padding=(20, 10)).pack()
+        buttons_frame = ttk.Frame(window)
+        buttons_frame.pack(pady=10)
+        ttk.Button(buttons_frame, text="Snooze", width=10,
+                   command=lambda: self.snooze_alarm(alarm_data)).pack(side=LEFT, padx=5)
+        ttk.Button(buttons_frame, text="Dismiss", width=10,
+                   command=lambda: self.dismiss_alarm(alarm_data)).pack(side=LEFT, padx=5)
+        self.notifications[id(alarm_data)] = (window, voice)
+    
+    def close_notification(self, alarm_data):
+        """Silence an alarm and close its notification, if it has one"""
+        window, voice = self.notifications.pop(id(alarm_data), (None, None))
+        if window is None:
+            return
+        if voice is not None:
+            self.audio.stop(voice)
+        window.destroy()
+    
+    def dismiss_alarm(self, alarm_data):
+        """Stop a ringing alarm without snoozing it"""
+        self.close_notification(alarm_data)
+        self.engine.dismiss_alarm(alarm_data)
     
     def snooze_alarm(self, alarm_data):
         """Snooze alarm for specified minutes"""
+        self.close_notification(alarm_data)
         snooze_minutes = self.snooze_time.get()
         
-        # Calculate new alarm time
-        current_time = datetime.datetime.now()
-        new_time = current_time + datetime.timedelta(minutes=snooze_minutes)
-        new_alarm_time = new_time.strftime("%H:%M:%S")
-        
-        # Create new alarm data
-        new_alarm_data = {
-            "time": new_alarm_time,
-            "name": f"{alarm_data['name']} (Snoozed)",
-            "active": True
-        }
-        
-        # Add to alarms list
-        self.alarms.append(new_alarm_data)
-        
-        # Start the alarm thread
-        alarm_thread = threading.Thread(target=self.start_alarm, args=(new_alarm_data,))
-        alarm_thread.daemon = True
-        alarm_thread.start()
-        
-        self.active_alarms[new_alarm_time] = alarm_thread
-        
-        # Update alarms list
-        self.update_alarms_list()
+        # Queue a snoozed copy of the alarm
+        self.engine.snooze_alarm(alarm_data, snooze_minutes)
         
         # Show confirmation
         self.status_var.set(f"Alarm snoozed for {snooze_minutes} minutes")
     
     def load_saved_alarms(self):
-        """Load saved alarms from settings"""
-        for alarm in self.alarms:
-            # Start alarm thread
-            alarm_thread = threading.Thread(target=self.start_alarm, args=(alarm,))
-            alarm_thread.daemon = True
-            alarm_thread.start()
-            
-            self.active_alarms[alarm["time"]] = alarm_thread
-        
+        """Show alarms loaded (and already scheduled) by the engine"""
         # Update alarms list
         self.update_alarms_list()
     
+    @profiled("ui")
     def update_alarms_list(self):
-        """Update the alarms listbox"""
-        self.alarms_listbox.delete(0, END)
-        
-        for alarm in self.alarms:
-            status = "Active" if alarm["active"] else "Inactive"
-            self.alarms_listbox.insert(END, f"{alarm['time']} - {alarm['name']} ({status})")
+        """Redraw the visible rows of the alarms list from the alarm store"""
+        # Filled when the tab is built
+        if self.alarms_listbox is None:
+            return
+        self.alarms_version = self.alarms.version
+        self.alarms_listbox.invalidate()
+    
+    def format_alarm_row(self, alarm):
+        """Text for one row of the alarms listbox"""
+        status = "Active" if alarm["active"] else "Inactive"
+        return f"{alarm['time']} - {alarm['name']} [{describe(alarm)}] ({status})"
+    
+    @profiled("ui")
+    def apply_alarm_change(self, change, alarm, row, version):
+        """Redraw the alarms list if an alarm store change shows on screen"""
+        if self.alarms_listbox is None or version <= self.alarms_version:
+            # Not built yet, or already part of the last redraw
+            return
+        self.alarms_version = version
+        if change == "update" and row is not None:
+            # Rows stay in place, so only this one may need redrawing
+            self.alarms_listbox.invalidate(row)
+        else:
+            # Rows moved, or several changed at once
+            self.alarms_listbox.invalidate()
+    
+    def selected_alarms(self):
+        """Alarms selected in the listbox (a message is shown if there are none)"""
+        # Ids of alarms removed since they were selected are already dropped
+        alarms = [alarm for alarm in map(self.alarms.get, self.alarms_listbox.selected_keys())
+                  if alarm is not None]
+        if not alarms:
+            messagebox.showinfo("Selection Required", "Please select an alarm first")
+        return alarms
     
     def remove_alarm(self):
-        """Remove selected alarm"""
+        """Remove the selected alarms"""
         try:
-            # Get selected alarm
-            selected = self.alarms_listbox.curselection()
-            
-            if not selected:
-                messagebox.showinfo("Selection Required", "Please select an alarm to remove")
+            alarms = self.selected_alarms()
+            if not alarms:
                 return
             
-            index = selected[0]
-            alarm = self.alarms[index]
-            
-            # Set as inactive
-            alarm["active"] = False
-            
-            # Remove from list
-            self.alarms.pop(index)
-            
-            # Update display
-            self.update_alarms_list()
+            if len(alarms) == 1:
+                # Deactivate, unschedule and remove from list
+                alarm = alarms[0]
+                self.engine.remove_alarm(alarm)
+                self.status_var.set(f"Alarm removed: {alarm['time']} - {alarm['name']}")
+            else:
+                # One store change and one settings write for the whole selection
+                result = self.engine.remove_alarms([alarm["id"] for alarm in alarms])
+                self.status_var.set(f"{len(result.removed)} alarms removed")
             
             # Save settings
             self.save_settings()
             
-            self.status_var.set(f"Alarm removed: {alarm['time']} - {alarm['name']}")
-            
         except Exception as e:
             messagebox.showerror("Error", f"Could not remove alarm: {str(e)}")
     
+    def toggle_alarm(self):
+        """Turn the selected alarms on or off (all on if any is off)"""
+        try:
+            alarms = self.selected_alarms()
+            if not alarms:
+                return
+            active = not all(alarm["active"] for alarm in alarms)
+            state = "on" if active else "off"
+            if len(alarms) == 1:
+                alarm = alarms[0]
+                self.engine.update_alarm(alarm["id"], active=active)
+                self.status_var.set(f"Alarm turned {state}: {alarm['time']} - {alarm['name']}")
+            else:
+                result = self.engine.set_alarms_active([alarm["id"] for alarm in alarms], active)
+                self.status_var.set(f"{len(result.alarms)} alarms turned {state}")
+            self.save_settings()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not change alarm: {str(e)}")
+    
+    def import_alarms(self):
+        """Add alarms from a CSV or JSON-lines file"""
+        path = filedialog.askopenfilename(
+            title="Import Alarms",
+            filetypes=[("Alarm files", "*.csv *.jsonl"), ("CSV files", "*.csv"),
+                       ("JSON lines", "*.jsonl"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            result = self.engine.import_alarms(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not import alarms: {str(e)}")
+            return
+        
+        self.show_import_result(result, path)
+    
+    def import_calendar(self):
+        """Add or refresh alarms from the events of an iCalendar file"""
+        path = filedialog.askopenfilename(
+            title="Import Calendar",
+            filetypes=[("iCalendar files", "*.ics"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            result = self.engine.import_calendar(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not import calendar: {str(e)}")
+            return
+        self.show_import_result(result, path)
+    
+    def show_import_result(self, result, path):
+        """Summarize an import, listing the first rejected rows"""
+        message = f"Imported {len(result.alarms)} alarm(s)."
+        if result.removed:
+            message += f" Replaced or removed {len(result.removed)} existing alarm(s)."
+        if result.errors:
+            # The first few problems; the rest are only counted
+            lines = [f"Line {error.row}: {error.message}" for error in result.errors[:10]]
+            if len(result.errors) > 10:
+                lines.append(f"... and {len(result.errors) - 10} more")
+            message += f"\n\n{len(result.errors)} row(s) skipped:\n" + "\n".join(lines)
+            messagebox.showwarning("Import Alarms", message)
+        else:
+            messagebox.showinfo("Import Alarms", message)
+        self.status_var.set(f"Imported {len(result.alarms)} alarm(s) from {os.path.basename(path)}")
+    
+    def export_alarms(self):
+        """Write all alarms to a CSV or JSON-lines file"""
+        path = filedialog.asksaveasfilename(
+            title="Export Alarms",
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv"), ("JSON lines", "*.jsonl")]
+        )
+        if not path:
+            return
+        try:
+            count = self.engine.export_alarms(path)
+            self.status_var.set(f"Exported {count} alarm(s) to {os.path.basename(path)}")
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Error", f"Could not export alarms: {str(e)}")
+    
     def select_sound(self):
         """Let user select a custom alarm sound"""
         sound_file = filedialog.askopenfilename(
@@ -689,94 +1039,39 @@ class EnhancedAlarmClockApp:
         
         if sound_file:
             self.alarm_sound = sound_file
+            self.get_audio().preload(sound_file)
             self.save_settings()
             self.status_var.set(f"Alarm sound set to: {os.path.basename(sound_file)}")
     
     def test_alarm_sound(self):
         """Test the current alarm sound"""
+        audio = self.get_audio()
         try:
-            winsound.PlaySound(self.alarm_sound, winsound.SND_ASYNC)
+            audio.load(self.alarm_sound)
+            audio.play(self.alarm_sound)
             self.status_var.set("Testing alarm sound...")
         except Exception as e:
             messagebox.showerror("Error", f"Could not play sound: {str(e)}")
-            # Fallback to default system sound
-            winsound.PlaySound("SystemExclamation", winsound.SND_ASYNC)
+            # Fallback to the built-in tone
+            audio.play(buffer=audio.beep())
     
+    @profiled("ui")
     def apply_theme(self):
-        """Apply light or dark theme"""
-        if self.is_dark_mode.get():
-            # Dark mode
-            bg_color = "#2E2E2E"
-            fg_color = "white"
-            accent_color = "#007ACC"
-            self.root.configure(bg=bg_color)
-            self.main_frame.configure(bg=bg_color)
-            self.title_label.configure(bg=bg_color, fg=accent_color)
-            self.time_label.configure(bg=bg_color, fg=fg_color)
-            self.alarm_tab.configure(bg=bg_color)
-            self.alarms_tab.configure(bg=bg_color)
-            self.stopwatch_tab.configure(bg=bg_color)
-            self.world_clock_tab.configure(bg=bg_color)
-            self.world_map_tab.configure(bg=bg_color)
-            self.status_bar.configure(bg="#3E3E3E", fg=fg_color)
-            
-            # Update all labels and buttons
-            self.update_widget_colors(bg_color, fg_color, accent_color)
-            
-        else:
-            # Light mode
-            bg_color = "#F0F0F0"
-            fg_color = "black"
-            accent_color = "#0078D7"
-            self.root.configure(bg=bg_color)
-            self.main_frame.configure(bg=bg_color)
-            self.title_label.configure(bg=bg_color, fg="red")
-            self.time_label.configure(bg=bg_color, fg=fg_color)
-            self.alarm_tab.configure(bg=bg_color)
-            self.alarms_tab.configure(bg=bg_color)
-            self.stopwatch_tab.configure(bg=bg_color)
-            self.world_clock_tab.configure(bg=bg_color)
-            self.world_map_tab.configure(bg=bg_color)
-            self.status_bar.configure(bg="#E0E0E0", fg=fg_color)
-            
-            # Update all labels and buttons
-            self.update_widget_colors(bg_color, fg_color, accent_color)
-        
-        self.save_settings()
+        """Apply the selected theme; styles only, so it costs the same for any number of widgets"""
+        self.theme_name.set(self.themes.apply(self.theme_name.get()))
     
-    def update_widget_colors(self, bg_color, fg_color, accent_color):
-        """Update colors for all widgets in all tabs"""
-        tabs = [self.alarm_tab, self.alarms_tab, self.stopwatch_tab, 
-                self.world_clock_tab, self.world_map_tab]
-        
-        for tab in tabs:
-            for widget in tab.winfo_children():
-                if isinstance(widget, Frame):
-                    widget.configure(bg=bg_color)
-                    for child in widget.winfo_children():
-                        if isinstance(child, Label):
-                            child.configure(bg=bg_color, fg=fg_color)
-                        elif isinstance(child, Button):
-                            child.configure(bg=bg_color, fg=fg_color, 
-                                          activebackground=accent_color)
-                        elif isinstance(child, Listbox):
-                            child.configure(bg=bg_color, fg=fg_color, 
-                                          selectbackground=accent_color)
-                elif isinstance(widget, Label):
-                    widget.configure(bg=bg_color, fg=fg_color)
-                elif isinstance(widget, Button):
-                    widget.configure(bg=bg_color, fg=fg_color, 
-                                   activebackground=accent_color)
-                elif isinstance(widget, Listbox):
-                    widget.configure(bg=bg_color, fg=fg_color, 
-                                   selectbackground=accent_color)
-        
-        # Configure buttons specifically
-        self.set_button.configure(bg=bg_color, fg=fg_color, activebackground=accent_color)
-        self.test_button.configure(bg=bg_color, fg=fg_color, activebackground=accent_color)
-        self.start_stop_button.configure(bg=bg_color, fg=fg_color, activebackground=accent_color)
-        self.lap_button.configure(bg=bg_color, fg=fg_color, activebackground=accent_color)
-        self.reset_button.configure(bg=bg_color, fg=fg_color, activebackground=accent_color)
+    def exit_app(self):
+        """Stop the alarm engine, flush settings and close the application"""
+        self.frames.stop()
+        if self.control is not None:
+            self.control.stop()
+        # Theme switches are only written out here
+        if self.engine.settings.get("theme") != self.theme_name.get():
+            self.save_settings()
+        # Also writes the settings and closes the alarm database
+        self.engine.stop()
+        profiling.PROFILER.stop()
+        self.root.destroy()
     
     def show_instructions(self):
         """Display instructions dialog"""
@@ -803,11 +1098,32 @@ class EnhancedAlarmClockApp:
            - Hover to see time in different zones
         
         5. Settings:
-           - Dark/Light theme
+           - Themes from the themes/ folder
            - Save your preferences
         """
         messagebox.showinfo("Instructions", instruction_text)
     
+    def show_startup_report(self):
+        """Display where cold-start time went"""
+        window = Toplevel(self.root)
+        window.title("Startup Report")
+        text = Text(window, width=56, height=24, font=("Courier", 10))
+        text.insert(END, self.startup.report())
+        text.config(state=DISABLED)
+        text.pack(fill=BOTH, expand=True, padx=10, pady=10)
+    
+    def toggle_profiling(self):
+        """Start sampling profiles, or stop and write them out"""
+        if self.profiling.get():
+            profiling.PROFILER.start()
+            self.status_var.set("Profiling; turn it off in the Help menu to save the profiles")
+        else:
+            # Attributing the memory snapshot takes a few seconds on large heaps
+            self.status_var.set("Writing profiles...")
+            threading.Thread(target=lambda: self.events.post("profile_saved",
+                                                             profiling.PROFILER.stop()),
+                             name="ProfileWriter", daemon=True).start()
+    
     def show_about(self):
         """Display about dialog"""
         about_text = """
@@ -826,6 +1142,23 @@ class EnhancedAlarmClockApp:
 
 # Main application
 if __name__ == "__main__":
-    root = Tk()
-    app = EnhancedAlarmClockApp(root)
+    import argparse
+    parser = argparse.ArgumentParser(description="Enhanced Alarm Clock")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print how long each startup phase took")
+    metrics.add_arguments(parser)
+    profiling.add_arguments(parser)
+    control.add_arguments(parser)
+    alarm_db.add_arguments(parser)
+    args = parser.parse_args()
+    if args.profile:
+        profiling.PROFILER.start(args.profile_dir, interval=args.profile)
+    startup = StartupTimer(PROCESS_START)
+    startup.mark("imports done")
+    metrics.export(args.metrics_port, args.metrics_json)
+    with startup.phase("Tk"):
+        root = Tk()
+    app = EnhancedAlarmClockApp(root, startup, args.startup_report,
+                                control_socket=args.control_socket,
+                                control_enabled=not args.no_control, alarm_database=args.alarm_db)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,314 @@
+"""Runtime metrics: counters, gauges and histograms, exported as Prometheus text or JSON.
+
+Modules create their metrics once, at import, from the shared REGISTRY and
+update them on the hot path; an update is a lock and an addition (a bisect for
+histograms), so instrumentation stays on in production. Gauges can also be
+given a function that is sampled when the metrics are collected, for values
+that already live elsewhere (queue depth, thread count).
+
+Two ways to read them, both off the UI thread:
+
+* serve(port) answers ``GET /metrics`` on 127.0.0.1 in the Prometheus text
+  format;
+* dump_json(path, interval) rewrites a JSON snapshot every `interval` seconds.
+"""
+import bisect
+import json
+import threading
+import time
+
+
+# Upper bounds in seconds; covers sub-millisecond UI work up to multi-minute lateness
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+DEFAULT_DUMP_INTERVAL = 10.0
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"'))
+                     for key, value in sorted(labels.items()))
+    return "{" + pairs + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a function when collected"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels=None, function=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.function = function
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        if self.function is None:
+            return self._value
+        try:
+            return self.function()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return float("nan")
+
+    def samples(self):
+        return [(self.name, self.labels, self.value)]
+
+    def snapshot(self):
+        return {"value": self.value}
+
+
+class Histogram:
+    """Distribution of observed values in fixed buckets, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        # One count per bucket (not cumulative) plus one for values above them all
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def time(self):
+        """Context manager observing the duration of its block"""
+        return _Timer(self)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (approximate)"""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (self.max,), counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def samples(self):
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append((self.name + "_bucket", dict(self.labels, le=_number(bound)), cumulative))
+        samples.append((self.name + "_sum", self.labels, value_sum))
+        samples.append((self.name + "_count", self.labels, total))
+        return samples
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.sum, "max": self.max,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99)}
+
+
+class _Timer:
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """All metrics of the process, keyed by name and labels"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **options):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = cls(name, help_text, labels, **options)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help_text, labels=None):
+        """Get or create a Counter"""
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text, labels=None, function=None):
+        """Get or create a Gauge; a new function replaces the previous one"""
+        gauge = self._get(Gauge, name, help_text, labels)
+        if function is not None:
+            gauge.function = function
+        return gauge
+
+    def histogram(self, name, help_text, labels=None, buckets=DEFAULT_BUCKETS):
+        """Get or create a Histogram"""
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def metrics(self):
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: (metric.name,
+                                                                      sorted(metric.labels.items())))
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        described = set()
+        for metric in self.metrics():
+            if metric.name not in described:
+                described.add(metric.name)
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_label_text(labels)} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """JSON-safe summary of every metric"""
+        result = {}
+        for metric in self.metrics():
+            entry = dict(metric.snapshot(), type=metric.kind)
+            if metric.labels:
+                entry["labels"] = dict(metric.labels)
+            result.setdefault(metric.name, []).append(entry)
+        return {"timestamp": time.time(), "metrics": result}
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+# Always useful, whoever is running
+gauge("process_threads", "Live Python threads", function=threading.active_count)
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Answer GET /metrics on a background thread; returns the server (call shutdown() to stop)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the console
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="MetricsServer")
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def dump_json(path, interval=DEFAULT_DUMP_INTERVAL, registry=REGISTRY):
+    """Rewrite a JSON snapshot of the metrics every `interval` seconds; returns a stop Event"""
+    # persistence reports its own metrics, so it cannot be imported at the top
+    from persistence import write_atomic
+    stop = threading.Event()
+
+    def run():
+        while True:
+            try:
+                write_atomic(path, json.dumps(registry.snapshot(), indent=1))
+            except (OSError, ValueError) as e:
+                print(f"Error writing metrics to {path}: {e}")
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=run, name="MetricsDump")
+    thread.daemon = True
+    thread.start()
+    return stop
+
+
+def export(port=None, json_path=None, interval=DEFAULT_DUMP_INTERVAL):
+    """Start the exporters asked for on the command line"""
+    if port:
+        try:
+            serve(port)
+            print(f"Metrics at http://127.0.0.1:{port}/metrics")
+        except OSError as e:
+            print(f"Could not serve metrics on port {port}: {e}")
+    if json_path:
+        dump_json(json_path, interval)
+
+
+def add_arguments(parser):
+    """Add --metrics-port and --metrics-json to an argparse parser"""
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-json", metavar="PATH",
+                        help=f"write a JSON metrics snapshot to PATH every {DEFAULT_DUMP_INTERVAL:g} s")
@@ -0,0 +1,151 @@
+"""Write-behind settings persistence.
+
+Changes only mark the settings dirty. A background writer waits briefly so a
+burst of edits collapses into a single write, then takes a snapshot and
+replaces the settings file atomically (temp file + rename). The UI thread
+never waits on disk, and a crash mid-write cannot leave a truncated file.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+import metrics
+from profiling import profiled
+
+
+FLUSH_SECONDS = metrics.histogram("settings_flush_seconds",
+                                  "Time to snapshot and atomically write the settings file")
+FLUSH_ERRORS = metrics.counter("settings_flush_errors_total", "Failed settings writes")
+
+
+def to_json_safe(value):
+    """Copy settings for saving, dropping transient fields
+
+    Keys starting with an underscore are runtime-only state, and values that
+    JSON cannot represent (widgets, threads, ...) are left out as well.
+    """
+    if isinstance(value, dict):
+        safe = {}
+        for key, item in list(value.items()):
+            if isinstance(key, str) and key.startswith("_"):
+                continue
+            item = to_json_safe(item)
+            if item is not _SKIP:
+                safe[key] = item
+        return safe
+    if isinstance(value, (list, tuple)):
+        return [item for item in map(to_json_safe, list(value)) if item is not _SKIP]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return _SKIP
+
+
+# Marker for values to_json_safe() drops
+_SKIP = object()
+
+
+def write_atomic(path, text):
+    """Write text to path via a temp file in the same directory and a rename"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".settings-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class SettingsStore:
+    """Coalescing, atomic, off-thread writer for a JSON settings file"""
+
+    def __init__(self, path, snapshot, delay=0.5):
+        self.path = path
+        self.snapshot = snapshot
+        self.delay = delay
+        # Statistics for diagnostics
+        self.writes = 0
+        self.last_flush_seconds = 0.0
+        self._dirty = False
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    @profiled("persistence")
+    def load(self):
+        """Read the settings file; a missing, empty or corrupt file yields {}"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                text = f.read()
+            if not text.strip():
+                return {}
+            settings = json.loads(text)
+            if not isinstance(settings, dict):
+                raise ValueError("settings file does not contain an object")
+            return settings
+        except (OSError, ValueError) as e:
+            print(f"Error loading settings: {e}")
+            # Keep the unreadable file around instead of overwriting it on next save
+            try:
+                os.replace(self.path, self.path + ".corrupt")
+            except OSError:
+                pass
+            return {}
+
+    def mark_dirty(self):
+        """Request a save; returns immediately"""
+        with self._condition:
+            self._dirty = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="SettingsWriter")
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def flush(self):
+        """Write pending changes now, on the calling thread"""
+        with self._condition:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._write()
+
+    def _run(self):
+        """Writer loop: wait for changes, let the burst settle, then write once"""
+        while True:
+            with self._condition:
+                while not self._dirty:
+                    self._condition.wait()
+            # Coalesce everything that arrives within the delay window
+            time.sleep(self.delay)
+            with self._condition:
+                if not self._dirty:
+                    continue
+                self._dirty = False
+            try:
+                self._write()
+            except Exception as e:
+                # The next change triggers another attempt
+                FLUSH_ERRORS.inc()
+                print(f"Error saving settings: {e}")
+
+    @profiled("persistence")
+    def _write(self):
+        with self._write_lock:
+            start = time.perf_counter()
+            # The snapshot callable returns a JSON-safe copy (see to_json_safe)
+            text = json.dumps(self.snapshot())
+            write_atomic(self.path, text)
+            self.writes += 1
+            self.last_flush_seconds = time.perf_counter() - start
+            FLUSH_SECONDS.observe(self.last_flush_seconds)
@@ -0,0 +1,256 @@
+"""Sampled per-subsystem CPU profiles and tracemalloc snapshots.
+
+Entry points of each subsystem are wrapped with @profiled("world_clocks")
+and so on. While profiling is off the wrapper only checks a flag. While it
+is on, every `sample_every`-th call of each subsystem runs under its own
+cProfile.Profile and is merged into that subsystem's statistics, and
+tracemalloc records allocations.
+
+save() writes one set of timestamped files to the profile directory and
+starts a new sampling period:
+
+* ``<stamp>-<subsystem>.prof``: pstats data, for ``python -m pstats`` or snakeviz;
+* ``<stamp>-cpu.txt``: the slowest functions of every subsystem;
+* ``<stamp>-memory.snapshot``: the raw tracemalloc snapshot;
+* ``<stamp>-memory.txt``: the lines of every subsystem holding the most
+  memory, and what grew since the previous save.
+
+cProfile, pstats and tracemalloc are only imported once profiling starts.
+"""
+import datetime
+import functools
+import os
+import threading
+
+
+PROFILE_DIR = "profiles"
+
+# Profile one call in this many, per subsystem
+SAMPLE_EVERY = 5
+
+# Stack depth recorded for each allocation, so it can be traced to its subsystem
+TRACEMALLOC_FRAMES = 8
+
+# Rows per subsystem in the text reports
+REPORT_LINES = 25
+
+# Source files whose allocations count towards each subsystem
+SUBSYSTEMS = {
+    "alarm_engine": ("alarm_engine.py", "alarm_store.py", "recurrence.py",
+                     "alarm_io.py", "ical_import.py"),
+    "world_clocks": ("world_clock.py", "tz_search.py"),
+    "stopwatch": ("stopwatch.py",),
+    "map": ("tz_map.py",),
+    "persistence": ("persistence.py",),
+    "ui": ("main.py", "widgets.py", "themes.py", "frame_scheduler.py", "event_queue.py"),
+}
+
+
+class Profiler:
+    """Collects sampled profiles per subsystem while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_every = SAMPLE_EVERY
+        self.directory = PROFILE_DIR
+        self.calls = {}
+        self.samples = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+        self._last_usage = None
+        self._stop_saving = None
+
+    def start(self, directory=None, sample_every=None, interval=None):
+        """Start sampling; with an interval, also save every `interval` seconds"""
+        import tracemalloc
+        if directory:
+            self.directory = directory
+        if sample_every:
+            self.sample_every = sample_every
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self._started_tracemalloc = True
+        self.enabled = True
+        if interval and self._stop_saving is None:
+            self._stop_saving = threading.Event()
+            thread = threading.Thread(target=self._save_periodically,
+                                      args=(interval, self._stop_saving), name="ProfileSaver")
+            thread.daemon = True
+            thread.start()
+
+    def stop(self):
+        """Stop sampling, save what was collected and return the files written"""
+        if not self.enabled:
+            return []
+        self.enabled = False
+        if self._stop_saving is not None:
+            self._stop_saving.set()
+            self._stop_saving = None
+        files = self.save()
+        if self._started_tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        self._last_usage = None
+        return files
+
+    def _save_periodically(self, interval, stop):
+        while not stop.wait(interval):
+            self.save()
+
+    def run(self, subsystem, function, args, kwargs):
+        """Call function, profiling the call if it is a sample"""
+        local = self._local
+        if getattr(local, "active", False):
+            # Already inside a profiled call; the outer profile covers this one
+            return function(*args, **kwargs)
+        count = self.calls[subsystem] = self.calls.get(subsystem, 0) + 1
+        if count % self.sample_every:
+            return function(*args, **kwargs)
+        self.samples[subsystem] = self.samples.get(subsystem, 0) + 1
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is running (only one may be, from Python 3.12)
+            return function(*args, **kwargs)
+        local.active = True
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profile.disable()
+            local.active = False
+            self._merge(subsystem, profile)
+
+    def _merge(self, subsystem, profile):
+        import pstats
+        with self._lock:
+            stats = self._stats.get(subsystem)
+            if stats is None:
+                self._stats[subsystem] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def save(self):
+        """Write the profiles and a memory snapshot, then start a new period"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            calls, self.calls = self.calls, {}
+            samples, self.samples = self.samples, {}
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        base = os.path.join(self.directory, stamp)
+        files = []
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            files += self._save_cpu(base, stats, calls, samples)
+            files += self._save_memory(base)
+        except OSError as e:
+            print(f"Error writing profile to {self.directory}: {e}")
+        return files
+
+    def _save_cpu(self, base, stats, calls, samples):
+        files = []
+        report_path = f"{base}-cpu.txt"
+        with open(report_path, "w", encoding="utf-8") as report:
+            for subsystem in sorted(set(calls) | set(stats)):
+                report.write(f"== {subsystem}: {calls.get(subsystem, 0)} calls, "
+                             f"{samples.get(subsystem, 0)} profiled ==\n")
+                if subsystem not in stats:
+                    report.write("\n")
+                    continue
+                path = f"{base}-{subsystem}.prof"
+                stats[subsystem].dump_stats(path)
+                files.append(path)
+                stats[subsystem].stream = report
+                stats[subsystem].sort_stats("cumulative").print_stats(REPORT_LINES)
+        files.append(report_path)
+        return files
+
+    def _save_memory(self, base):
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            return []
+        snapshot = tracemalloc.take_snapshot()
+        snapshot_path = f"{base}-memory.snapshot"
+        snapshot.dump(snapshot_path)
+        usage = allocations_by_subsystem(snapshot)
+        previous, self._last_usage = self._last_usage, usage
+        report_path = f"{base}-memory.txt"
+        with open(report_path, "w", encoding="utf-8") as report:
+            current, peak = tracemalloc.get_traced_memory()
+            report.write(f"Traced: {current / 1024:.0f} KiB, peak {peak / 1024:.0f} KiB\n\n")
+            for subsystem in SUBSYSTEMS:
+                lines = usage.get(subsystem, {})
+                total = sum(size for size, _ in lines.values())
+                report.write(f"== {subsystem}: {total / 1024:.1f} KiB in "
+                             f"{sum(count for _, count in lines.values())} blocks ==\n")
+                largest = sorted(lines.items(), key=lambda item: item[1][0], reverse=True)
+                for (filename, lineno), (size, count) in largest[:REPORT_LINES]:
+                    report.write(f"{filename}:{lineno}: {size / 1024:.1f} KiB in {count} blocks\n")
+                if previous is not None:
+                    before = previous.get(subsystem, {})
+                    growth = sorted(((size - before.get(line, (0, 0))[0], line)
+                                     for line, (size, _) in lines.items()), reverse=True)
+                    growth = [(change, line) for change, line in growth[:REPORT_LINES] if change > 0]
+                    if growth:
+                        report.write("-- grew since the previous save --\n")
+                        for change, (filename, lineno) in growth:
+                            report.write(f"{filename}:{lineno}: +{change / 1024:.1f} KiB\n")
+                report.write("\n")
+        return [snapshot_path, report_path]
+
+
+def allocations_by_subsystem(snapshot):
+    """{subsystem: {(file, line): (bytes, blocks)}} of a tracemalloc snapshot
+
+    Each allocation counts towards the subsystem of the most recent frame in
+    one of its source files, at that frame's line, so allocations made by
+    library code are charged to the subsystem code that called it.
+    """
+    module_subsystem = {module: subsystem for subsystem, modules in SUBSYSTEMS.items()
+                        for module in modules}
+    file_subsystem = {}
+    usage = {}
+    # Grouping by traceback first visits each distinct call stack once
+    for statistic in snapshot.statistics("traceback"):
+        # Frames run from the oldest to the most recent
+        for frame in reversed(statistic.traceback):
+            filename = frame.filename
+            subsystem = file_subsystem.get(filename, "")
+            if subsystem == "":
+                subsystem = file_subsystem[filename] = module_subsystem.get(
+                    os.path.basename(filename))
+            if subsystem is not None:
+                lines = usage.setdefault(subsystem, {})
+                key = (os.path.basename(filename), frame.lineno)
+                size, count = lines.get(key, (0, 0))
+                lines[key] = (size + statistic.size, count + statistic.count)
+                break
+    return usage
+
+
+PROFILER = Profiler()
+
+
+def profiled(subsystem):
+    """Decorator sampling calls of a subsystem entry point while profiling is on"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            return PROFILER.run(subsystem, function, args, kwargs)
+        return wrapper
+    return decorate
+
+
+def add_arguments(parser):
+    """Add --profile and --profile-dir to an argparse parser"""
+    parser.add_argument("--profile", nargs="?", type=float, const=300.0, metavar="SECONDS",
+                        help="sample CPU and memory profiles, saving them every SECONDS "
+                             "(default 300) and at exit")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR, metavar="DIR",
+                        help=f"where profiles are written (default {PROFILE_DIR})")
@@ -0,0 +1,352 @@
+"""Recurrence rules for alarms and a fast next-occurrence calculator.
+
+An alarm's optional ``repeat`` field describes when it fires again::
+
+    {"type": "daily"}                                  # the default
+    {"type": "once", "date": "2026-03-08"}
+    {"type": "weekly", "days": [0, 1, 2, 3, 4]}        # Monday is 0
+    {"type": "interval", "every": 3, "unit": "days", "start": "2026-01-01"}
+    {"type": "cron", "expr": "30 6 * * mon-fri"}
+
+Every rule may also carry ``skip`` (a list of "YYYY-MM-DD" dates), an
+``until`` date and a ``start`` date before which it does not fire (for
+intervals, ``start`` is also the day the count starts from). Times are wall-clock times in the alarm's ``timezone`` (an
+IANA name) or, without one, in the system's local time:
+
+* a wall time inside a DST gap fires as far after the gap as it was into it
+  (02:30 on a spring-forward night fires at 03:30);
+* a wall time that occurs twice in a DST overlap fires once, at the first
+  occurrence.
+
+Rules are compiled once. The next fire is found by jumping straight to the
+next matching day and adding the time of day to that day's cached UTC start,
+so most rules cost a few integer operations; only the two days a year with a
+transition go through a full time zone conversion.
+"""
+import bisect
+import calendar
+import datetime
+
+
+# Longest search for a matching day (cron rules for 29 February need 8 years)
+MAX_SEARCH_DAYS = 366 * 8
+
+# Elapsed intervals stop looking for a non-skipped slot after this many steps
+MAX_INTERVAL_STEPS = 100000
+
+# Zone day starts kept per zone before the cache is cleared
+MAX_CACHED_DAYS = 4096
+
+WEEKDAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+MONTH_NAMES = ("jan", "feb", "mar", "apr", "may", "jun",
+               "jul", "aug", "sep", "oct", "nov", "dec")
+
+INTERVAL_UNITS = {"minutes": 60, "hours": 3600, "days": 1, "weeks": 7}
+
+
+def parse_time_of_day(text):
+    """Seconds since midnight of an HH:MM:SS string"""
+    parts = text.split(":")
+    if len(parts) != 3 or not all(len(part) == 2 and part.isdigit() for part in parts):
+        raise ValueError(f"Time must be HH:MM:SS: {text!r}")
+    hours, minutes, seconds = int(parts[0]), int(parts[1]), int(parts[2])
+    if hours > 23 or minutes > 59 or seconds > 59:
+        raise ValueError(f"Time out of range: {text!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_date(text):
+    """Proleptic Gregorian ordinal of a YYYY-MM-DD string"""
+    return datetime.date.fromisoformat(text).toordinal()
+
+
+def weekday(ordinal):
+    """Weekday of a date ordinal, Monday is 0"""
+    return (ordinal + 6) % 7
+
+
+class ZoneDays:
+    """Maps local dates of one zone to UTC instants, caching regular days"""
+
+    def __init__(self, zone_name=None):
+        self.name = zone_name
+        if zone_name:
+            import pytz
+            self.tz = pytz.timezone(zone_name)
+        else:
+            # None means the system's local time
+            self.tz = None
+        # ordinal -> UTC start of the day, or None if the day has a transition
+        self._starts = {}
+        # (ordinal, start, end) of the day most recently located
+        self._current = (0, 0, 0)
+
+    def exact(self, ordinal, seconds):
+        """UTC instant of a wall time, resolving DST gaps and overlaps"""
+        naive = datetime.datetime.fromordinal(ordinal) + datetime.timedelta(seconds=seconds)
+        if self.tz is None:
+            # fold=0 reads overlaps as the first occurrence and moves gap
+            # times forward by the size of the gap
+            return int(naive.timestamp())
+        import pytz
+        try:
+            local = self.tz.localize(naive, is_dst=None)
+        except pytz.AmbiguousTimeError:
+            local = self.tz.localize(naive, is_dst=True)
+        except pytz.NonExistentTimeError:
+            local = self.tz.localize(naive, is_dst=False)
+        return int(local.timestamp())
+
+    def day_start(self, ordinal):
+        """UTC start of a local day, or None if the day has a transition"""
+        try:
+            return self._starts[ordinal]
+        except KeyError:
+            pass
+        start = self.exact(ordinal, 0)
+        regular = self.exact(ordinal + 1, 0) - start == 86400
+        if len(self._starts) >= MAX_CACHED_DAYS:
+            self._starts.clear()
+        self._starts[ordinal] = start if regular else None
+        return self._starts[ordinal]
+
+    def locate(self, instant):
+        """Ordinal of the local date containing a UTC instant"""
+        ordinal, start, end = self._current
+        if start <= instant < end:
+            return ordinal
+        if self.tz is None:
+            ordinal = datetime.datetime.fromtimestamp(instant).toordinal()
+        else:
+            ordinal = datetime.datetime.fromtimestamp(instant, self.tz).toordinal()
+        self._current = (ordinal, self.exact(ordinal, 0), self.exact(ordinal + 1, 0))
+        return ordinal
+
+
+_zones = {}
+
+
+def zone_days(zone_name=None):
+    """Shared ZoneDays for a zone name (None or "" for local time)"""
+    zone_name = zone_name or None
+    zone = _zones.get(zone_name)
+    if zone is None:
+        zone = _zones[zone_name] = ZoneDays(zone_name)
+    return zone
+
+
+def parse_cron_field(text, low, high, names=()):
+    """Set of values matched by one cron field; None when it is "*" """
+    if text == "*":
+        return None
+    values = set()
+    for part in text.lower().split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if step < 1:
+            raise ValueError(f"Bad cron step: {text}")
+        if part == "*":
+            first, last = low, high
+        else:
+            first, _, last = part.partition("-")
+            first = _cron_value(first, low, names)
+            last = _cron_value(last, low, names) if last else (high if step > 1 else first)
+        if not (low <= first <= high and low <= last <= high) or first > last:
+            raise ValueError(f"Cron field out of range: {text}")
+        values.update(range(first, last + 1, step))
+    return values
+
+
+def _cron_value(text, low, names):
+    if text in names:
+        return names.index(text) + low
+    return int(text)
+
+
+class Recurrence:
+    """Compiled recurrence rule; next_after() gives the next fire instant"""
+
+    def __init__(self, time_of_day, repeat=None, timezone=None):
+        repeat = repeat or {}
+        self.kind = repeat.get("type", "daily")
+        self.seconds = parse_time_of_day(time_of_day)
+        # Sorted fire times within a matching day
+        self.times = [self.seconds]
+        self.skip = frozenset(parse_date(day) for day in repeat.get("skip", ()))
+        self.until = parse_date(repeat["until"]) if repeat.get("until") else None
+        self.start = parse_date(repeat["start"]) if repeat.get("start") else None
+        try:
+            self.zone = zone_days(timezone)
+        except KeyError:
+            raise ValueError(f"Unknown timezone: {timezone}")
+
+        if self.kind == "daily":
+            pass
+        elif self.kind == "once":
+            self.date = parse_date(repeat["date"]) if repeat.get("date") else None
+        elif self.kind == "weekly":
+            days = {int(day) % 7 for day in repeat.get("days", ())}
+            if not days:
+                raise ValueError("Weekly alarms need at least one day")
+            # Days from each weekday to the next selected one
+            self.ahead = tuple(min((day - current) % 7 for day in days) for current in range(7))
+        elif self.kind == "interval":
+            self.every = int(repeat.get("every", 1))
+            unit = repeat.get("unit", "days")
+            if self.every < 1 or unit not in INTERVAL_UNITS:
+                raise ValueError(f"Bad interval: every {self.every} {unit}")
+            if unit in ("days", "weeks"):
+                self.period = self.every * INTERVAL_UNITS[unit]
+            else:
+                # Minutes and hours count elapsed time, not wall-clock time
+                self.kind = "elapsed"
+                self.period = self.every * INTERVAL_UNITS[unit]
+        elif self.kind == "cron":
+            fields = repeat.get("expr", "").split()
+            if len(fields) != 5:
+                raise ValueError("Cron expressions need five fields: min hour day month weekday")
+            minutes = parse_cron_field(fields[0], 0, 59) or range(60)
+            hours = parse_cron_field(fields[1], 0, 23) or range(24)
+            days_of_month = parse_cron_field(fields[2], 1, 31)
+            self.days_of_month = None if days_of_month is None else sorted(days_of_month)
+            self.months = parse_cron_field(fields[3], 1, 12, MONTH_NAMES)
+            days_of_week = parse_cron_field(fields[4], 0, 7, ("sun",) + WEEKDAY_NAMES[:6])
+            # Cron counts Sunday as 0 (or 7); convert to Monday = 0
+            self.days_of_week = None if days_of_week is None else {
+                (day + 6) % 7 for day in days_of_week}
+            if self.days_of_week is not None:
+                self.ahead = tuple(min((day - current) % 7 for day in self.days_of_week)
+                                   for current in range(7))
+            # Seconds come from the alarm's own time
+            second = self.seconds % 60
+            self.times = sorted(hour * 3600 + minute * 60 + second
+                                for hour in hours for minute in minutes)
+            # Rules that only restrict the weekday need no calendar lookups
+            if self.days_of_month is None and self.months is None:
+                self.kind = "weekly" if self.days_of_week is not None else "daily"
+        else:
+            raise ValueError(f"Unknown repeat type: {self.kind}")
+
+    def next_after(self, after):
+        """First fire instant (UTC seconds) strictly after `after`, or None"""
+        if self.kind == "elapsed":
+            return self._next_elapsed(after)
+        day = self.zone.locate(after)
+        if self.start is not None and day < self.start:
+            day = self.start
+        limit = day + MAX_SEARCH_DAYS
+        if self.until is not None:
+            limit = min(limit, self.until)
+        while day <= limit:
+            day = self._next_day(day, limit)
+            if day is None or day > limit:
+                return None
+            if day not in self.skip:
+                instant = self._first_time_after(day, after)
+                if instant is not None:
+                    return instant
+            day += 1
+        return None
+
+    def _next_day(self, day, limit):
+        """First day on or after `day` that the rule selects"""
+        if self.kind == "daily":
+            return day
+        if self.kind == "weekly":
+            return day + self.ahead[weekday(day)]
+        if self.kind == "once":
+            if self.date is None:
+                return day
+            return self.date if day <= self.date else None
+        if self.kind == "interval":
+            start = self.start if self.start is not None else day
+            if day <= start:
+                return start
+            return day + (start - day) % self.period
+        # cron: one step per month at most
+        while day <= limit:
+            date = datetime.date.fromordinal(day)
+            next_month = day + calendar.monthrange(date.year, date.month)[1] - date.day + 1
+            if self.months is not None and date.month not in self.months:
+                day = next_month
+                continue
+            if self.days_of_month is None and self.days_of_week is None:
+                return day
+            # Like cron, a restricted day of month and day of week match either way
+            candidates = []
+            if self.days_of_month is not None:
+                index = bisect.bisect_left(self.days_of_month, date.day)
+                if index < len(self.days_of_month):
+                    candidates.append(day + self.days_of_month[index] - date.day)
+            if self.days_of_week is not None:
+                candidates.append(day + self.ahead[weekday(day)])
+            if candidates and min(candidates) < next_month:
+                return min(candidates)
+            day = next_month
+        return None
+
+    def _first_time_after(self, day, after):
+        """Earliest fire time on a day that is later than `after`"""
+        times = self.times
+        start = self.zone.day_start(day)
+        if start is not None:
+            index = bisect.bisect_right(times, after - start)
+            return start + times[index] if index < len(times) else None
+        # A transition day: convert exactly (the mapping is still monotonic)
+        low, high = 0, len(times)
+        while low < high:
+            middle = (low + high) // 2
+            if self.zone.exact(day, times[middle]) > after:
+                high = middle
+            else:
+                low = middle + 1
+        return self.zone.exact(day, times[low]) if low < len(times) else None
+
+    def _next_elapsed(self, after):
+        """Next slot of a fixed elapsed-time interval"""
+        anchor_day = self.start if self.start is not None else self.zone.locate(after)
+        start = self.zone.day_start(anchor_day)
+        anchor = start + self.seconds if start is not None else self.zone.exact(anchor_day, self.seconds)
+        instant = anchor if after < anchor else anchor + (int((after - anchor) // self.period) + 1) * self.period
+        for _ in range(MAX_INTERVAL_STEPS):
+            day = self.zone.locate(instant)
+            if self.until is not None and day > self.until:
+                return None
+            if day not in self.skip:
+                return instant
+            instant += self.period
+        return None
+
+
+def rule_for(alarm_data):
+    """Compiled rule of an alarm, cached on the record under a private key"""
+    rule = alarm_data.get("_rule")
+    if rule is None:
+        rule = alarm_data["_rule"] = Recurrence(alarm_data["time"], alarm_data.get("repeat"),
+                                                alarm_data.get("timezone"))
+    return rule
+
+
+def describe(alarm_data):
+    """Short human-readable summary of an alarm's recurrence"""
+    repeat = alarm_data.get("repeat") or {}
+    kind = repeat.get("type", "daily")
+    if kind == "once":
+        text = f"Once on {repeat['date']}" if repeat.get("date") else "Once"
+    elif kind == "weekly":
+        days = sorted(int(day) % 7 for day in repeat.get("days", ()))
+        if days == [0, 1, 2, 3, 4]:
+            text = "Weekdays"
+        elif days == [5, 6]:
+            text = "Weekends"
+        else:
+            text = ", ".join(WEEKDAY_NAMES[day].title() for day in days)
+    elif kind == "interval":
+        text = f"Every {repeat.get('every', 1)} {repeat.get('unit', 'days')}"
+    elif kind == "cron":
+        text = f"Cron {repeat.get('expr', '')}"
+    else:
+        text = "Daily"
+    if alarm_data.get("timezone"):
+        text += f", {alarm_data['timezone']}"
+    return text
@@ -0,0 +1,295 @@
+"""Fast-forward simulation of alarm schedules on a virtual clock.
+
+Runs a real AlarmEngine with a VirtualClock and no scheduler thread, jumping
+the clock straight from one deadline to the next, so a month of firing,
+snoozing and DST transitions for 10k alarms takes seconds::
+
+    python simulate.py --alarms 10000 --days 30 --snooze-rate 0.1 --tz Europe/Berlin
+    python simulate.py --settings alarm_settings.json --days 7 --output report.json
+
+The report covers capacity (fires per day, the busiest second and minute)
+and correctness: alarms that rang away from their wall-clock time (DST gaps
+move them, by design), alarms that rang twice in one day and interval alarms
+whose fires were not their interval apart. With --seed and
+--start fixed, the report is the same on every run, so it can be kept as a
+regression baseline.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from alarm_engine import AlarmEngine
+from clock import VirtualClock
+from recurrence import rule_for
+
+
+# Zones with DST on different dates, for generated alarms
+SIMULATED_ZONES = ("", "Europe/Berlin", "America/New_York", "Australia/Sydney", "Asia/Tokyo")
+
+# Wall times inside the usual DST gaps and overlaps, generated more often
+DST_TIMES = ("02:00:00", "02:30:00", "01:30:00", "03:00:00")
+
+# Real seconds the settings writer waits before saving; longer than any run
+SAVE_DELAY = 24 * 3600
+
+# Rules whose fires must be at the alarm's wall-clock time (day and week
+# intervals are checked as well, see Simulation._on_fire)
+WALL_TIME_KINDS = ("daily", "weekly", "once")
+
+# Most a DST transition moves the gap between two wall-time fires
+DST_SLACK = 4 * 3600
+
+# Two fires of such a rule closer than this rang twice in a day
+MIN_WALL_TIME_GAP = 24 * 3600 - DST_SLACK
+
+# UTC offsets are cached per zone and slot of this many seconds; DST
+# transitions fall on quarter hours
+OFFSET_SLOT = 900
+
+
+def generate_alarms(count, rng, start):
+    """Alarm records with a mix of rules, zones and DST-sensitive times"""
+    try:
+        import pytz  # noqa: F401 - zone alarms need it
+        zones = SIMULATED_ZONES
+    except ImportError:
+        zones = ("",)
+    start_date = datetime.date.fromtimestamp(start)
+    records = []
+    for i in range(count):
+        if rng.random() < 0.1:
+            alarm_time = rng.choice(DST_TIMES)
+        else:
+            alarm_time = f"{rng.randrange(24):02d}:{rng.randrange(0, 60, 5):02d}:00"
+        kind = rng.random()
+        if kind < 0.4:
+            repeat = None
+        elif kind < 0.65:
+            repeat = {"type": "weekly", "days": sorted(rng.sample(range(7), rng.randint(1, 5)))}
+        elif kind < 0.75:
+            repeat = {"type": "once",
+                      "date": (start_date + datetime.timedelta(days=rng.randrange(30))).isoformat()}
+        elif kind < 0.9:
+            every, unit = rng.choice(((90, "minutes"), (4, "hours"), (2, "days"), (3, "days")))
+            # Counted from a start before the run, so the first fire falls anywhere in the cycle
+            first = start_date - datetime.timedelta(days=rng.randrange(7))
+            repeat = {"type": "interval", "every": every, "unit": unit, "start": first.isoformat()}
+        else:
+            repeat = {"type": "cron", "expr": f"{rng.randrange(60)} {rng.randrange(6, 22)} * * mon-fri"}
+        record = {"time": alarm_time, "name": f"Simulated {i}"}
+        if repeat:
+            record["repeat"] = repeat
+        zone = rng.choice(zones)
+        if zone:
+            record["timezone"] = zone
+        records.append(record)
+    return records
+
+
+def format_seconds(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+class Simulation:
+    """Drives an engine on a virtual clock and tallies what happens"""
+
+    def __init__(self, engine, clock, snooze_rate=0.0, rng=None):
+        self.engine = engine
+        self.clock = clock
+        self.snooze_rate = snooze_rate
+        self.rng = rng or random.Random(0)
+        self.fires = 0
+        self.snoozes = 0
+        self.expired = 0
+        self.missed = 0
+        self.per_day = {}
+        self.per_second = {}
+        self.per_minute = {}
+        self.off_wall_time = []
+        self.double_fires = []
+        self.off_interval = []
+        self._last_fire = {}
+        self._offsets = {}
+        engine.add_listener(self._on_event)
+
+    def wall_seconds(self, alarm_data, instant):
+        """Seconds since local midnight of an instant in the alarm's zone"""
+        zone = rule_for(alarm_data).zone
+        slot = int(instant) // OFFSET_SLOT
+        offset = self._offsets.get((zone.name, slot))
+        if offset is None:
+            start = datetime.datetime.fromtimestamp(slot * OFFSET_SLOT, datetime.timezone.utc)
+            local = start.astimezone(zone.tz) if zone.tz is not None else start.astimezone()
+            offset = self._offsets[(zone.name, slot)] = int(local.utcoffset().total_seconds())
+        return (int(instant) + offset) % 86400
+
+    def _on_event(self, event, alarm_data):
+        if event == "expire":
+            self.expired += 1
+        elif event == "missed":
+            self.missed += 1
+        elif event == "fire":
+            self._on_fire(alarm_data)
+
+    def _on_fire(self, alarm_data):
+        fire = alarm_data["_last_fire"]
+        self.fires += 1
+        self.missed += fire.missed
+        deadline = fire.deadline
+        day = datetime.date.fromtimestamp(deadline).isoformat()
+        self.per_day[day] = self.per_day.get(day, 0) + 1
+        second = int(deadline)
+        self.per_second[second] = self.per_second.get(second, 0) + 1
+        self.per_minute[second // 60] = self.per_minute.get(second // 60, 0) + 1
+
+        # Not rule.kind alone: cron rules compile to "weekly" too, with their own times
+        kind = (alarm_data.get("repeat") or {}).get("type", "daily")
+        rule_kind = rule_for(alarm_data).kind
+        if kind in WALL_TIME_KINDS or kind == "interval":
+            # By alarm id: records of an alarm database are reloaded, not kept
+            last = self._last_fire.get(alarm_data["id"])
+            self._last_fire[alarm_data["id"]] = deadline
+            if last is None:
+                pass
+            elif rule_kind == "elapsed":
+                if deadline - last != rule_for(alarm_data).period:
+                    self.off_interval.append((alarm_data, deadline))
+            elif rule_kind == "interval":
+                if abs(deadline - last - rule_for(alarm_data).period * 86400) > DST_SLACK:
+                    self.off_interval.append((alarm_data, deadline))
+            elif deadline - last < MIN_WALL_TIME_GAP:
+                self.double_fires.append((alarm_data, deadline))
+        if kind in WALL_TIME_KINDS or rule_kind == "interval":
+            rang_at = format_seconds(self.wall_seconds(alarm_data, deadline))
+            if rang_at != alarm_data["time"]:
+                self.off_wall_time.append((alarm_data, deadline, rang_at))
+
+        if self.snooze_rate and self.rng.random() < self.snooze_rate:
+            self.engine.snooze_alarm(alarm_data)
+            self.snoozes += 1
+
+    def run(self, until):
+        """Jump from deadline to deadline until `until` (epoch seconds)"""
+        scheduler = self.engine.scheduler
+        steps = 0
+        while True:
+            due = scheduler.next_due()
+            if due is None or due > until:
+                break
+            self.clock.advance_to(due)
+            scheduler.run_due()
+            steps += 1
+        self.clock.advance_to(until)
+        return steps
+
+    def report(self):
+        def examples(items):
+            listed = []
+            # Alarms due together ring in no particular order
+            first = sorted(items, key=lambda item: (item[1], item[0]["name"]))[:10]
+            for alarm_data, deadline, *rang_at in first:
+                example = {"name": alarm_data["name"], "time": alarm_data["time"],
+                           "timezone": alarm_data.get("timezone", "local"),
+                           "rang": datetime.datetime.fromtimestamp(deadline).isoformat()}
+                if rang_at:
+                    example["rang_wall_time"] = rang_at[0]
+                listed.append(example)
+            return listed
+
+        busiest_second = max(self.per_second.items(), key=lambda item: item[1], default=(0, 0))
+        busiest_minute = max(self.per_minute.items(), key=lambda item: item[1], default=(0, 0))
+        return {
+            "alarms": len(self.engine.alarms),
+            "fires": self.fires,
+            "snoozes": self.snoozes,
+            "expired": self.expired,
+            "missed": self.missed,
+            "fires_per_day": dict(sorted(self.per_day.items())),
+            "busiest_second": {"at": datetime.datetime.fromtimestamp(busiest_second[0]).isoformat(),
+                               "fires": busiest_second[1]},
+            "busiest_minute": {"at": datetime.datetime.fromtimestamp(busiest_minute[0] * 60).isoformat(),
+                               "fires": busiest_minute[1]},
+            "off_wall_time": len(self.off_wall_time),
+            "off_wall_time_examples": examples(self.off_wall_time),
+            "double_fires": len(self.double_fires),
+            "double_fire_examples": examples(self.double_fires),
+            "off_interval": len(self.off_interval),
+            "off_interval_examples": examples(self.off_interval),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fast-forward alarm schedules on a virtual clock")
+    parser.add_argument("--alarms", type=int, default=10000, help="generated alarms (default 10000)")
+    parser.add_argument("--settings", help="simulate the alarms of a settings file instead")
+    parser.add_argument("--days", type=float, default=30, help="simulated days (default 30)")
+    parser.add_argument("--start", help="start as YYYY-MM-DD[THH:MM] local time (default now)")
+    parser.add_argument("--tz", help="local time zone of the simulation, e.g. Europe/Berlin")
+    parser.add_argument("--snooze-rate", type=float, default=0.1,
+                        help="fraction of fires that are snoozed (default 0.1)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sqlite", action="store_true",
+                        help="keep the alarms in an SQLite alarm database, as --alarm-db does")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args(argv)
+
+    if args.tz:
+        # Local-time alarms follow the simulated zone, not the machine's
+        os.environ["TZ"] = args.tz
+        if hasattr(time, "tzset"):
+            time.tzset()
+        else:
+            print("Warning: --tz is not supported on this platform; using the system zone")
+    start = (datetime.datetime.fromisoformat(args.start).timestamp() if args.start
+             else time.time())
+    rng = random.Random(args.seed)
+
+    work_dir = tempfile.mkdtemp(prefix="alarm-sim-")
+    try:
+        settings_path = os.path.join(work_dir, "settings.json")
+        if args.settings:
+            shutil.copyfile(args.settings, settings_path)
+        clock = VirtualClock(start)
+        database = os.path.join(work_dir, "alarms.db") if args.sqlite else None
+        engine = AlarmEngine(settings_path, clock=clock, threaded=False, database=database)
+        # Written once, by stop(): the run measures the schedule, not the disk
+        engine.store.delay = SAVE_DELAY
+        engine.load()
+        if not args.settings:
+            result = engine.add_alarms(generate_alarms(args.alarms, rng, start))
+            for error in result.errors[:10]:
+                print(f"Generated alarm {error.row} rejected: {error.message}")
+        simulation = Simulation(engine, clock, args.snooze_rate, rng)
+
+        started = time.perf_counter()
+        steps = simulation.run(start + args.days * 86400)
+        elapsed = time.perf_counter() - started
+        engine.stop()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = simulation.report()
+    report.update(days=args.days, start=datetime.datetime.fromtimestamp(start).isoformat(),
+                  timezone=args.tz or "system", deadlines=steps)
+    print(f"Simulated {args.days:g} days of {report['alarms']} alarms in {elapsed:.2f} s: "
+          f"{report['fires']} fires ({report['fires'] / elapsed if elapsed else 0:.0f}/s), "
+          f"{report['snoozes']} snoozes, {report['expired']} expired")
+    print(f"Busiest second: {report['busiest_second']['fires']} fires at {report['busiest_second']['at']}; "
+          f"busiest minute: {report['busiest_minute']['fires']} fires")
+    print(f"Rang away from their wall time (DST gaps): {report['off_wall_time']}; "
+          f"rang twice in a day: {report['double_fires']}; "
+          f"off their interval: {report['off_interval']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""Startup timing: records how long each cold-start phase takes."""
+import time
+from contextlib import contextmanager
+
+
+class StartupTimer:
+    """Collects named phases measured from process start"""
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        # (name, start offset, duration) in seconds
+        self.phases = []
+        self.marks = {}
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as one phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, start - self.origin, end - start))
+
+    def mark(self, name):
+        """Record a point in time, e.g. when the window first became idle"""
+        self.marks[name] = time.perf_counter() - self.origin
+
+    def report(self):
+        """Human-readable table of phases and marks"""
+        lines = ["Startup timing (ms since process start)", ""]
+        lines.append(f"{'phase':<32}{'start':>10}{'took':>10}")
+        for name, start, duration in self.phases:
+            lines.append(f"{name:<32}{start * 1000:>10.1f}{duration * 1000:>10.1f}")
+        if self.marks:
+            lines.append("")
+            for name, offset in sorted(self.marks.items(), key=lambda item: item[1]):
+                lines.append(f"{name:<32}{offset * 1000:>10.1f}")
+        return "\n".join(lines)
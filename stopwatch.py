@@ -0,0 +1,71 @@
+"""Stopwatch core on a monotonic nanosecond clock with compact lap storage.
+
+Elapsed time is measured with time.monotonic_ns(), so NTP steps or manual
+clock changes cannot corrupt it. Laps are kept as raw nanosecond integers in
+an array and only formatted when displayed.
+"""
+import array
+import time
+
+
+def format_stopwatch_ns(nanoseconds):
+    """Format nanoseconds as HH:MM:SS.mmm"""
+    milliseconds = nanoseconds // 1000000
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+class Stopwatch:
+    """Start/stop/lap timer; laps are cumulative elapsed nanoseconds"""
+
+    def __init__(self, clock=time.monotonic_ns):
+        self.clock = clock
+        self.running = False
+        self._started = 0
+        self._elapsed = 0
+        # 8 bytes per lap
+        self.laps = array.array("q")
+
+    def start(self):
+        """Start or resume timing"""
+        if not self.running:
+            self._started = self.clock()
+            self.running = True
+
+    def stop(self):
+        """Pause timing, keeping the elapsed time"""
+        if self.running:
+            self._elapsed += self.clock() - self._started
+            self.running = False
+
+    def toggle(self):
+        """Start if stopped, stop if running; returns the new running state"""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+        return self.running
+
+    def reset(self):
+        """Stop and clear elapsed time and laps"""
+        self.running = False
+        self._elapsed = 0
+        self.laps = array.array("q")
+
+    def elapsed_ns(self):
+        """Total elapsed nanoseconds"""
+        if self.running:
+            return self._elapsed + self.clock() - self._started
+        return self._elapsed
+
+    def lap(self):
+        """Record a lap at the current elapsed time and return its index"""
+        self.laps.append(self.elapsed_ns())
+        return len(self.laps) - 1
+
+    def lap_split_ns(self, index):
+        """Time between a lap and the one before it"""
+        previous = self.laps[index - 1] if index > 0 else 0
+        return self.laps[index] - previous
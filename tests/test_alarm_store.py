@@ -0,0 +1,53 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alarm_store import AlarmStore
+
+
+class AlarmStoreIndexTest(unittest.TestCase):
+    def test_rows_and_next_fires_match_a_plain_list(self):
+        rng = random.Random(7)
+        store = AlarmStore()
+        order = []
+        fires = {}
+        for step in range(6000):
+            action = rng.random()
+            if action < 0.45 or not order:
+                alarm_id = store.add({"time": "07:00:00", "name": f"a{step}"})
+                order.append(alarm_id)
+            elif action < 0.6:
+                alarm_id = order.pop(rng.randrange(len(order)))
+                self.assertEqual(store.remove(alarm_id)["id"], alarm_id)
+                fires.pop(alarm_id, None)
+            elif action < 0.65:
+                gone = set(rng.sample(order, min(len(order), rng.randint(1, 20))))
+                store.remove_many(gone)
+                order = [alarm_id for alarm_id in order if alarm_id not in gone]
+                for alarm_id in gone:
+                    fires.pop(alarm_id, None)
+            else:
+                alarm_id = rng.choice(order)
+                deadline = rng.choice((None, rng.randrange(500)))
+                store.set_next_fire(alarm_id, deadline)
+                if deadline is None:
+                    fires.pop(alarm_id, None)
+                else:
+                    fires[alarm_id] = deadline
+
+            if step % 50 == 0:
+                self.assertEqual([alarm["id"] for alarm in store], order)
+                for row in rng.sample(range(len(order)), min(len(order), 20)):
+                    self.assertEqual(store.at(row)["id"], order[row])
+                    self.assertEqual(store.row_of(order[row]), row)
+                soonest = sorted(fires, key=lambda alarm_id: (fires[alarm_id], order.index(alarm_id)))
+                self.assertEqual([alarm["id"] for alarm in store.upcoming(10)], soonest[:10])
+        with self.assertRaises(IndexError):
+            store.at(len(order))
+
+
+if __name__ == "__main__":
+    unittest.main()
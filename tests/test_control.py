@@ -0,0 +1,53 @@
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import control
+from alarm_engine import AlarmEngine
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs Unix domain sockets")
+class ControlRestartTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="alarm-control-")
+        self.settings = os.path.join(self.directory, "settings.json")
+        self.socket = os.path.join(self.directory, "control.sock")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def start(self):
+        engine = AlarmEngine(self.settings)
+        engine.load()
+        return engine, control.ControlServer(engine, self.socket).start()
+
+    def test_changes_survive_a_restart(self):
+        engine, server = self.start()
+        with control.ControlClient(self.socket) as client:
+            added = client.request("add", alarms=[{"time": "07:00:00", "name": "Batch"},
+                                                  {"time": "08:00:00", "name": "Gone"}])["added"]
+            # The batch is written out; nothing else is pending from here on
+            engine.flush()
+            client.request("snooze", id=added[0]["id"], minutes=10)
+        engine.add_alarm("09:00:00", "Single")
+        engine.update_alarm(added[0]["id"], name="Renamed")
+        engine.remove_alarm(engine.alarms.get(added[1]["id"]))
+        server.stop()
+        engine.stop()
+
+        engine, server = self.start()
+        try:
+            names = sorted(alarm["name"] for alarm in engine.alarms)
+        finally:
+            server.stop()
+            engine.stop()
+        self.assertEqual(names, ["Batch (Snoozed)", "Renamed", "Single"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import calendar
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from alarm_engine import make_alarm, next_alarm_deadline
+
+DAY = 24 * 3600
+
+
+def utc(*fields):
+    return calendar.timegm(fields + (0,) * (6 - len(fields)))
+
+
+def fires(alarm_data, after, count):
+    """The next `count` fire instants of an alarm after `after`"""
+    instants = []
+    for _ in range(count):
+        after = next_alarm_deadline(alarm_data, after)
+        instants.append(after)
+    return instants
+
+
+class IntervalTest(unittest.TestCase):
+    def test_day_interval_keeps_its_spacing(self):
+        now = utc(2026, 1, 1, 12)
+        alarm = make_alarm("07:00:00", repeat={"type": "interval", "every": 3, "unit": "days"},
+                           timezone="UTC", now=now)
+        self.assertEqual(alarm["repeat"]["start"], "2026-01-02")
+        instants = fires(alarm, now, 4)
+        self.assertEqual(instants[0], utc(2026, 1, 2, 7))
+        self.assertEqual([b - a for a, b in zip(instants, instants[1:])], [3 * DAY] * 3)
+
+    def test_hour_interval_does_not_drift_across_days(self):
+        now = utc(2026, 1, 1, 12)
+        alarm = make_alarm("07:00:00", repeat={"type": "interval", "every": 5, "unit": "hours"},
+                           timezone="UTC", now=now)
+        instants = fires(alarm, now, 6)
+        self.assertEqual(instants[0], utc(2026, 1, 1, 17))
+        self.assertEqual([b - a for a, b in zip(instants, instants[1:])], [5 * 3600] * 5)
+
+    def test_given_start_is_kept(self):
+        alarm = make_alarm("07:00:00", repeat={"type": "interval", "every": 3, "unit": "days",
+                                               "start": "2025-12-31"},
+                           timezone="UTC", now=utc(2026, 1, 1, 12))
+        self.assertEqual(alarm["repeat"]["start"], "2025-12-31")
+        self.assertEqual(fires(alarm, utc(2026, 1, 1, 12), 1), [utc(2026, 1, 3, 7)])
+
+
+class MakeAlarmTest(unittest.TestCase):
+    def test_rule_that_never_rings_is_rejected(self):
+        for repeat in ({"type": "once", "until": "2025-12-31"},
+                       {"type": "interval", "every": 2, "unit": "days", "until": "2025-12-31"}):
+            with self.assertRaisesRegex(ValueError, "will not ring"):
+                make_alarm("07:00:00", repeat=repeat, timezone="UTC", now=utc(2026, 1, 1, 12))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import tkinter
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from widgets import VirtualList
+
+
+class VirtualListSelectionTest(unittest.TestCase):
+    def setUp(self):
+        try:
+            self.root = tkinter.Tk()
+        except tkinter.TclError as e:
+            self.skipTest(f"no display: {e}")
+        self.root.withdraw()
+        self.rows = [f"row {i}" for i in range(100)]
+        self.view = VirtualList(self.root, lambda: len(self.rows), self.rows.__getitem__, height=5)
+        self.view.refresh()
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def click(self, screen_row):
+        """Select a screen row the way a mouse click does"""
+        self.view.listbox.selection_clear(0, tkinter.END)
+        self.view.listbox.selection_set(screen_row)
+        self.view.listbox.event_generate("<<ListboxSelect>>")
+
+    def test_wheel_keeps_selected_row(self):
+        self.click(2)
+        self.view._on_wheel(SimpleNamespace(num=5, delta=0))
+        self.assertEqual(self.view.first, 3)
+        self.assertEqual(self.view.curselection(), (2,))
+        # Row 2 is off screen, so no screen row may look selected
+        self.assertEqual(self.view.listbox.curselection(), ())
+
+        self.view._on_wheel(SimpleNamespace(num=4, delta=0))
+        self.assertEqual(self.view.listbox.curselection(), (2,))
+
+    def test_scrollbar_and_see_keep_selected_row(self):
+        self.click(1)
+        self.view._on_scrollbar("moveto", "0.5")
+        self.assertEqual(self.view.curselection(), (1,))
+        self.view.see(0)
+        self.assertEqual(self.view.curselection(), (1,))
+        self.assertEqual(self.view.listbox.curselection(), (1,))
+
+    def test_click_after_scrolling_replaces_selection(self):
+        self.click(1)
+        self.view._on_scrollbar("scroll", "1", "pages")
+        self.click(0)
+        self.assertEqual(self.view.curselection(), (5,))
+
+
+class VirtualListKeyedSelectionTest(VirtualListSelectionTest):
+    def setUp(self):
+        super().setUp()
+        self.ids = [f"id{i}" for i in range(100)]
+        self.view.row_key = self.ids.__getitem__
+        self.view.key_row = self.row_of
+
+    def row_of(self, key):
+        try:
+            return self.ids.index(key)
+        except ValueError:
+            raise KeyError(key)
+
+    def test_selection_follows_removed_rows(self):
+        self.click(2)
+        self.view._on_wheel(SimpleNamespace(num=5, delta=0))
+        # Rows above the selection go away, as after removing alarms
+        del self.ids[:2], self.rows[:2]
+        self.view.invalidate()
+        self.assertEqual(self.view.selected_keys(), ["id2"])
+        self.assertEqual(self.view.curselection(), (0,))
+
+        del self.ids[0], self.rows[0]
+        self.view.invalidate()
+        self.assertEqual(self.view.curselection(), ())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+"""Themes applied through ttk.Style.
+
+A theme is a small palette in a JSON file in ``themes/`` (background,
+foreground, accent, title, field, status, select_foreground, disabled), plus
+optional per-style overrides::
+
+    {"name": "Dark", "colors": {"background": "#2E2E2E", ...},
+     "styles": {"TButton": {"borderwidth": 2}}}
+
+Every theme file is read once, when the ThemeManager is created. Applying a
+theme reconfigures a fixed set of named ttk styles, so its cost does not
+depend on how many widgets exist: ttk widgets (including ones created later)
+pick the new look up from their style. Classic Tk widgets that ttk has no
+equivalent for (Listbox, Canvas, Text, Toplevel) get their colors from the
+option database when they are created; the few long-lived ones that already
+exist are registered with track() and recolored directly.
+"""
+import json
+import os
+from tkinter import TclError, ttk
+
+
+THEMES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "themes")
+
+# Used when a theme file leaves a color out (and when no theme files exist)
+DEFAULT_COLORS = {
+    "background": "#F0F0F0",
+    "foreground": "black",
+    "accent": "#0078D7",
+    "title": "red",
+    "field": "white",
+    "status": "#E0E0E0",
+    "select_foreground": "white",
+    "disabled": "#A0A0A0",
+}
+
+# ttk theme the colors are applied on top of; unlike the native themes it
+# honors background colors on every platform
+BASE_THEME = "clam"
+
+# Classic widget options set from the palette: option -> color name
+CLASSIC_OPTIONS = {
+    "Listbox": {"background": "field", "foreground": "foreground",
+                "selectBackground": "accent", "selectForeground": "select_foreground"},
+    "Text": {"background": "field", "foreground": "foreground",
+             "selectBackground": "accent", "selectForeground": "select_foreground"},
+    "Canvas": {"background": "background"},
+    "Toplevel": {"background": "background"},
+}
+
+
+def load_themes(directory=THEMES_DIR):
+    """Theme definitions by key (file name without .json), read from a directory"""
+    themes = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        names = []
+    for file_name in names:
+        if not file_name.endswith(".json"):
+            continue
+        key = file_name[:-5]
+        try:
+            with open(os.path.join(directory, file_name), "r", encoding="utf-8") as f:
+                theme = json.load(f)
+            if not isinstance(theme.get("colors"), dict):
+                raise ValueError("missing colors")
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Skipping theme {file_name}: {e}")
+            continue
+        themes[key] = {
+            "name": theme.get("name", key.replace("_", " ").title()),
+            "colors": dict(DEFAULT_COLORS, **theme["colors"]),
+            "styles": theme.get("styles", {}),
+        }
+    if not themes:
+        themes["light"] = {"name": "Light", "colors": dict(DEFAULT_COLORS), "styles": {}}
+    return themes
+
+
+class ThemeManager:
+    """Loads the theme files and applies one through ttk.Style"""
+
+    def __init__(self, root, directory=THEMES_DIR):
+        self.root = root
+        self.themes = load_themes(directory)
+        self.style = ttk.Style(root)
+        if BASE_THEME in self.style.theme_names():
+            self.style.theme_use(BASE_THEME)
+        self.current = None
+        self.colors = dict(DEFAULT_COLORS)
+        # Style options a theme file overrode, with the values they replaced
+        self._overridden = {}
+        # Existing classic widgets: path name -> {option: color name}
+        self._tracked = {}
+
+    def names(self):
+        """(key, display name) of every loaded theme"""
+        return [(key, theme["name"]) for key, theme in self.themes.items()]
+
+    def resolve(self, key):
+        """A loaded theme key: `key` itself, or the first theme if it is unknown"""
+        return key if key in self.themes else next(iter(self.themes))
+
+    def apply(self, key):
+        """Switch to a theme; touches the styles and tracked widgets only"""
+        key = self.resolve(key)
+        theme = self.themes[key]
+        colors = self.colors = theme["colors"]
+        self.configure_styles(colors)
+        # Undo the previous theme's overrides, then apply this one's
+        for style_name, options in self._overridden.items():
+            self.style.configure(style_name, **options)
+        self._overridden = {}
+        for style_name, options in theme["styles"].items():
+            self._overridden[style_name] = {option: self.style.lookup(style_name, option)
+                                            for option in options}
+            self.style.configure(style_name, **options)
+
+        # Classic widgets created from now on
+        for widget_class, options in CLASSIC_OPTIONS.items():
+            for option, color in options.items():
+                self.root.option_add(f"*{widget_class}.{option}", colors[color])
+        self.root.configure(background=colors["background"])
+        for path, options in list(self._tracked.items()):
+            try:
+                widget = self.root.nametowidget(path)
+                widget.configure(**{option: colors[color] for option, color in options.items()})
+            except (KeyError, TclError):
+                # Destroyed since it was tracked
+                del self._tracked[path]
+        self.current = key
+        return key
+
+    def configure_styles(self, colors):
+        """Set the named styles the UI uses from a palette"""
+        style = self.style
+        background, foreground = colors["background"], colors["foreground"]
+        accent = colors["accent"]
+        style.configure(".", background=background, foreground=foreground,
+                        fieldbackground=colors["field"], bordercolor=colors["status"],
+                        lightcolor=background, darkcolor=background,
+                        troughcolor=colors["status"], selectbackground=accent,
+                        selectforeground=colors["select_foreground"],
+                        insertcolor=foreground, arrowcolor=foreground)
+        style.map(".", foreground=[("disabled", colors["disabled"])])
+        style.map("TButton", background=[("pressed", accent), ("active", accent)],
+                  foreground=[("disabled", colors["disabled"]),
+                              ("active", colors["select_foreground"])])
+        style.map("TCombobox", fieldbackground=[("readonly", colors["field"])],
+                  foreground=[("readonly", foreground)])
+        style.configure("TNotebook", background=background)
+        style.configure("TNotebook.Tab", background=colors["status"], foreground=foreground)
+        style.map("TNotebook.Tab", background=[("selected", background)])
+
+        # Named styles, mostly fonts; they follow the colors set on "."
+        style.configure("Title.TLabel", foreground=colors["title"], font=("Helvetica", 24, "bold"))
+        style.configure("Heading.TLabel", font=("Helvetica", 14, "bold"))
+        style.configure("Clock.TLabel", font=("Helvetica", 14))
+        style.configure("Display.TLabel", font=("Helvetica", 36))
+        style.configure("Status.TLabel", background=colors["status"])
+        style.configure("Large.TButton", font=("Helvetica", 12))
+        style.configure("Tile.TFrame", relief="groove", borderwidth=2)
+        style.configure("TileCity.TLabel", font=("Helvetica", 14, "bold"))
+        style.configure("TileZone.TLabel", font=("Helvetica", 10))
+        style.configure("TileTime.TLabel", font=("Helvetica", 18))
+
+    def track(self, widget, **options):
+        """Recolor an existing classic Tk widget on theme changes
+
+        Options map widget options to palette colors, e.g.
+        track(listbox, background="field"); the default depends on the class.
+        """
+        if not options:
+            options = {option.lower(): color for option, color in
+                       CLASSIC_OPTIONS.get(widget.winfo_class(), {}).items()}
+        self._tracked[str(widget)] = options
+        widget.configure(**{option: self.colors[color] for option, color in options.items()})
+        return widget
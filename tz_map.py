@@ -0,0 +1,186 @@
+"""Timezone world map: a precomputed pixel -> zone raster cached on disk.
+
+The raster is an equirectangular grid (by default 0.5 degrees per cell) whose
+cells hold an index into a list of IANA zone names. It is built once from the
+offline boundary data shipped with ``timezonefinder`` and saved to the cache
+directory, so hovering over the map is a single array read. Without
+timezonefinder the raster falls back to nominal nautical zones (Etc/GMT+N)
+derived from longitude.
+"""
+import array
+import hashlib
+import os
+import struct
+import sys
+import zlib
+
+
+RASTER_WIDTH = 720
+RASTER_HEIGHT = 360
+
+CACHE_MAGIC = b"TZRASTER1"
+
+
+def cache_directory():
+    """Per-user cache directory for derived data"""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    return os.path.join(base, "alarm_clock")
+
+
+def nautical_zone(longitude):
+    """Nominal Etc/GMT zone for a longitude (POSIX sign convention)"""
+    offset = int(round(longitude / 15.0))
+    offset = max(-12, min(12, offset))
+    if offset == 0:
+        return "Etc/GMT"
+    return f"Etc/GMT{-offset:+d}"
+
+
+class TimezoneRaster:
+    """Grid of zone indices covering the globe from 180W/90N"""
+
+    def __init__(self, width, height, zones, cells, source=""):
+        self.width = width
+        self.height = height
+        self.zones = zones
+        self.cells = cells
+        self.source = source
+
+    def zone_at(self, x, y):
+        """Zone name at raster cell (x, y)"""
+        x = min(max(int(x), 0), self.width - 1)
+        y = min(max(int(y), 0), self.height - 1)
+        return self.zones[self.cells[y * self.width + x]]
+
+    def zone_at_fraction(self, fx, fy):
+        """Zone at a position given as fractions (0..1) of the map size"""
+        return self.zone_at(fx * self.width, fy * self.height)
+
+    def cell_center(self, x, y):
+        """(longitude, latitude) of a cell's center"""
+        return (-180.0 + (x + 0.5) * 360.0 / self.width,
+                90.0 - (y + 0.5) * 180.0 / self.height)
+
+    @classmethod
+    def build(cls, width=RASTER_WIDTH, height=RASTER_HEIGHT, progress=None):
+        """Compute the raster from timezonefinder (or nautical zones without it)"""
+        try:
+            from timezonefinder import TimezoneFinder
+            finder = TimezoneFinder(in_memory=True)
+            lookup = lambda lng, lat: finder.timezone_at(lng=lng, lat=lat) or nautical_zone(lng)
+            source = "timezonefinder"
+        except ImportError:
+            lookup = lambda lng, lat: nautical_zone(lng)
+            source = "nautical"
+
+        raster = cls(width, height, [], array.array("H", bytes(2 * width * height)), source)
+        index = {}
+        for y in range(height):
+            for x in range(width):
+                zone = lookup(*raster.cell_center(x, y))
+                zone_id = index.get(zone)
+                if zone_id is None:
+                    zone_id = index[zone] = len(raster.zones)
+                    raster.zones.append(zone)
+                raster.cells[y * width + x] = zone_id
+            if progress is not None:
+                progress((y + 1) / height)
+        return raster
+
+    def save(self, path):
+        """Write the raster to a compact compressed file (atomically)"""
+        names = "\n".join(self.zones).encode("utf-8")
+        cells = array.array("H", self.cells)
+        if sys.byteorder == "big":
+            cells.byteswap()
+        body = zlib.compress(cells.tobytes())
+        header = struct.pack("<9sHHII", CACHE_MAGIC, self.width, self.height, len(names), len(body))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header + names + body)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a raster written by save(); raises ValueError if it is not one"""
+        with open(path, "rb") as f:
+            data = f.read()
+        header_size = struct.calcsize("<9sHHII")
+        magic, width, height, names_size, body_size = struct.unpack_from("<9sHHII", data)
+        if magic != CACHE_MAGIC:
+            raise ValueError("not a timezone raster")
+        names = data[header_size:header_size + names_size].decode("utf-8").split("\n")
+        body = data[header_size + names_size:header_size + names_size + body_size]
+        cells = array.array("H", zlib.decompress(body))
+        if sys.byteorder == "big":
+            cells.byteswap()
+        if len(cells) != width * height:
+            raise ValueError("truncated timezone raster")
+        return cls(width, height, names, cells, "cache")
+
+    @classmethod
+    def cached(cls, width=RASTER_WIDTH, height=RASTER_HEIGHT, directory=None, progress=None):
+        """Load the raster from the cache, building and saving it on first use"""
+        path = os.path.join(directory or cache_directory(), cache_name(width, height))
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, struct.error, zlib.error):
+            pass
+        raster = cls.build(width, height, progress)
+        try:
+            raster.save(path)
+        except OSError as e:
+            print(f"Could not cache timezone map: {e}")
+        return raster
+
+    def render(self, size=None):
+        """Draw the zones as a PIL image, shading each zone and outlining borders"""
+        from PIL import Image
+
+        # Palette index = zone id folded into 255 colors; 255 is the border color
+        pixels = bytearray(self.width * self.height)
+        cells = self.cells
+        width = self.width
+        for i, zone_id in enumerate(cells):
+            x = i % width
+            if (x + 1 < width and cells[i + 1] != zone_id) or \
+                    (i + width < len(cells) and cells[i + width] != zone_id):
+                pixels[i] = 255
+            else:
+                pixels[i] = zone_id % 255
+
+        palette = []
+        for zone_id in range(255):
+            names = self.zones[zone_id::255]
+            palette.extend(zone_color(names[0]) if names else (255, 255, 255))
+        palette.extend((90, 90, 90))
+
+        image = Image.frombytes("P", (self.width, self.height), bytes(pixels))
+        image.putpalette(palette)
+        image = image.convert("RGB")
+        if size is not None and size != image.size:
+            image = image.resize(size, Image.NEAREST)
+        return image
+
+
+def cache_name(width, height):
+    """Cache file name; changes when the boundary data version changes"""
+    try:
+        from importlib.metadata import version
+        data_version = version("timezonefinder")
+    except Exception:
+        data_version = "none"
+    tag = hashlib.sha1(f"{width}x{height}:{data_version}".encode()).hexdigest()[:12]
+    return f"tz_raster_{width}x{height}_{tag}.bin"
+
+
+def zone_color(zone):
+    """Stable pastel color for a zone; oceans are drawn blue"""
+    if zone.startswith("Etc/"):
+        return (200, 225, 245)
+    digest = hashlib.md5(zone.encode("utf-8")).digest()
+    return (150 + digest[0] % 100, 150 + digest[1] % 100, 120 + digest[2] % 100)
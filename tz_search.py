@@ -0,0 +1,202 @@
+"""Search index for timezones and cities used by the Add Clock form.
+
+The index covers IANA zone names (including their backward-compatible
+aliases such as ``US/Eastern``), country names, and the offline city
+gazetteer in ``data/cities.csv``. Lookups combine prefix matching on every
+word of a name with typo-tolerant matching through a trigram index, so each
+keystroke only touches a small, precomputed part of the data.
+"""
+import bisect
+import csv
+import os
+import unicodedata
+from collections import defaultdict, namedtuple
+
+import pytz
+
+
+CITIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.csv")
+
+# Ranks: lower is better
+EXACT, PREFIX, WORD_PREFIX, FUZZY = 0, 1, 2, 3
+
+# Cap on prefix hits examined for very short queries
+MAX_PREFIX_HITS = 2000
+
+SearchResult = namedtuple("SearchResult", "label city zone kind")
+
+
+def normalize(text):
+    """Lowercase, strip accents and turn punctuation and underscores into spaces"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join("".join(c if c.isalnum() else " " for c in text).split())
+
+
+def trigrams(text):
+    """Character trigrams of a key, padded so short words still produce some"""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def prefix_distance(a, b, limit):
+    """Fewest edits turning a into some prefix of b (optimal string alignment)
+
+    Gives up as soon as the distance must exceed limit, so mismatches are cheap.
+    """
+    # A shared leading run costs nothing, so skip it before the quadratic part
+    common = 0
+    while common < len(a) and common < len(b) and a[common] == b[common]:
+        common += 1
+    a, b = a[common:], b[common:len(a) + limit]
+    if not a:
+        return 0
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        best = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            # Adjacent transposition counts as one edit
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            best = min(best, value)
+        if best > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return min(previous[max(len(a) - limit, 0):])
+
+
+class TimezoneSearchIndex:
+    """Prefix and typo-tolerant search over zones, aliases and cities"""
+
+    def __init__(self, zones=None, cities_file=CITIES_FILE):
+        # Entries are (SearchResult, weight)
+        self._entries = []
+        # Sorted (key, rank, entry) for prefix lookups
+        self._prefix_keys = []
+        # Whole names for fuzzy matching, with a trigram -> name id index
+        self._names = []
+        self._trigrams = defaultdict(list)
+        # normalized city name -> entries, for resolving typed city names
+        self._cities = defaultdict(list)
+
+        self._add_zones(pytz.all_timezones if zones is None else zones)
+        if cities_file and os.path.exists(cities_file):
+            self._add_cities(cities_file)
+        self._prefix_keys.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add_entry(self, result, weight, names):
+        """Register an entry under each of its names"""
+        entry = len(self._entries)
+        self._entries.append((result, weight))
+        for name in names:
+            key = normalize(name)
+            if not key:
+                continue
+            self._prefix_keys.append((key, PREFIX, entry))
+            # Every later word is a prefix too: "york" finds "new york"
+            words = key.split(" ")
+            for i in range(1, len(words)):
+                self._prefix_keys.append((" ".join(words[i:]), WORD_PREFIX, entry))
+            name_id = len(self._names)
+            self._names.append((key, entry))
+            for gram in trigrams(key):
+                self._trigrams[gram].append(name_id)
+        return entry
+
+    def _add_zones(self, zones):
+        common = set(pytz.common_timezones)
+        countries = defaultdict(list)
+        for code, country_zones in pytz.country_timezones.items():
+            for zone in country_zones:
+                countries[zone].append(pytz.country_names.get(code, code))
+
+        for zone in zones:
+            leaf = zone.rsplit("/", 1)[-1]
+            names = [zone, leaf] + countries.get(zone, [])
+            # Canonical zones rank above deprecated aliases
+            weight = 1 if zone in common else 0
+            self._add_entry(SearchResult(zone, "", zone, "zone"), weight, names)
+
+    def _add_cities(self, path):
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                zone = row["timezone"]
+                country = pytz.country_names.get(row["country"], row["country"])
+                aliases = [alias for alias in row.get("aliases", "").split("|") if alias]
+                label = f"{row['name']}, {country} ({zone})"
+                entry = self._add_entry(SearchResult(label, row["name"], zone, "city"),
+                                        int(row.get("population") or 0),
+                                        [row["name"]] + aliases)
+                for name in [row["name"]] + aliases:
+                    self._cities[normalize(name)].append(entry)
+
+    def search(self, query, limit=10, kind=None):
+        """Return up to `limit` results, best first; kind may be "zone" or "city" """
+        key = normalize(query)
+        if not key:
+            return []
+        ranks = {}
+
+        # Prefix matches on whole names and on each word
+        start = bisect.bisect_left(self._prefix_keys, (key,))
+        for name, rank, entry in self._prefix_keys[start:start + MAX_PREFIX_HITS]:
+            if not name.startswith(key):
+                break
+            if name == key:
+                rank = EXACT
+            if rank < ranks.get(entry, FUZZY + 10):
+                ranks[entry] = rank
+
+        # Typo tolerance once prefixes alone are not enough
+        if len(key) >= 3 and self._count(ranks, kind) < limit:
+            for entry, distance in self._fuzzy(key):
+                rank = FUZZY + distance
+                if rank < ranks.get(entry, FUZZY + 10):
+                    ranks[entry] = rank
+
+        results = []
+        for entry, rank in ranks.items():
+            result, weight = self._entries[entry]
+            if kind is None or result.kind == kind:
+                results.append((rank, -weight, result.label, result))
+        results.sort()
+        return [item[3] for item in results[:limit]]
+
+    def resolve_city(self, name):
+        """Zone of a typed city name (exact or alias match), or None"""
+        entries = self._cities.get(normalize(name))
+        if not entries:
+            return None
+        best = max(entries, key=lambda entry: self._entries[entry][1])
+        return self._entries[best][0].zone
+
+    def _count(self, ranks, kind):
+        if kind is None:
+            return len(ranks)
+        return sum(1 for entry in ranks if self._entries[entry][0].kind == kind)
+
+    def _fuzzy(self, key, candidates=60):
+        """Names sharing enough trigrams with key and within a small edit distance"""
+        grams = trigrams(key)
+        overlap = defaultdict(int)
+        for gram in grams:
+            for name_id in self._trigrams.get(gram, ()):
+                overlap[name_id] += 1
+
+        limit = 1 if len(key) <= 5 else 2
+        needed = max(1, len(grams) // 2)
+        best = sorted((count, name_id) for name_id, count in overlap.items() if count >= needed)
+        for _, name_id in best[-candidates:]:
+            name, entry = self._names[name_id]
+            # Compare against prefixes of the name so partially typed words match
+            distance = prefix_distance(key, name, limit)
+            if distance <= limit:
+                yield entry, distance
@@ -0,0 +1,312 @@
+"""Reusable Tkinter widgets for large, frequently updated displays.
+
+They are built from ttk widgets with named styles (see themes.py), so they
+follow the current theme without being recolored one by one.
+"""
+from tkinter import *
+from tkinter import ttk
+
+
+class ClockTile:
+    """Pooled widgets for one world clock; rebound to different clocks as the grid scrolls"""
+
+    def __init__(self, parent, on_remove):
+        self.clock = None
+        self.frame = ttk.Frame(parent, style="Tile.TFrame", padding=10)
+
+        # City name
+        self.city_label = ttk.Label(self.frame, style="TileCity.TLabel")
+        self.city_label.pack()
+
+        # Timezone
+        self.tz_label = ttk.Label(self.frame, style="TileZone.TLabel")
+        self.tz_label.pack()
+
+        # Time display, and the text it shows, so unchanged times are not re-sent to Tk
+        self.time_label = ttk.Label(self.frame, style="TileTime.TLabel")
+        self.time_label.pack(pady=5)
+        self.time_text = ""
+
+        # Remove button (bound once; looks up the current clock when pressed)
+        self.remove_button = ttk.Button(self.frame, text="Remove", command=lambda: on_remove(self.clock))
+        self.remove_button.pack()
+
+    def bind_clock(self, clock):
+        """Show a different clock in this tile"""
+        self.clock = clock
+        self.city_label.config(text=clock["city"])
+        self.tz_label.config(text=clock["timezone"])
+        self.show_time("")
+
+    def show_time(self, text):
+        """Display a time, skipping the Tk call when it is already shown"""
+        if text != self.time_text:
+            self.time_text = text
+            self.time_label.config(text=text)
+
+
+
+class ClockGrid(ttk.Frame):
+    """Scrollable world clock grid that only materializes the visible rows
+
+    Tiles are kept in a pool and rebound to whichever clocks are on screen, so
+    adding or removing a clock touches at most the visible tiles and a board
+    with thousands of clocks costs no more widgets than fit in the window.
+    """
+
+    def __init__(self, parent, clocks, on_remove, columns=2, row_height=150, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.clocks = clocks
+        self.on_remove = on_remove
+        self.columns = columns
+        self.row_height = row_height
+
+        self.canvas = Canvas(self, highlightthickness=0, bd=0)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+        self.canvas.pack(side=LEFT, fill=BOTH, expand=True)
+
+        # Bound tiles by clock identity, plus idle tiles ready for reuse
+        self._bound = {}
+        self._free = []
+        self._windows = {}
+        self._refresh_pending = False
+        self._scrollregion = None
+
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+        self._bind_wheel(self.canvas)
+
+    def set_clocks(self, clocks):
+        """Point the grid at a new clock list and redraw the visible rows"""
+        self.clocks = clocks
+        self.refresh()
+
+    def visible_tiles(self):
+        """Return the tiles currently bound to on-screen clocks"""
+        return self._bound.values()
+
+    def refresh(self):
+        """Diff the visible slice of the clock list against the bound tiles"""
+        self._refresh_pending = False
+        width = max(self.canvas.winfo_width(), 1)
+        height = max(self.canvas.winfo_height(), 1)
+        rows = (len(self.clocks) + self.columns - 1) // self.columns
+        # Only touch the scroll region when it changes; setting it re-fires yscrollcommand
+        scrollregion = (0, 0, width, rows * self.row_height)
+        if scrollregion != self._scrollregion:
+            self._scrollregion = scrollregion
+            self.canvas.configure(scrollregion=scrollregion)
+
+        # Work out which rows intersect the viewport
+        top = self.canvas.canvasy(0)
+        first_row = max(int(top // self.row_height), 0)
+        last_row = min(int((top + height) // self.row_height) + 1, rows)
+        first, last = first_row * self.columns, min(last_row * self.columns, len(self.clocks))
+        visible = {id(self.clocks[i]): i for i in range(first, last)}
+
+        # Release tiles whose clock scrolled away or was removed
+        for key in [key for key in self._bound if key not in visible]:
+            tile = self._bound.pop(key)
+            self.canvas.itemconfigure(self._windows[tile], state="hidden")
+            self._free.append(tile)
+
+        # Place every visible clock, reusing its tile when it already has one
+        tile_width = width // self.columns
+        for key, index in visible.items():
+            tile = self._bound.get(key)
+            if tile is None:
+                tile = self._take_tile()
+                tile.bind_clock(self.clocks[index])
+                self._bound[key] = tile
+            row, column = divmod(index, self.columns)
+            window = self._windows[tile]
+            self.canvas.coords(window, column * tile_width, row * self.row_height)
+            self.canvas.itemconfigure(window, width=tile_width, height=self.row_height,
+                                      state="normal")
+
+    def schedule_refresh(self):
+        """Coalesce several refresh requests into one idle callback"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self.refresh)
+
+    def _take_tile(self):
+        """Get an idle tile from the pool or create one"""
+        if self._free:
+            return self._free.pop()
+        tile = ClockTile(self.canvas, self.on_remove)
+        self._windows[tile] = self.canvas.create_window(0, 0, window=tile.frame, anchor=NW)
+        for widget in (tile.frame,) + tuple(tile.frame.winfo_children()):
+            self._bind_wheel(widget)
+        return tile
+
+    def _on_scroll(self, first, last):
+        """Keep the scrollbar in sync and rebind tiles for the new viewport"""
+        self.scrollbar.set(first, last)
+        self.schedule_refresh()
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel)
+        widget.bind("<Button-4>", self._on_wheel)
+        widget.bind("<Button-5>", self._on_wheel)
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.canvas.yview_scroll(-1, "units")
+        else:
+            self.canvas.yview_scroll(1, "units")
+
+
+class VirtualList(ttk.Frame):
+    """Listbox look-alike that only holds the rows currently on screen
+
+    Rows are produced on demand by row_text(index), so the backing data can
+    hold hundreds of thousands of entries without creating a Tk item for each.
+    The selection is kept as row keys, so it stays on the same rows while the
+    window scrolls. Keys are data indices unless row_key(index) and
+    key_row(key) are given; with stable keys such as ids, the selection also
+    follows rows moved by inserts and removals, and drops removed rows
+    (key_row raises KeyError for them).
+    """
+
+    def __init__(self, parent, row_count, row_text, height=10, width=50, selectmode=BROWSE,
+                 row_key=None, key_row=None, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.row_count = row_count
+        self.row_text = row_text
+        self.row_key = row_key
+        self.key_row = key_row
+        self.first = 0
+        self._rows = height
+        self._shown = None
+        self._selectmode = selectmode
+        # Keys of the selected rows, including rows scrolled out of view
+        self._selected = set()
+
+        self.listbox = Listbox(self, height=height, width=width, activestyle="none",
+                               exportselection=False, selectmode=selectmode)
+        self.listbox.pack(side=LEFT, fill=BOTH, expand=True)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", self._on_wheel)
+        self.listbox.bind("<Button-5>", self._on_wheel)
+        # Keyboard navigation past the rendered rows scrolls the window
+        self.listbox.bind("<Up>", lambda event: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self._move_selection(1))
+
+    def refresh(self):
+        """Redraw the visible window of rows"""
+        count = self.row_count()
+        self.first = max(0, min(self.first, count - self._rows))
+        last = min(self.first + self._rows, count)
+
+        shown = (self.first, last, count)
+        if shown != self._shown:
+            self._shown = shown
+            self.listbox.delete(0, END)
+            self.listbox.insert(END, *[self.row_text(i) for i in range(self.first, last)])
+        # Screen rows now show other data rows, so select from the saved keys
+        self.listbox.selection_clear(0, END)
+        if self._selected:
+            for index in range(self.first, last):
+                if self._key(index) in self._selected:
+                    self.listbox.selection_set(index - self.first)
+
+        if count:
+            self.scrollbar.set(self.first / count, last / count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def invalidate(self, index=None):
+        """Mark a row (or everything) as changed and redraw if it is visible"""
+        if index is None or self.first <= index < self.first + self._rows:
+            self._shown = None
+        self.refresh()
+
+    def see(self, index):
+        """Scroll so that a row is visible"""
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self._rows:
+            self.first = index - self._rows + 1
+        self.refresh()
+
+    def see_end(self):
+        """Scroll to the last row"""
+        self.see(max(self.row_count() - 1, 0))
+
+    def curselection(self):
+        """Selected rows as indices into the full data"""
+        return tuple(index for index, key in self._selection())
+
+    def selected_keys(self):
+        """Keys of the selected rows; rows removed since may still be included"""
+        return list(self._selected)
+
+    def select(self, index):
+        """Select a single row by data index"""
+        self._selected = {self._key(index)}
+        self.see(index)
+
+    def _key(self, index):
+        return self.row_key(index) if self.row_key else index
+
+    def _selection(self):
+        """(index, key) of each selected row that still exists, in row order"""
+        count = self.row_count()
+        selection = []
+        for key in self._selected:
+            try:
+                index = self.key_row(key) if self.key_row else key
+            except KeyError:
+                continue
+            if index < count:
+                selection.append((index, key))
+        return sorted(selection, key=lambda pair: pair[0])
+
+    def _on_select(self, event):
+        # Only a multiple-selection click adds to rows selected out of view
+        last = min(self.first + self._rows, self.row_count())
+        if self._selectmode == MULTIPLE:
+            kept = self._selected - {self._key(index) for index in range(self.first, last)}
+        else:
+            kept = set()
+        self._selected = kept | {self._key(self.first + i) for i in self.listbox.curselection()}
+
+    def _on_resize(self, event):
+        line_height = max(int(self.listbox.tk.call("font", "metrics", self.listbox.cget("font"),
+                                                   "-linespace")), 1)
+        rows = max(event.height // line_height, 1)
+        if rows != self._rows:
+            self._rows = rows
+            self._shown = None
+            self.refresh()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * self.row_count())
+        elif unit == "pages":
+            self.first += int(amount) * self._rows
+        else:
+            self.first += int(amount)
+        self.refresh()
+
+    def _on_wheel(self, event):
+        if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0:
+            self.first -= 3
+        else:
+            self.first += 3
+        self.refresh()
+        return "break"
+
+    def _move_selection(self, step):
+        selected = self.curselection()
+        index = (selected[0] + step) if selected else self.first
+        if 0 <= index < self.row_count():
+            self.select(index)
+        return "break"
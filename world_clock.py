@@ -0,0 +1,213 @@
+"""World clock time keeping: cached UTC offsets with precomputed DST transitions.
+
+Resolving a zone and converting the current time through it every second is
+expensive for large boards. ZoneOffsetCache resolves each zone once and keeps
+its current UTC offset together with the instant of the next transition, so a
+tick is one UTC read plus an integer add per clock until a transition passes.
+
+BoardTimes formats a whole board at once: it keeps the offsets of all its
+clocks in one array (NumPy when installed, a list otherwise), adds the UTC
+time to the distinct offsets in a single step and formats each distinct
+offset once, so a tick costs a few dozen strftime-equivalents however many
+clocks share them.
+
+pytz and NumPy are only imported when first needed, so importing this
+module stays cheap at startup. Unknown zone names raise
+pytz.UnknownTimeZoneError, a KeyError subclass.
+"""
+import bisect
+import calendar
+import datetime
+import math
+
+
+# How far ahead to look for a transition in zones without a transition table
+PROBE_HORIZON = 400 * 86400
+PROBE_STEP = 86400
+
+
+# Lookup tables so formatting a clock is two list reads and one concatenation
+_HOURS_MINUTES = [f"{m // 60:02d}:{m % 60:02d}:" for m in range(1440)]
+_SECONDS = [f"{s:02d}" for s in range(60)]
+
+
+def format_clock_seconds(seconds):
+    """Format seconds since midnight (or any epoch-like value) as HH:MM:SS"""
+    minutes, seconds = divmod(int(seconds) % 86400, 60)
+    return _HOURS_MINUTES[minutes] + _SECONDS[seconds]
+
+
+class ZoneOffsetCache:
+    """Cache of resolved zones, their current offset and next transition"""
+
+    def __init__(self):
+        # zone name -> [offset_seconds, valid_from, valid_until, tz, transitions]
+        self._zones = {}
+        self._invalid = set()
+
+    def offset(self, zone_name, utc_seconds):
+        """Return the UTC offset of a zone in whole seconds at a UTC timestamp"""
+        entry = self._zones.get(zone_name)
+        if entry is not None and entry[1] <= utc_seconds < entry[2]:
+            return entry[0]
+        return self._refresh(zone_name, utc_seconds)
+
+    def offset_window(self, zone_name, utc_seconds):
+        """Return (offset, valid_from, valid_until) of a zone at a UTC timestamp"""
+        offset = self.offset(zone_name, utc_seconds)
+        entry = self._zones[zone_name]
+        return offset, entry[1], entry[2]
+
+    def local_seconds(self, zone_name, utc_seconds):
+        """Return local epoch seconds for a zone (UTC seconds plus the offset)"""
+        return int(utc_seconds) + self.offset(zone_name, utc_seconds)
+
+    def is_valid(self, zone_name):
+        """Return False for zone names that failed to resolve"""
+        if zone_name in self._invalid:
+            return False
+        try:
+            self._resolve(zone_name)
+        except KeyError:
+            return False
+        return True
+
+    def _resolve(self, zone_name):
+        """Resolve a zone once; unknown names are remembered and re-raised"""
+        import pytz
+        if zone_name in self._invalid:
+            raise pytz.UnknownTimeZoneError(zone_name)
+        entry = self._zones.get(zone_name)
+        if entry is not None:
+            return entry[3], entry[4]
+        try:
+            tz = pytz.timezone(zone_name)
+        except pytz.UnknownTimeZoneError:
+            self._invalid.add(zone_name)
+            raise
+
+        # pytz zones with DST carry a sorted UTC transition table
+        transitions = None
+        utc_times = getattr(tz, "_utc_transition_times", None)
+        if utc_times:
+            transitions = (
+                [calendar.timegm(t.timetuple()) if t.year > 1 else -math.inf for t in utc_times],
+                [info[0] for info in tz._transition_info]
+            )
+        self._zones[zone_name] = [0, 0, 0, tz, transitions]
+        return tz, transitions
+
+    def _refresh(self, zone_name, utc_seconds):
+        """Recompute a zone's offset and the window in which it stays valid"""
+        tz, transitions = self._resolve(zone_name)
+
+        if transitions is not None:
+            times, offsets = transitions
+            index = bisect.bisect_right(times, utc_seconds) - 1
+            offset = int(offsets[max(index, 0)].total_seconds())
+            valid_from = times[index] if index >= 0 else -math.inf
+            valid_until = times[index + 1] if index + 1 < len(times) else math.inf
+        else:
+            offset = self._probe(tz, utc_seconds)
+            valid_from = utc_seconds
+            valid_until = self._next_change(tz, utc_seconds, offset)
+
+        self._zones[zone_name][:3] = [offset, valid_from, valid_until]
+        return offset
+
+    def _probe(self, tz, utc_seconds):
+        """Offset of a zone at a timestamp, asked of the tzinfo directly"""
+        import pytz
+        moment = datetime.datetime.fromtimestamp(utc_seconds, pytz.utc)
+        return int(moment.astimezone(tz).utcoffset().total_seconds())
+
+    def _next_change(self, tz, utc_seconds, offset):
+        """Find the next offset change by stepping forward and bisecting"""
+        low = utc_seconds
+        while low < utc_seconds + PROBE_HORIZON:
+            high = low + PROBE_STEP
+            if self._probe(tz, high) != offset:
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._probe(tz, middle) == offset:
+                        low = middle
+                    else:
+                        high = middle
+                return high
+            low = high
+        # No change within the horizon: check again once it has passed
+        return low
+
+
+INVALID_ZONE_TEXT = "Invalid timezone"
+
+
+def _load_numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+class BoardTimes:
+    """HH:MM:SS of every clock on a board, computed per distinct UTC offset
+
+    The offsets are rebuilt only when the list of zones changes or one of
+    them passes a DST transition; between rebuilds a tick is one addition
+    over the distinct offsets and a gather of their formatted strings.
+    """
+
+    def __init__(self, zone_offsets, use_numpy=True):
+        self.zone_offsets = zone_offsets
+        # NumPy is imported by the first rebuild, off the startup path
+        self.use_numpy = use_numpy
+        self.numpy = None
+        self._zones = None
+        self._valid_from = self._valid_until = 0
+        # Distinct offsets, and for each clock the index of its offset
+        # (len(offsets) for invalid zones)
+        self._offsets = []
+        self._index = []
+
+    def texts(self, zone_names, utc_seconds):
+        """Formatted local times for `zone_names`, in the same order"""
+        zones = tuple(zone_names)
+        if zones != self._zones or not self._valid_from <= utc_seconds < self._valid_until:
+            self._rebuild(zones, utc_seconds)
+        numpy = self.numpy
+        if numpy is None:
+            texts = [format_clock_seconds(utc_seconds + offset) for offset in self._offsets]
+            texts.append(INVALID_ZONE_TEXT)
+            return [texts[i] for i in self._index]
+        local = (self._offsets + int(utc_seconds)) % 86400
+        texts = numpy.array([format_clock_seconds(seconds) for seconds in local.tolist()]
+                            + [INVALID_ZONE_TEXT], dtype=object)
+        return texts[self._index].tolist()
+
+    def _rebuild(self, zones, utc_seconds):
+        """Look up every zone's offset and group the clocks by offset"""
+        if self.use_numpy:
+            self.use_numpy = False
+            self.numpy = _load_numpy()
+        valid_from, valid_until = -math.inf, math.inf
+        distinct = {}
+        index = []
+        for zone in zones:
+            try:
+                offset, zone_from, zone_until = self.zone_offsets.offset_window(zone, utc_seconds)
+            except KeyError:
+                index.append(None)
+                continue
+            valid_from = max(valid_from, zone_from)
+            valid_until = min(valid_until, zone_until)
+            index.append(distinct.setdefault(offset, len(distinct)))
+        invalid = len(distinct)
+        index = [invalid if i is None else i for i in index]
+        offsets = list(distinct)
+        if self.numpy is not None:
+            offsets = self.numpy.array(offsets, dtype=self.numpy.int64)
+            index = self.numpy.array(index, dtype=self.numpy.intp)
+        self._zones = zones
+        self._offsets, self._index = offsets, index
+        self._valid_from, self._valid_until = valid_from, valid_until